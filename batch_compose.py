@@ -0,0 +1,262 @@
+# batch_compose.py
+"""Komposisi batch dari file JSONL dengan ComposerEngine (agen, system prompt dan fallback yang sama).
+
+Setiap baris input adalah satu objek JSON:
+    {"id": "mood-001", "prompt": "Saya ingin lagu tentang rindu"}
+    {"id": "conv-7", "history": [{"role": "user", "content": "..."}, {"role": "assistant", "content": "..."}],
+     "turns": ["Ubah kunci nada menjadi minor", "Percepat tempo"]}
+
+`history` (opsional) dimuat apa adanya; setiap entri `prompt`/`turns` dikomposisi berurutan dalam satu
+percakapan. Baris tanpa `id` memakai nomor barisnya; baris yang bukan objek JSON dilewati. Hanya item
+yang semua gilirannya berhasil masuk checkpoint, jadi item yang gagal diulang saat run dilanjutkan.
+
+Contoh:
+    python batch_compose.py prompts.jsonl --output results.jsonl --concurrency 8 --rate 2
+    python batch_compose.py prompts.jsonl --to-db --checkpoint run.ckpt   # lanjut otomatis setelah interupsi
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Iterator, Optional, Set, TextIO, Tuple
+
+from composer_engine import ComposerEngine
+from database_tools import get_history_writer, save_suggestion_history
+from metrics_tools import configure_metrics
+
+
+def iter_jsonl(path: str) -> Iterator[Tuple[int, dict]]:
+    """Membaca JSONL baris demi baris (file tidak pernah dimuat utuh ke memori)."""
+    with open(path, "r", encoding="utf-8") as handle:
+        for line_no, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as e:
+                logging.error(f"Skipping invalid JSON on line {line_no}: {e}")
+
+
+def load_checkpoint(path: Optional[str]) -> Set[str]:
+    """ID item yang sudah selesai pada run sebelumnya."""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as handle:
+        return {line.rstrip("\n") for line in handle if line.strip()}
+
+
+class RateLimiter:
+    """Pembatas laju sederhana: paling banyak `rate` permintaan per detik (jarak minimum antar mulai)."""
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class BatchStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.items = 0
+        self.turns = 0
+        self.failures = 0
+        self.fallbacks = 0
+        self.cache_hits = 0
+        self.local_edits = 0
+        self.output_chars = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.retry_items = 0
+
+    def summary(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (
+            f"{self.items} items / {self.turns} turns in {elapsed:.1f}s "
+            f"({self.turns / elapsed:.2f} turns/s, {self.output_chars / elapsed:.0f} chars/s); "
+            f"fallbacks={self.fallbacks} failures={self.failures} cache_hits={self.cache_hits} local_edits={self.local_edits} "
+            f"skipped={self.skipped} invalid={self.invalid} not_checkpointed={self.retry_items}"
+        )
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        engine: ComposerEngine,
+        output: Optional[TextIO],
+        checkpoint: Optional[TextIO],
+        concurrency: int = 4,
+        rate: Optional[float] = None,
+        report_every: float = 10.0,
+    ):
+        self.engine = engine
+        self.output = output
+        self.checkpoint = checkpoint
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate)
+        self.report_every = report_every
+        self.stats = BatchStats()
+
+    async def _compose_item(self, item_id: str, item: dict) -> None:
+        conversation = self.engine.new_conversation()
+        conversation.extend((message["role"], message["content"]) for message in item.get("history", []))
+        turns = item.get("turns") or ([item["prompt"]] if item.get("prompt") else [])
+        all_ok = True
+        for turn_index, prompt in enumerate(turns):
+            await self.limiter.acquire()
+            started = time.monotonic()
+            result = await self.engine.acompose(conversation, prompt)
+            self.stats.turns += 1
+            self.stats.output_chars += len(result.answer)
+            self.stats.fallbacks += result.used_fallback
+            self.stats.cache_hits += result.from_cache
+            self.stats.local_edits += result.local_edit
+            self.stats.failures += not result.ok
+            all_ok = all_ok and result.ok
+            if self.output is not None:
+                self.output.write(json.dumps({
+                    "id": item_id,
+                    "turn": turn_index,
+                    "prompt": prompt,
+                    "answer": result.answer,
+                    "suggestions": result.suggestions,
+                    "language": result.language,
+                    "from_cache": result.from_cache,
+                    "local_edit": result.local_edit,
+                    "used_fallback": result.used_fallback,
+                    "elapsed_s": round(time.monotonic() - started, 3),
+                }, ensure_ascii=False) + "\n")
+                self.output.flush()
+        self.stats.items += 1
+        # Checkpoint ditulis setelah output dan hanya jika semua giliran berhasil: item yang terputus
+        # atau gagal (deadline, retry habis) diulang pada run berikutnya (at-least-once)
+        if not all_ok:
+            self.stats.retry_items += 1
+            logging.error(f"Batch item {item_id} had failed turns; not checkpointed, it will be retried on resume.")
+            return
+        if self.checkpoint is not None:
+            self.checkpoint.write(item_id + "\n")
+            self.checkpoint.flush()
+
+    async def _worker(self, queue: "asyncio.Queue") -> None:
+        while True:
+            entry = await queue.get()
+            try:
+                if entry is None:
+                    return
+                item_id, item = entry
+                try:
+                    await self._compose_item(item_id, item)
+                except Exception as e:
+                    self.stats.failures += 1
+                    logging.error(f"Batch item {item_id} failed: {e}")
+            finally:
+                queue.task_done()
+
+    async def _reporter(self) -> None:
+        while True:
+            await asyncio.sleep(self.report_every)
+            print(f"[batch] {self.stats.summary()}", file=sys.stderr)
+
+    async def run(self, items: Iterator[Tuple[int, dict]], done: Set[str]) -> BatchStats:
+        # Antrean berbatas menjaga pembacaan input tetap streaming (backpressure ke pembaca file)
+        queue: "asyncio.Queue" = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        reporter = asyncio.create_task(self._reporter())
+        try:
+            for line_no, item in items:
+                if not isinstance(item, dict):
+                    self.stats.invalid += 1
+                    logging.error(f"Skipping line {line_no}: expected a JSON object, got {type(item).__name__}")
+                    continue
+                item_id = str(item.get("id", line_no))
+                if item_id in done:
+                    self.stats.skipped += 1
+                    continue
+                await queue.put((item_id, item))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            reporter.cancel()
+        return self.stats
+
+
+def resolve_api_key(cli_value: Optional[str]) -> Optional[str]:
+    """Urutan: argumen CLI, env GOOGLE_API_KEY, lalu .streamlit/secrets.toml."""
+    if cli_value:
+        return cli_value
+    if os.environ.get("GOOGLE_API_KEY"):
+        return os.environ["GOOGLE_API_KEY"]
+    secrets_path = os.path.join(".streamlit", "secrets.toml")
+    if os.path.exists(secrets_path):
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            return None
+        with open(secrets_path, "rb") as handle:
+            return tomllib.load(handle).get("google_api_key")
+    return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="File JSONL berisi prompt atau percakapan")
+    parser.add_argument("--output", help="File JSONL hasil (ditambahkan secara inkremental)")
+    parser.add_argument("--to-db", action="store_true", help="Simpan hasil + saran ke suggestion_history")
+    parser.add_argument("--checkpoint", help="File checkpoint untuk melanjutkan run yang terputus")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=None, help="Maksimal permintaan per detik")
+    parser.add_argument("--no-cache", action="store_true", help="Nonaktifkan cache respons")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--report-every", type=float, default=10.0, help="Interval laporan throughput (detik)")
+    parser.add_argument("--metrics-jsonl", default=None, help="Tulis trace per giliran ke file JSONL")
+    parser.add_argument("--metrics-prom", default=None, help="Tulis counter/histogram ke file teks Prometheus")
+    args = parser.parse_args(argv)
+
+    if not args.output and not args.to_db:
+        parser.error("at least one of --output or --to-db is required")
+    api_key = resolve_api_key(args.api_key)
+    if not api_key:
+        parser.error("Google API key not found (use --api-key, GOOGLE_API_KEY or .streamlit/secrets.toml)")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.metrics_jsonl or args.metrics_prom:
+        configure_metrics(args.metrics_jsonl, args.metrics_prom)
+    engine = ComposerEngine(
+        google_api_key=api_key,
+        history_store=save_suggestion_history if args.to_db else None,
+        use_cache=not args.no_cache,
+    )
+    done = load_checkpoint(args.checkpoint)
+    output = open(args.output, "a", encoding="utf-8") if args.output else None
+    checkpoint = open(args.checkpoint, "a", encoding="utf-8") if args.checkpoint else None
+    try:
+        runner = BatchRunner(engine, output, checkpoint, args.concurrency, args.rate, args.report_every)
+        stats = asyncio.run(runner.run(iter_jsonl(args.input), done))
+    finally:
+        for handle in (output, checkpoint):
+            if handle is not None:
+                handle.close()
+        if args.to_db:
+            get_history_writer().flush(timeout=30)
+    print(f"[batch] done: {stats.summary()}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# benchmarks/bench_chords.py
+"""Latensi jalur edit lokal (chord_tools) untuk chip "relative minor" dan "+15 BPM", plus cek keselarasan.
+
+Setiap edit diverifikasi: baris lirik/section identik dengan aslinya dan setiap chord tetap berada di
+kolom semula kecuali jika chord sebelumnya memanjang (geser minimal).
+
+Jalankan dari root repo:
+    python benchmarks/bench_chords.py [--repeat 500] [--sections 24]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chord_tools import apply_local_edit, parse_composition  # noqa: E402
+
+NARRATIVE = (
+    "Komposisi ini menerjemahkan rasa **harapan setelah badai** menjadi balada Pop-Soul.\n\n"
+    "**Kunci:** C mayor\n**Tempo:** Andante (72 BPM)\n**Time Signature:** 4/4, *groove* straight.\n\n"
+    "Cmaj7 membuka verse dengan hangat, Am7 dan Fadd9 memberi ruang, sementara G7sus4 menahan resolusi. "
+    "Di bridge, Bbmaj7 dan E7alt membawa warna non-diatonik sebelum kembali ke C mayor.\n\n"
+)
+SECTION = (
+    "[VERSE {index}]\nCmaj7      Am7        Fadd9      G7sus4\nLangit  yang  kelabu  mulai  terbuka\n\n"
+    "[CHORUS]\nF          G/B        Em7        Am\nCahaya  pulang  ke  dalam  dada\n\n"
+    "[BRIDGE]\nDm7   Bbmaj7   E7alt   Am\nDan  aku  percaya  lagi\n\n"
+)
+PROMPTS = {
+    "relative_minor": "Ubah **kunci nada C mayor** menjadi kunci *relative minor*.",
+    "tempo_up": "Percepat **tempo Andante (72 BPM)** sebanyak 15 BPM dan ubah *beat* drumnya.",
+}
+
+
+def build_answer(sections: int) -> str:
+    body = "".join(SECTION.format(index=index + 1) for index in range(sections))
+    return f"{NARRATIVE}```\n{body.rstrip()}\n```"
+
+
+def check_alignment(original: str, edited: str) -> None:
+    before, after = parse_composition(original), parse_composition(edited)
+    assert after is not None and len(before.lines) == len(after.lines), "line count changed"
+    for old, new in zip(before.lines, after.lines):
+        assert old.kind == new.kind, f"line kind changed: {old.text!r} -> {new.text!r}"
+        if old.kind != "chords":
+            assert old.text == new.text, f"non-chord line changed: {old.text!r}"
+            continue
+        cursor = -1
+        for old_chord, new_chord in zip(old.chords, new.chords):
+            expected = max(old_chord.column, cursor + 1) if cursor >= 0 else old_chord.column
+            assert new_chord.column == expected, f"misaligned chord {new_chord.text!r} in {new.text!r}"
+            cursor = new_chord.column + len(new_chord.text)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--sections", type=int, default=24, help="Jumlah blok verse/chorus/bridge dalam chord sheet")
+    args = parser.parse_args()
+
+    answer = build_answer(args.sections)
+    print(f"answer size: {len(answer) / 1024:.1f} KB, {args.sections * 3} sections")
+    for name, prompt in PROMPTS.items():
+        edited = apply_local_edit(answer, prompt, "indonesian")
+        assert edited is not None, f"{name}: local edit declined"
+        reparsed = parse_composition(edited)
+        check_alignment(answer, edited)
+        seconds = timeit.timeit(lambda: apply_local_edit(answer, prompt, "indonesian"), number=args.repeat) / args.repeat
+        print(f"{name:<16}: {seconds * 1e3:8.3f} ms/edit  key={reparsed.key.name()} bpm={reparsed.bpm}  (alignment ok)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+# benchmarks/bench_engine_load.py
+"""Load test offline: ComposerEngine + LangGraph agent dengan FakeComposerChatModel (tanpa jaringan).
+
+Mengukur latensi giliran end-to-end (p50/p95/max), time-to-first-token, throughput dan jumlah
+fallback/kegagalan untuk sejumlah percakapan paralel.
+
+Jalankan dari root repo:
+    python benchmarks/bench_engine_load.py --conversations 50 --turns 3 --concurrency 10 \\
+        --ttft 0.4 --chunk-delay 0.03 --failure-rate 0.05 --short-rate 0.1
+    python benchmarks/bench_engine_load.py --recordings sessions.jsonl   # putar ulang sesi terekam
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from composer_engine import ComposerEngine  # noqa: E402
+from fake_chat_model import FakeComposerChatModel  # noqa: E402
+
+PROMPTS = [
+    "Saya ingin lagu tentang rindu yang tenang",
+    "Ubah kunci nada menjadi relative minor",
+    "I want a song about hope after a storm",
+    "Percepat tempo sebanyak 15 BPM",
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+async def run_conversation(engine, index, turns, semaphore, latencies, ttfts, outcomes):
+    conversation = engine.new_conversation()
+    for turn in range(turns):
+        prompt = PROMPTS[(index + turn) % len(PROMPTS)]
+        async with semaphore:
+            started = time.perf_counter()
+            first_token = None
+            result = None
+            async for event in engine.astream(conversation, prompt):
+                if event.kind == "delta" and first_token is None:
+                    first_token = time.perf_counter() - started
+                elif event.kind == "final":
+                    result = event.result
+            latencies.append(time.perf_counter() - started)
+            if first_token is not None:
+                ttfts.append(first_token)
+            outcomes["fallback"] += result.used_fallback
+            outcomes["failed"] += not result.ok
+
+
+async def main_async(args) -> None:
+    model = FakeComposerChatModel(
+        time_to_first_token=args.ttft,
+        inter_chunk_delay=args.chunk_delay,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        short_answer_rate=args.short_rate,
+        seed=args.seed,
+        recordings=args.recordings,
+    )
+    engine = ComposerEngine(llm=model, history_store=None, use_cache=False)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, ttfts, outcomes = [], [], {"fallback": 0, "failed": 0}
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_conversation(engine, i, args.turns, semaphore, latencies, ttfts, outcomes)
+        for i in range(args.conversations)
+    ))
+    elapsed = time.perf_counter() - started
+
+    print(f"turns: {len(latencies)} in {elapsed:.2f}s -> {len(latencies) / elapsed:.2f} turns/s")
+    print(f"turn latency  p50 {percentile(latencies, 0.5):.3f}s  p95 {percentile(latencies, 0.95):.3f}s  max {max(latencies):.3f}s")
+    if ttfts:
+        print(f"first delta   p50 {percentile(ttfts, 0.5):.3f}s  p95 {percentile(ttfts, 0.95):.3f}s  mean {statistics.mean(ttfts):.3f}s")
+    print(f"fallbacks: {outcomes['fallback']}  failed turns: {outcomes['failed']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--ttft", type=float, default=0.4)
+    parser.add_argument("--chunk-delay", type=float, default=0.03)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--short-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--recordings", default=None, help="File JSONL dari RecordingChatModel")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
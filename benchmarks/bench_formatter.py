@@ -0,0 +1,71 @@
+# benchmarks/bench_formatter.py
+"""Micro-benchmark: formatter satu-lintasan vs implementasi lama (30 `re.sub` per segmen).
+
+Jalankan dari root repo:
+    python benchmarks/bench_formatter.py [--repeat 200]
+"""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formatting_tools import format_assistant_response  # noqa: E402
+
+
+def legacy_format_assistant_response(text: str) -> str:
+    """Salinan persis implementasi lama dari emotional_composer_agent.py (baseline)."""
+    parts = re.split(r'(```.*?```)', text, flags=re.DOTALL)
+    formatted_parts = []
+    for part in parts:
+        if part.startswith('```') and part.endswith('```'):
+            formatted_parts.append(part)
+        else:
+            keywords_to_bold = ["komposisi", "melodi", "chord", "instrumentasi", "tempo", "emosi", "kunci", "composition", "melody", "key", "tempo", "instrumentation", "emotion", "struktur", "progresi", "genre", "dynamics", "groove"]
+            for keyword in keywords_to_bold:
+                part = re.sub(r'\b(' + re.escape(keyword) + r')\b', r'**\1**', part, flags=re.IGNORECASE)
+            english_words = ["rag", "agent", "tool", "api", "prompt", "midi", "genre", "vibe", "groove", "dynamics", "beat", "solo"]
+            for word in english_words:
+                part = re.sub(r'\b(' + re.escape(word) + r')\b', r'*\1*', part, flags=re.IGNORECASE)
+            formatted_parts.append(part)
+    return "".join(formatted_parts)
+
+
+NARRATIVE = (
+    "Komposisi ini berada di Kunci D minor dengan Tempo Andante (72 BPM). Melodi utama dimainkan "
+    "oleh piano solo, sementara instrumentasi string memberi emosi hangat. Genre-nya Neo-Soul dengan "
+    "groove yang santai; dynamics bergerak dari p ke mf. Progresi chord memakai Cmaj7 dan Gsus4. "
+    "The key and tempo reflect the melody, the beat and the vibe of the agent's prompt via the API tool.\n\n"
+)
+CHORD_SHEET = (
+    "```\n[VERSE 1]\nDm9        Gsus4        Cmaj7\nHati  yang  lelah  tetap  berdetak  pelan\n\n"
+    "[CHORUS]\nFmaj7      Em7b5      A7alt\nTempo  kunci  dan  melodi  tidak  diformat\n```\n"
+)
+
+
+def build_sample(size_bytes: int) -> str:
+    body = []
+    while sum(len(p) for p in body) < size_bytes:
+        body.append(NARRATIVE)
+    return "".join(body) + CHORD_SHEET
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    for size in (1_000, 5_000, 20_000, 50_000):
+        sample = build_sample(size)
+        assert format_assistant_response(sample) == legacy_format_assistant_response(sample), "output mismatch"
+        number = max(1, args.repeat * 1_000 // size)
+        legacy = min(timeit.repeat(lambda: legacy_format_assistant_response(sample), number=number, repeat=3)) / number
+        compiled = min(timeit.repeat(lambda: format_assistant_response(sample), number=number, repeat=3)) / number
+        print(f"{len(sample):>7} chars | legacy {legacy * 1e6:9.1f} us | compiled {compiled * 1e6:9.1f} us | x{legacy / compiled:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/bench_history_queries.py
+"""Benchmark migrasi + query suggestion_history pada tabel besar (default 1 juta baris).
+
+Jalankan dari root repo:
+    python benchmarks/bench_history_queries.py [--rows 1000000] [--db /tmp/bench_history.db]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_tools import connect_suggestion_db, migrate_suggestion_db  # noqa: E402
+from history_queries import list_history, search_history  # noqa: E402
+
+MOODS = ["melankolis", "rindu", "damai", "misterius", "ceria", "hopeful", "nostalgic", "tense", "lonely", "euphoric"]
+KEYS = ["C Major", "D minor", "F Major", "Bb minor", "E minor", "G Major"]
+INSTRUMENTS = ["piano", "strings", "synth pad", "nylon guitar", "muted brass", "cello"]
+
+
+def make_row(rng: random.Random, i: int):
+    mood = rng.choice(MOODS)
+    prompt = f"Saya ingin lagu tentang perasaan {mood} nomor {i}"
+    response = (
+        f"Komposisi {mood} di kunci {rng.choice(KEYS)}, tempo Andante ({rng.randint(60, 140)} BPM). "
+        f"Instrumentasi utama {rng.choice(INSTRUMENTS)} dan {rng.choice(INSTRUMENTS)}. "
+        "```\n[VERSE 1]\nDm9        Gsus4        Cmaj7\nHati  yang  lelah\n```"
+    )
+    day = 1 + i * 365 // 1_000_000 % 365
+    created_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(1_700_000_000 + day * 86400 + i % 86400))
+    return prompt, response, json.dumps(["Ubah kunci nada"]), created_at
+
+
+def timed(label, fn, repeat=5):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<45} {best * 1000:10.2f} ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--db", default="/tmp/bench_suggestion_history.db")
+    args = parser.parse_args()
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+
+    # Skema lama (v1) tanpa indeks, lalu isi data, lalu migrasi: mensimulasikan database produksi yang ada
+    conn = connect_suggestion_db(args.db)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+    CREATE TABLE suggestion_history (
+        suggestion_id INTEGER PRIMARY KEY, user_prompt TEXT NOT NULL, assistant_response TEXT NOT NULL,
+        suggestions_json TEXT NOT NULL, created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now')))
+    """)
+    rng = random.Random(42)
+    t0 = time.perf_counter()
+    with conn:
+        conn.executemany(
+            "INSERT INTO suggestion_history (user_prompt, assistant_response, suggestions_json, created_at) VALUES (?, ?, ?, ?)",
+            (make_row(rng, i) for i in range(args.rows)),
+        )
+    print(f"{'insert ' + str(args.rows) + ' rows (v1 schema)':<45} {(time.perf_counter() - t0) * 1000:10.2f} ms")
+
+    def scan_time_range():
+        return conn.execute(
+            "SELECT count(*) FROM (SELECT suggestion_id FROM suggestion_history "
+            "WHERE created_at >= '2023-12-01' AND created_at < '2023-12-02' ORDER BY created_at DESC LIMIT 50)"
+        ).fetchone()
+
+    def scan_like():
+        return conn.execute(
+            "SELECT suggestion_id FROM suggestion_history WHERE assistant_response LIKE '%nostalgic%cello%' LIMIT 20"
+        ).fetchall()
+
+    timed("v1: time-range page (full scan)", scan_time_range, repeat=3)
+    timed("v1: LIKE text search (full scan)", scan_like, repeat=3)
+
+    t0 = time.perf_counter()
+    migrate_suggestion_db(conn)
+    print(f"{'migration to latest (index + FTS)':<45} {(time.perf_counter() - t0) * 1000:10.2f} ms")
+    conn.close()
+
+    page, cursor = timed("v2: list_history first page", lambda: list_history("2023-12-01", "2023-12-02", db_path=args.db))
+    timed("v2: list_history next page", lambda: list_history("2023-12-01", "2023-12-02", after=cursor, db_path=args.db))
+    timed("v2: search_history 'nostalgic cello'", lambda: search_history("nostalgic cello", db_path=args.db))
+    timed("v2: search_history 'misterius' page 5", lambda: search_history("misterius", offset=80, db_path=args.db))
+    print(f"first page rows: {len(page)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# benchmarks/bench_hot_path.py
+"""Benchmark kode yang berjalan di setiap rerun Streamlit dan setiap giliran.
+
+Mengukur latensi per fungsi, alokasi memori puncak (tracemalloc) dan kurva skala untuk percakapan
+sintetis 2-500 giliran dan komposisi 1-50 KB:
+
+    format_assistant_response    ukuran jawaban
+    clean_suggestion_footer      ukuran jawaban
+    detect_language              panjang prompt
+    get_dynamic_suggestions      panjang percakapan
+    history_reconstruction       panjang percakapan (jendela konteks + pesan LangChain)
+    render_history               panjang percakapan (format ulang semua pesan, loop riwayat lama)
+    render_history_windowed      panjang percakapan (markdown di-memo per pesan, 10 giliran terakhir penuh)
+    save_suggestion_history      enqueue per giliran + throughput writer
+    metrics_trace                overhead instrumentasi per rerun (nonaktif vs. aktif di memori)
+
+Hasil dapat disimpan sebagai baseline dan dibandingkan antar versi:
+    python benchmarks/bench_hot_path.py --save benchmarks/results/baseline.json
+    python benchmarks/bench_hot_path.py --compare benchmarks/results/baseline.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+# database_tools membuat suggestion_history.db di cwd saat diimpor: jalankan di direktori sementara
+_WORKDIR = tempfile.mkdtemp(prefix="bench_hot_path_")
+os.chdir(_WORKDIR)
+
+from context_tools import ConversationWindow  # noqa: E402
+from database_tools import SuggestionHistoryWriter, clean_suggestion_footer  # noqa: E402
+from formatting_tools import format_assistant_response  # noqa: E402
+from message_records import ConversationLog, MessageRecord, detect_language  # noqa: E402
+from metrics_tools import MetricsRecorder  # noqa: E402
+from suggestion_tools import get_dynamic_suggestions  # noqa: E402
+
+try:
+    from composer_engine import to_langchain_messages  # noqa: E402
+except ImportError:  # langchain_core tidak terpasang: ukur jendela konteks saja
+    to_langchain_messages = None
+
+ANSWER_SIZES = (1_000, 5_000, 20_000, 50_000)
+TURN_COUNTS = (2, 10, 50, 200, 500)
+PROMPT_WORDS = (5, 20, 100, 1_000)
+
+NARRATIVE = (
+    "Komposisi ini berada di Kunci D minor dengan Tempo Andante (72 BPM). Melodi utama dimainkan oleh "
+    "piano solo, sementara instrumentasi string memberi emosi hangat. Genre Neo-Soul dengan groove santai; "
+    "dynamics bergerak dari p ke mf. The key and tempo reflect the melody and the vibe of the prompt.\n\n"
+)
+CHORD_SHEET = (
+    "```\n[VERSE 1]\nDm9        Gsus4        Cmaj7\nHati  yang  lelah  tetap  berdetak  pelan\n\n"
+    "[CHORUS]\nFmaj7      Em7b5      A7alt\nRindu  ini  pulang  tanpa  suara\n```"
+)
+FOOTER = "\n\n---\n**Saran Pertanyaan:** Ubah kunci nada | Percepat tempo"
+
+
+def make_answer(size: int) -> str:
+    repeats = max(1, (size - len(CHORD_SHEET)) // len(NARRATIVE))
+    return NARRATIVE * repeats + CHORD_SHEET
+
+
+def make_prompt(words: int) -> str:
+    vocabulary = "saya ingin lagu tentang rindu yang tenang the key and tempo of a melody".split()
+    return " ".join(vocabulary[i % len(vocabulary)] for i in range(words))
+
+
+def make_conversation(turns: int, answer_size: int = 5_000) -> ConversationLog:
+    conversation = ConversationLog()
+    conversation.append("assistant", "Halo! Saya adalah Emotional Composer Bot.")
+    answer = make_answer(answer_size)
+    for turn in range(turns):
+        conversation.append("user", f"Saya ingin lagu tentang perasaan nomor {turn}")
+        conversation.append("assistant", answer)
+    return conversation
+
+
+def measure(fn, min_time: float = 0.2) -> dict:
+    """Latensi rata-rata (terbaik dari 3 ulangan) dan alokasi puncak satu panggilan."""
+    fn()
+    number = 1
+    while True:
+        elapsed = timeit.timeit(fn, number=number)
+        if elapsed >= min_time / 5 or number >= 1_000_000:
+            break
+        number *= 10
+    best = min(timeit.repeat(fn, number=number, repeat=3)) / number
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"mean_us": best * 1e6, "peak_kb": peak / 1024}
+
+
+def bench_all() -> dict:
+    results = {}
+
+    def record(case: str, param, stats: dict) -> None:
+        results.setdefault(case, {})[str(param)] = stats
+        print(f"{case:<28} {str(param):>8} | {stats['mean_us']:12.1f} us | peak {stats['peak_kb']:9.1f} KB")
+
+    for size in ANSWER_SIZES:
+        answer = make_answer(size)
+        record("format_assistant_response", size, measure(lambda: format_assistant_response(answer)))
+    for size in ANSWER_SIZES:
+        answer = make_answer(size) + FOOTER
+        record("clean_suggestion_footer", size, measure(lambda: clean_suggestion_footer(answer)))
+    for words in PROMPT_WORDS:
+        prompt = make_prompt(words)
+        record("detect_language", words, measure(lambda: detect_language(prompt)))
+
+    for turns in TURN_COUNTS:
+        conversation = make_conversation(turns)
+        last_answer = MessageRecord.create("assistant", make_answer(5_000))
+        record("get_dynamic_suggestions", turns, measure(lambda: get_dynamic_suggestions(last_answer, "indonesian", conversation)))
+
+    for turns in TURN_COUNTS:
+        conversation = make_conversation(turns)
+        window = ConversationWindow()
+        window.build(conversation.clean_history)  # jendela sudah hangat seperti pada sesi berjalan
+
+        def reconstruct():
+            history = window.build(conversation.clean_history)
+            return to_langchain_messages(history) if to_langchain_messages else history
+
+        record("history_reconstruction", turns, measure(reconstruct))
+
+    for turns in TURN_COUNTS:
+        conversation = make_conversation(turns, answer_size=2_000)
+        record("render_history", turns, measure(lambda: [format_assistant_response(m.clean_content) for m in conversation]))
+
+    for turns in TURN_COUNTS:
+        conversation = make_conversation(turns, answer_size=2_000)
+
+        def render_windowed():
+            pages, visible_start = conversation.history_window(10)
+            return [m.formatted for m in conversation.records[visible_start:]]
+
+        render_windowed()  # memo per pesan sudah hangat seperti pada rerun berikutnya
+        record("render_history_windowed", turns, measure(render_windowed))
+
+    db_path = os.path.join(_WORKDIR, "bench_history.db")
+    writer = SuggestionHistoryWriter(db_path=db_path, max_queue=1_000_000)
+    writer.start()
+    answer = make_answer(5_000) + FOOTER
+    record("save_suggestion_history", "enqueue", measure(lambda: writer.submit("prompt", answer, ["a", "b"]), min_time=0.05))
+    writer.flush()
+    rows = 2_000
+    started = time.perf_counter()
+    for _ in range(rows):
+        writer.submit("prompt", answer, ["a", "b"])
+    writer.flush()
+    per_row = (time.perf_counter() - started) / rows
+    record("save_suggestion_history", "drain", {"mean_us": per_row * 1e6, "peak_kb": 0.0})
+    writer.close()
+
+    def traced_rerun(recorder):
+        trace = recorder.start_trace()
+        for phase in ("render_history", "context_window", "cache_lookup", "suggestions", "history_store", "format_final"):
+            with trace.span(phase):
+                pass
+        trace.incr("turns")
+        trace.incr("cache_hits", False)
+        trace.finish()
+
+    for mode, recorder in (("disabled", MetricsRecorder()), ("enabled", MetricsRecorder(keep_recent=20))):
+        record("metrics_trace", mode, measure(lambda: traced_rerun(recorder)))
+    return results
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> int:
+    regressions = 0
+    print(f"\nComparison against baseline (threshold {threshold:.0%}):")
+    for case, params in current.items():
+        for param, stats in params.items():
+            base = baseline.get("results", baseline).get(case, {}).get(param)
+            if not base:
+                continue
+            ratio = stats["mean_us"] / base["mean_us"] if base["mean_us"] else 1.0
+            flag = "REGRESSION" if ratio > 1 + threshold else ("faster" if ratio < 1 - threshold else "")
+            regressions += flag == "REGRESSION"
+            print(f"{case:<28} {param:>8} | x{ratio:6.2f} {flag}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", help="Simpan hasil sebagai baseline JSON")
+    parser.add_argument("--compare", help="Bandingkan dengan baseline JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Ambang regresi relatif (default 20%%)")
+    args = parser.parse_args()
+
+    results = bench_all()
+    if args.save:
+        path = os.path.join(REPO_ROOT, args.save) if not os.path.isabs(args.save) else args.save
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump({"python": sys.version.split()[0], "created_at": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}, handle, indent=2)
+        print(f"\nBaseline saved to {path}")
+    if args.compare:
+        path = os.path.join(REPO_ROOT, args.compare) if not os.path.isabs(args.compare) else args.compare
+        with open(path, "r", encoding="utf-8") as handle:
+            return 1 if compare(results, json.load(handle), args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
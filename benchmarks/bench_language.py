@@ -0,0 +1,235 @@
+# benchmarks/bench_language.py
+"""Akurasi dan throughput identifikasi bahasa (language_tools) dibandingkan heuristik kata kunci lama.
+
+Sampel berlabel berisi prompt khas aplikasi, termasuk prompt Indonesia pendek yang memuat istilah
+Inggris ("tempo", "key", "mood") yang sering salah diklasifikasikan oleh heuristik lama.
+
+Akurasi dilaporkan untuk sampel penyetelan (SAMPLES) dan sampel held-out (HELDOUT_SAMPLES); hanya
+angka held-out yang bermakna untuk prompt baru. Ambang yang sama diperiksa di tests/test_language_tools.py.
+
+Jalankan dari root repo:
+    python benchmarks/bench_language.py
+    python benchmarks/bench_language.py --min-accuracy 0.95   # exit 1 jika akurasi held-out di bawah ambang
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from language_tools import ENGLISH, INDONESIAN, identify_language, identify_languages  # noqa: E402
+
+ENGLISH_KEYWORDS = frozenset(["the", "is", "are", "you", "what", "how", "why", "idea", "mood", "composition", "melody", "change", "key", "tempo"])
+
+SAMPLES = [(text, INDONESIAN) for text in (
+    "Saya ingin lagu tentang rindu yang tenang",
+    "Ubah tempo",
+    "Ubah key",
+    "Percepat tempo",
+    "Perlambat tempo sedikit",
+    "Ganti key ke minor",
+    "Tempo nya kecepetan",
+    "Key nya terlalu tinggi",
+    "Mood nya kurang sedih",
+    "Ubah kunci nada menjadi relative minor",
+    "Percepat tempo sebanyak 15 BPM",
+    "Buatkan lagu tentang hujan di malam hari",
+    "Aku lagi galau banget, buat lagu dong",
+    "Bagaimana kalau bridge nya pakai chord yang lebih gelap?",
+    "Tolong tambahkan instrumen string di chorus",
+    "Lagu tentang kenangan masa kecil di kampung halaman",
+    "Saya merasa kecewa dengan sahabat saya",
+    "Bisa jelaskan kenapa memilih kunci D minor?",
+    "Ganti genre jadi jazz",
+    "Buat versi akustik",
+    "Tambahkan groove yang lebih santai",
+    "Perasaan bahagia setelah wisuda",
+    "Cinta yang tidak pernah terucap",
+    "Suasana pagi yang cerah dan penuh harapan",
+    "Tempo 90 BPM saja",
+    "Kuncinya diturunkan satu nada",
+    "Mengapa progresi chordnya seperti itu?",
+    "Coba pakai time signature 3/4",
+    "Lagu sedih untuk perpisahan",
+    "Berikan ide komposisi tentang kesepian",
+    "Saya takut kehilangan orang tua",
+    "Buat lebih ceria",
+    "Kurangi dynamics nya",
+    "Ubah menjadi mayor",
+    "Naikkan tempo ke allegro",
+    "Bridge nya terlalu panjang",
+    "Chorus nya kurang nendang",
+    "Lagu untuk ulang tahun ibu",
+    "Melodi utama pakai piano saja",
+    "Apa instrumen yang cocok untuk lagu ini?",
+)] + [(text, ENGLISH) for text in (
+    "I want a song about hope after a storm",
+    "Change the key",
+    "Make it faster",
+    "Slow the tempo down a little",
+    "Change the key to the relative minor",
+    "Speed up the tempo by 15 BPM",
+    "Write a song about rain at night",
+    "I feel lonely tonight",
+    "What if the bridge used darker chords?",
+    "Please add strings to the chorus",
+    "A song about childhood memories in my hometown",
+    "I'm disappointed with my best friend",
+    "Can you explain why you chose D minor?",
+    "Switch the genre to jazz",
+    "Make an acoustic version",
+    "Add a more relaxed groove",
+    "The happiness of graduation day",
+    "A love that was never spoken",
+    "A bright morning full of hope",
+    "Tempo 90 BPM please",
+    "Lower the key by one step",
+    "Why does the chord progression sound like that?",
+    "Try a 3/4 time signature",
+    "A sad song for a farewell",
+    "Give me a composition idea about loneliness",
+    "I'm afraid of losing my parents",
+    "Make it more cheerful",
+    "Reduce the dynamics",
+    "Turn it into major",
+    "Raise the tempo to allegro",
+    "The bridge is too long",
+    "The chorus needs more punch",
+    "A birthday song for my mother",
+    "Use only piano for the main melody",
+    "Which instruments fit this song?",
+    "Nostalgic mood with warm pads",
+    "What is the time signature?",
+    "Show me the chord sheet again",
+    "How would this sound with a choir?",
+    "Something gentle and calm for sleeping",
+)]
+
+# Sampel held-out: TIDAK dipakai untuk menyusun tabel kata/trigram di language_tools, jadi akurasinya
+# mengukur prompt yang belum pernah dilihat. Jangan menyetel tabel terhadap daftar ini; tambahkan sampel
+# penyetelan ke SAMPLES. Banyak prompt sengaja pendek, informal, atau campuran Indonesia-Inggris.
+HELDOUT_SAMPLES = [(text, INDONESIAN) for text in (
+    "bikin lagu sad vibes",
+    "lagu galau buat mantan",
+    "pengen yang lebih upbeat dong",
+    "bridge-nya diganti aja",
+    "tolong chord progression nya dibikin jazzy",
+    "buatin intro yang catchy",
+    "temanya patah hati tapi tetap semangat",
+    "vibes nya kurang dapet",
+    "kalo pakai ukulele gimana",
+    "lagu buat acara nikahan sahabatku",
+    "aku kangen rumah",
+    "bisa dibuat lebih slow?",
+    "tambahin drum yang groovy",
+    "mood nya lebih happy ya",
+    "ganti jadi genre lofi",
+    "kenapa pakai kunci itu",
+    "reff nya diulang dua kali",
+    "cerita tentang perjalanan pulang kampung",
+    "liriknya jangan terlalu puitis",
+    "suasana senja di pantai",
+    "naikin satu nada dong",
+    "aku mau versi unplugged",
+    "coba chord nya dibalik",
+    "semangat pagi sebelum ujian",
+    "lagu pengantar tidur untuk anak",
+    "bikin yang ngebeat",
+    "kurang emosional menurutku",
+    "buat lagu sedih tapi tempo cepat",
+    "apa bedanya mayor dan minor",
+    "jelasin struktur lagunya",
+)] + [(text, ENGLISH) for text in (
+    "make it sound like a lullaby",
+    "can we try a waltz feel",
+    "write something for a rainy sunday",
+    "give it a cinematic ending",
+    "less drums, more piano",
+    "this feels too happy",
+    "I need a breakup song",
+    "how about a key change in the last chorus",
+    "add a guitar solo after the bridge",
+    "something upbeat for a road trip",
+    "what chords would make this darker",
+    "the lyrics should rhyme",
+    "keep the same melody but slower",
+    "a song for my dog who passed away",
+    "turn this into a ballad",
+    "explain the second verse",
+    "it should feel like summer",
+    "why did you pick that tempo",
+    "shorter intro please",
+    "make the chorus hit harder",
+    "a lonely walk through the city",
+    "could you simplify the chords",
+    "finish with a fade out",
+    "I'm nervous about my first concert",
+    "use a minor key instead",
+    "write it for solo violin",
+    "sounds great, now add a bass line",
+    "a gentle song about forgiveness",
+    "thanks, try another idea",
+    "remind me what the key was",
+)]
+
+# Prompt tanpa bukti bahasa: yang diharapkan hanya confidence rendah (< LOW_CONFIDENCE), agar pemanggil
+# memakai bahasa percakapan sebelumnya (lihat message_records.detect_language)
+AMBIGUOUS_PROMPTS = ("tempo 90", "120 bpm", "D minor", "jazz", "Cmaj7", "lofi", "3/4", "piano")
+
+
+def legacy_detect_language(text: str) -> str:
+    words = text.lower().split()
+    english_word_count = sum(1 for word in words if word in ENGLISH_KEYWORDS)
+    return "english" if english_word_count > (len(words) / 3) else "indonesian"
+
+
+def accuracy(predict, samples=SAMPLES) -> tuple:
+    errors = [(text, label) for text, label in samples if predict(text) != label]
+    return 1 - len(errors) / len(samples), errors
+
+
+def throughput(fn, texts, repeat: int = 20) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(texts)
+    return len(texts) * repeat / (time.perf_counter() - started)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-accuracy", type=float, default=None, help="Ambang akurasi minimum pada sampel held-out (exit 1 jika gagal)")
+    parser.add_argument("--show-errors", action="store_true")
+    args = parser.parse_args()
+
+    predict = lambda text: identify_language(text).language  # noqa: E731
+    for name, samples in (("tuning", SAMPLES), ("held-out", HELDOUT_SAMPLES)):
+        legacy_accuracy, legacy_errors = accuracy(legacy_detect_language, samples)
+        new_accuracy, new_errors = accuracy(predict, samples)
+        print(f"{name} samples: {len(samples)}")
+        print(f"  legacy keyword heuristic : accuracy {legacy_accuracy:.1%} ({len(legacy_errors)} errors)")
+        print(f"  language_tools           : accuracy {new_accuracy:.1%} ({len(new_errors)} errors)")
+        if args.show_errors:
+            for text, label in new_errors:
+                guess = identify_language(text)
+                print(f"    expected {label:<10} got {guess.language:<10} conf={guess.confidence:.2f} score={guess.score:+.1f} | {text}")
+
+    texts = [text for text, _ in SAMPLES] * 25
+    unique_texts = [f"{text} {index}" for index, text in enumerate(texts)]
+    long_text = " ".join(text for text, label in SAMPLES if label == INDONESIAN) * 50
+    print(f"throughput legacy        : {throughput(lambda ts: [legacy_detect_language(t) for t in ts], unique_texts):12,.0f} prompts/s")
+    print(f"throughput single        : {throughput(lambda ts: [identify_language(t) for t in ts], unique_texts):12,.0f} prompts/s")
+    print(f"throughput batch (dedup) : {throughput(identify_languages, texts):12,.0f} prompts/s")
+    started = time.perf_counter()
+    identify_language(long_text)
+    print(f"long text ({len(long_text) // 1024} KB)        : {(time.perf_counter() - started) * 1e3:10.2f} ms")
+
+    heldout_accuracy, _ = accuracy(predict, HELDOUT_SAMPLES)
+    if args.min_accuracy is not None and heldout_accuracy < args.min_accuracy:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
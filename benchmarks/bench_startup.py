@@ -0,0 +1,95 @@
+# benchmarks/bench_startup.py
+"""Biaya startup dan rerun: klien LLM + graf agen per sesi/rerun vs. bersama per proses.
+
+Membandingkan pola lama (ChatGoogleGenerativeAI baru di setiap rerun, graf `create_react_agent`
+dikompilasi per sesi browser) dengan registry bersama (`get_shared_llm` / `get_shared_agent`):
+
+    import_engine        waktu impor composer_engine di proses baru (startup dingin)
+    llm_per_rerun        create_default_llm() di setiap rerun (pola lama)
+    llm_shared           get_shared_llm() di setiap rerun (lookup)
+    agent_per_session    create_react_agent() per sesi baru (pola lama)
+    agent_shared         ComposerEngine(...).agent per sesi baru (lookup registry)
+    sessions_memory      alokasi untuk N sesi: graf per sesi vs. graf bersama
+
+Tanpa langchain_google_genai, klien LLM diganti FakeComposerChatModel (biaya graf tetap terukur).
+Jalankan dari root repo:
+    python benchmarks/bench_startup.py --sessions 50
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import timeit
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import composer_engine  # noqa: E402
+from composer_engine import ComposerEngine, SYSTEM_PROMPT, create_default_llm, get_shared_agent, get_shared_llm  # noqa: E402
+
+DUMMY_KEY = "bench-dummy-key"
+
+
+def best_of(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number
+
+
+def report(case: str, seconds: float) -> None:
+    print(f"{case:<22} {seconds * 1e3:10.3f} ms")
+
+
+def import_cost() -> float:
+    code = "import time; t = time.perf_counter(); import composer_engine; print(time.perf_counter() - t)"
+    samples = []
+    for _ in range(3):
+        output = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        samples.append(float(output.stdout.strip().splitlines()[-1]))
+    return min(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50, help="Jumlah sesi untuk pengukuran memori")
+    args = parser.parse_args()
+
+    from langgraph.prebuilt import create_react_agent
+
+    report("import_engine", import_cost())
+
+    try:
+        create_default_llm(DUMMY_KEY)
+        make_llm = lambda: create_default_llm(DUMMY_KEY)  # noqa: E731
+        report("llm_per_rerun", best_of(make_llm, 20))
+        report("llm_shared", best_of(lambda: get_shared_llm(DUMMY_KEY), 10_000))
+    except ImportError:
+        from fake_chat_model import FakeComposerChatModel
+
+        print("langchain_google_genai not installed: using FakeComposerChatModel as the client")
+        make_llm = FakeComposerChatModel
+        report("llm_per_rerun", best_of(make_llm, 20))
+
+    llm = make_llm()
+    report("agent_per_session", best_of(lambda: create_react_agent(model=llm, tools=[], prompt=SYSTEM_PROMPT), 5))
+    get_shared_agent(llm)
+    report("agent_shared", best_of(lambda: ComposerEngine(llm=llm).agent, 1_000))
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    per_session = [create_react_agent(model=make_llm(), tools=[], prompt=SYSTEM_PROMPT) for _ in range(args.sessions)]
+    per_session_kb = (tracemalloc.get_traced_memory()[0] - before) / 1024
+    del per_session
+    composer_engine._shared_agents.clear()
+    before = tracemalloc.get_traced_memory()[0]
+    shared = [ComposerEngine(llm=llm) for _ in range(args.sessions)]
+    for engine in shared:
+        engine.agent
+    shared_kb = (tracemalloc.get_traced_memory()[0] - before) / 1024
+    tracemalloc.stop()
+    print(f"{'sessions_memory':<22} {args.sessions} sessions: per-session {per_session_kb:,.0f} KB vs shared {shared_kb:,.0f} KB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+# cache_tools.py
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional, Sequence, Tuple
+
+from database_tools import DB_PATH
+
+# File cache diletakkan di direktori yang sama dengan suggestion_history.db
+CACHE_DB_PATH = os.path.join(os.path.dirname(DB_PATH), "response_cache.db")
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """Normalisasi untuk kunci cache: spasi diringkas dan huruf di-casefold."""
+    return _WHITESPACE_RE.sub(" ", text).strip().casefold()
+
+
+def make_cache_key(context: Iterable[Tuple[str, str]], prompt: str) -> str:
+    """Hash SHA-256 dari konteks percakapan (role, konten bersih) dan prompt yang dinormalisasi."""
+    digest = hashlib.sha256()
+    for role, content in context:
+        digest.update(role.encode("utf-8"))
+        digest.update(b"\x1f")
+        digest.update(normalize_text(content).encode("utf-8"))
+        digest.update(b"\x1e")
+    digest.update(b"\x1d")
+    digest.update(normalize_text(prompt).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def iter_replay_chunks(text: str, chunk_size: int = 64) -> Iterator[str]:
+    """Memecah jawaban dari cache menjadi potongan berbatas kata untuk diputar ulang lewat jalur streaming."""
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(length, start + chunk_size)
+        if end < length:
+            space = text.rfind(" ", start + 1, end)
+            if space != -1:
+                end = space + 1
+        yield text[start:end]
+        start = end
+
+
+class ResponseCache:
+    """Cache jawaban agen dengan eviksi LRU + TTL di memori dan persistensi SQLite.
+
+    Lapisan memori melayani sesi yang sedang berjalan dan dibatasi `max_entries` serta
+    `max_memory_bytes` (perkiraan `sys.getsizeof`, terpisah dari batas memori sesi); lapisan SQLite
+    (opsional) bertahan setelah restart dan dipangkas berdasarkan akses terakhir. Penghitung hit/miss
+    dan memori tersedia lewat `stats()`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 24 * 3600,
+        db_path: Optional[str] = CACHE_DB_PATH,
+        max_disk_entries: int = 10_000,
+        clock=time.time,
+        max_memory_bytes: int = 32 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_writes = 0
+        self.memory_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.speculative_hits = 0
+        self.speculative_misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if db_path:
+            self._open_db()
+
+    def _open_db(self) -> None:
+        try:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                cache_key TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_last_access ON response_cache (last_access)")
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Error opening response cache database: {e}")
+            self._conn = None
+
+    def _forget(self, key: str) -> None:
+        answer, _ = self._entries.pop(key)
+        self.memory_bytes -= sys.getsizeof(answer)
+
+    def _remember(self, key: str, answer: str, created_at: float) -> None:
+        if key in self._entries:
+            self._forget(key)
+        size = sys.getsizeof(answer)
+        if size > self.max_memory_bytes:
+            return
+        self._entries[key] = (answer, created_at)
+        self.memory_bytes += size
+        while len(self._entries) > self.max_entries or self.memory_bytes > self.max_memory_bytes:
+            self._forget(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get(self, key: str, speculative: bool = False) -> Optional[str]:
+        """Mengembalikan jawaban tersimpan atau None (entri kedaluwarsa dianggap miss).
+
+        Lookup `speculative` (giliran prefetch chip yang mungkin tidak pernah diklik) dihitung di
+        `speculative_hits`/`speculative_misses`, bukan di hit rate giliran pengguna.
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                answer, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self._count_hit(speculative)
+                    return answer
+                self._forget(key)
+                self.expirations += 1
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT answer, created_at FROM response_cache WHERE cache_key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        answer, created_at = row
+                        if now - created_at <= self.ttl_seconds:
+                            self._conn.execute("UPDATE response_cache SET last_access = ? WHERE cache_key = ?", (now, key))
+                            self._conn.commit()
+                            self._remember(key, answer, created_at)
+                            self._count_hit(speculative, disk=True)
+                            return answer
+                        self._conn.execute("DELETE FROM response_cache WHERE cache_key = ?", (key,))
+                        self._conn.commit()
+                        self.expirations += 1
+                except sqlite3.Error as e:
+                    logging.error(f"Response cache read failed: {e}")
+
+            if speculative:
+                self.speculative_misses += 1
+            else:
+                self.misses += 1
+            return None
+
+    def _count_hit(self, speculative: bool, disk: bool = False) -> None:
+        if speculative:
+            self.speculative_hits += 1
+            return
+        self.hits += 1
+        if disk:
+            self.disk_hits += 1
+
+    def put(self, key: str, answer: str) -> None:
+        now = self.clock()
+        with self._lock:
+            self._remember(key, answer, now)
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (cache_key, answer, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, answer, now, now),
+                )
+                self._disk_writes += 1
+                # Pemangkasan berkala: TTL dulu, lalu LRU berdasarkan akses terakhir
+                if self._disk_writes % 100 == 0:
+                    self._conn.execute("DELETE FROM response_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+                    self._conn.execute(
+                        """
+                        DELETE FROM response_cache WHERE cache_key IN (
+                            SELECT cache_key FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                        )
+                        """,
+                        (self.max_disk_entries,),
+                    )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Response cache write failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.memory_bytes = 0
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute("DELETE FROM response_cache")
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Response cache clear failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "speculative_hits": self.speculative_hits,
+            "speculative_misses": self.speculative_misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "memory_entries": len(self._entries),
+            "memory_bytes": self.memory_bytes,
+        }
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Cache bersama per proses (dibuat lazily)."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
+
+
+def response_cache_memory_bytes() -> int:
+    """Memori lapisan memori cache respons bersama (0 jika belum dibuat)."""
+    cache = _response_cache
+    return cache.memory_bytes if cache is not None else 0
+
+
+def context_for_cache(messages: Sequence) -> list:
+    """Mengubah pesan LangChain (HumanMessage/AIMessage) menjadi pasangan (role, konten) untuk kunci cache."""
+    return [(getattr(msg, "type", "unknown"), str(msg.content)) for msg in messages]
@@ -0,0 +1,481 @@
+# chord_tools.py
+"""Parser chord sheet dan mesin edit deterministik (transposisi, relative minor, tempo).
+
+Jawaban komposer selalu berisi baris Kunci/Key dan Tempo di narasi serta satu blok ``` chord sheet
+di akhir (lihat SYSTEM_PROMPT). Edit mekanis dari chip saran, seperti "Ubah kunci nada ... menjadi
+relative minor" atau "Percepat tempo ... sebanyak 15 BPM", dapat dijawab secara lokal dari komposisi
+terakhir tanpa round trip LLM. `apply_local_edit` mengembalikan None jika permintaan atau jawaban
+tidak dapat diproses dengan aman, sehingga pemanggil kembali ke jalur LLM biasa.
+"""
+
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+NOTE_INDEX = {
+    "C": 0, "B#": 0, "C#": 1, "Db": 1, "D": 2, "D#": 3, "Eb": 3, "E": 4, "Fb": 4, "E#": 5, "F": 5,
+    "F#": 6, "Gb": 6, "G": 7, "G#": 8, "Ab": 8, "A": 9, "A#": 10, "Bb": 10, "B": 11, "Cb": 11,
+}
+SHARP_NAMES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+FLAT_NAMES = ("C", "Db", "D", "Eb", "E", "F", "Gb", "G", "Ab", "A", "Bb", "B")
+# Tonika (pitch class) yang ditulis dengan mol: F Bb Eb Ab Db Gb mayor dan relative minor-nya
+FLAT_MAJOR_KEYS = frozenset((5, 10, 3, 8, 1, 6))
+FLAT_MINOR_KEYS = frozenset((2, 7, 0, 5, 10, 3))
+
+# Penanda tempo Italia dan rentang BPM-nya (batas bawah inklusif), urut naik
+TEMPO_MARKINGS = (
+    ("Largo", 0), ("Larghetto", 60), ("Adagio", 66), ("Andante", 76), ("Moderato", 108),
+    ("Allegro", 120), ("Vivace", 156), ("Presto", 176),
+)
+_TEMPO_MARKING_NAMES = tuple(name for name, _ in TEMPO_MARKINGS) + ("Lento", "Allegretto", "Andantino", "Prestissimo")
+MIN_BPM = 30
+MAX_BPM = 240
+
+CHORD_RE = re.compile(
+    r"(?P<root>[A-G][#b]?)"
+    r"(?P<suffix>(?:maj|min|m|dim|aug|sus|add|alt|M|\+|-|°|ø|\d|b|#|\(|\)|,)*)"
+    r"(?:/(?P<bass>[A-G][#b]?))?"
+)
+SECTION_RE = re.compile(r"^\s*\[(?P<name>[^\]\n]+)\]\s*$")
+# Token yang boleh muncul di baris chord selain chord (garis birama, pengulangan, "N.C.")
+_CHORD_LINE_EXTRAS = frozenset(("|", "||", "/", "-", "%", "N.C.", "NC", "x2", "x3", "x4", "(x2)", "(x3)", "(x4)"))
+_TOKEN_RE = re.compile(r"\S+")
+CODE_BLOCK_RE = re.compile(r"```[^\n]*\n(?P<body>.*?)```", re.DOTALL)
+
+KEY_LINE_RE = re.compile(
+    r"^(?P<label>[^\w\n]*(?i:kunci(?:\s+nada)?|key)\b[^\w\n]*)"
+    r"(?P<root>[A-G][#b]?)[ \t]*(?P<mode>(?i:major|mayor|minor|maj|min)\b|m\b)?",
+    re.MULTILINE,
+)
+TEMPO_LINE_RE = re.compile(r"^(?P<label>[^\w\n]*(?i:tempo)\b[^\n]*?)(?P<bpm>\d{2,3})(?P<unit>[ \t]*(?i:bpm))", re.MULTILINE)
+TEMPO_MARKING_RE = re.compile(r"\b(?:" + "|".join(_TEMPO_MARKING_NAMES) + r")\b", re.IGNORECASE)
+
+
+class ChordSymbol(NamedTuple):
+    root: str
+    suffix: str = ""
+    bass: Optional[str] = None
+
+    def __str__(self) -> str:
+        return f"{self.root}{self.suffix}/{self.bass}" if self.bass else f"{self.root}{self.suffix}"
+
+
+class PlacedChord(NamedTuple):
+    """Chord di baris chord beserta kolom awalnya (posisi di atas suku kata lirik)."""
+    column: int
+    text: str
+    chord: Optional[ChordSymbol]   # None untuk token non-chord ("|", "N.C.", "x2")
+
+
+class SheetLine(NamedTuple):
+    kind: str                       # 'section' | 'chords' | 'lyrics' | 'blank'
+    text: str
+    chords: Tuple[PlacedChord, ...] = ()
+    section: Optional[str] = None
+
+
+class KeySignature(NamedTuple):
+    root: str
+    minor: bool
+
+    @property
+    def pitch(self) -> int:
+        return NOTE_INDEX[self.root]
+
+    def name(self, language: str = "indonesian") -> str:
+        return f"{self.root} minor" if self.minor else f"{self.root} {'major' if language == 'english' else 'mayor'}"
+
+
+class Composition(NamedTuple):
+    """Jawaban komposer yang sudah diparsing: narasi sebelum blok, chord sheet, dan teks sesudahnya."""
+    before: str
+    lines: Tuple[SheetLine, ...]
+    after: str
+    key: Optional[KeySignature]
+    bpm: Optional[int]
+
+    @property
+    def sections(self) -> List[str]:
+        return [line.section for line in self.lines if line.kind == "section"]
+
+    @property
+    def chord_symbols(self) -> List[str]:
+        return [placed.text for line in self.lines for placed in line.chords if placed.chord is not None]
+
+
+def parse_chord(token: str) -> Optional[ChordSymbol]:
+    match = CHORD_RE.fullmatch(token)
+    if match is None:
+        return None
+    return ChordSymbol(match.group("root"), match.group("suffix"), match.group("bass"))
+
+
+def parse_sheet_line(text: str) -> SheetLine:
+    """Mengklasifikasikan satu baris chord sheet. Baris chord = semua token adalah chord/penanda birama."""
+    if not text.strip():
+        return SheetLine("blank", text)
+    section = SECTION_RE.match(text)
+    if section is not None:
+        return SheetLine("section", text, section=section.group("name").strip())
+    placed = []
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group(0)
+        chord = parse_chord(token)
+        if chord is None and token not in _CHORD_LINE_EXTRAS:
+            return SheetLine("lyrics", text)
+        placed.append(PlacedChord(match.start(), token, chord))
+    if not any(item.chord is not None for item in placed):
+        return SheetLine("lyrics", text)
+    return SheetLine("chords", text, tuple(placed))
+
+
+def parse_key(text: str) -> Optional[KeySignature]:
+    """Kunci dari baris "Kunci:/Key:" pertama (mis. "**Kunci:** D minor", "Key: Bb major")."""
+    for match in KEY_LINE_RE.finditer(text):
+        mode = (match.group("mode") or "").lower()
+        return KeySignature(match.group("root"), mode in ("minor", "min", "m"))
+    return None
+
+
+def parse_bpm(text: str) -> Optional[int]:
+    match = TEMPO_LINE_RE.search(text)
+    return int(match.group("bpm")) if match else None
+
+
+def parse_composition(text: str) -> Optional[Composition]:
+    """Memparsing jawaban komposer; None jika tidak ada blok chord sheet yang berisi baris chord."""
+    blocks = list(CODE_BLOCK_RE.finditer(text))
+    if not blocks:
+        return None
+    block = blocks[-1]
+    lines = tuple(parse_sheet_line(line) for line in block.group("body").rstrip("\n").split("\n"))
+    if not any(line.kind == "chords" for line in lines):
+        return None
+    before = text[:block.start()]
+    return Composition(before, lines, text[block.end():], parse_key(before), parse_bpm(before))
+
+
+def render_chord_line(chords: Tuple[PlacedChord, ...]) -> str:
+    """Menulis ulang baris chord dengan kolom semula; chord yang memanjang menggeser chord berikutnya
+    hanya jika perlu (minimal satu spasi), sehingga posisi di atas lirik tetap terjaga."""
+    parts: List[str] = []
+    cursor = 0
+    for placed in chords:
+        column = max(placed.column, cursor + 1) if parts else placed.column
+        parts.append(" " * (column - cursor))
+        parts.append(placed.text)
+        cursor = column + len(placed.text)
+    return "".join(parts)
+
+
+def render_composition(composition: Composition) -> str:
+    body = "\n".join(line.text for line in composition.lines)
+    return f"{composition.before}```\n{body}\n```{composition.after}"
+
+
+# --- Transposisi ---
+
+def spell(pitch: int, flats: bool) -> str:
+    return (FLAT_NAMES if flats else SHARP_NAMES)[pitch % 12]
+
+
+def uses_flats(key: KeySignature) -> bool:
+    return key.pitch in (FLAT_MINOR_KEYS if key.minor else FLAT_MAJOR_KEYS)
+
+
+def key_for(pitch: int, minor: bool) -> KeySignature:
+    """Kunci dengan ejaan konvensional (mis. pitch 10 -> "Bb", bukan "A#")."""
+    flats = pitch % 12 in (FLAT_MINOR_KEYS if minor else FLAT_MAJOR_KEYS)
+    return KeySignature(spell(pitch, flats), minor)
+
+
+def map_chords(composition: Composition, mapper: Callable[[ChordSymbol], ChordSymbol]) -> Tuple[Composition, Dict[str, str]]:
+    """Menerapkan `mapper` ke setiap chord di chord sheet. Mengembalikan (komposisi baru, {lama: baru})."""
+    renamed: Dict[str, str] = {}
+    lines = []
+    for line in composition.lines:
+        if line.kind != "chords":
+            lines.append(line)
+            continue
+        placed = []
+        for item in line.chords:
+            if item.chord is None:
+                placed.append(item)
+                continue
+            new_chord = mapper(item.chord)
+            renamed[item.text] = str(new_chord)
+            placed.append(PlacedChord(item.column, str(new_chord), new_chord))
+        placed = tuple(placed)
+        lines.append(SheetLine("chords", render_chord_line(placed), placed))
+    return composition._replace(lines=tuple(lines)), renamed
+
+
+def transpose_chord(chord: ChordSymbol, semitones: int, flats: bool) -> ChordSymbol:
+    bass = spell(NOTE_INDEX[chord.bass] + semitones, flats) if chord.bass else None
+    return ChordSymbol(spell(NOTE_INDEX[chord.root] + semitones, flats), chord.suffix, bass)
+
+
+# Derajat mayor -> derajat relative minor dengan fungsi harmoni yang sama (interval dari tonika):
+# I->i, ii->ii°, iii->III, IV->iv, V->V (minor harmonik), vi->VI, vii°->VII
+_MAJOR_TO_MINOR_DEGREE = {0: 0, 2: 2, 4: 3, 5: 5, 7: 7, 9: 8, 11: 10}
+_EXTENSION_RE = re.compile(r"^(?:maj|M)(?=\d)")
+
+
+def _is_minor(suffix: str) -> bool:
+    return suffix.startswith(("m", "min", "-")) and not suffix.startswith(("maj", "M"))
+
+
+def _to_minor(suffix: str) -> str:
+    if _is_minor(suffix) or suffix.startswith(("sus", "dim", "aug", "+", "7", "9", "11", "13", "°", "ø")):
+        return suffix
+    return "m" + _EXTENSION_RE.sub("", suffix)
+
+
+def _to_major(suffix: str) -> str:
+    if not _is_minor(suffix) or "b5" in suffix:
+        return suffix
+    rest = suffix[3:] if suffix.startswith("min") else suffix[1:]
+    return ("maj" + rest) if rest[:1].isdigit() and rest[:1] != "6" else rest
+
+
+def _to_half_diminished(suffix: str) -> str:
+    if not _is_minor(suffix) or "b5" in suffix:
+        return suffix
+    return "dim" if suffix in ("m", "min", "-") else "m7b5"
+
+
+def _to_subtonic(suffix: str) -> str:
+    if suffix in ("dim", "°"):
+        return ""
+    if suffix in ("m7b5", "ø", "ø7", "dim7", "°7"):
+        return "7"
+    return suffix
+
+
+_QUALITY_CHANGE: Dict[int, Callable[[str], str]] = {0: _to_minor, 5: _to_minor, 4: _to_major, 9: _to_major, 2: _to_half_diminished, 11: _to_subtonic}
+
+
+def relative_minor_mapper(key: KeySignature) -> Tuple[KeySignature, Callable[[ChordSymbol], ChordSymbol]]:
+    """Kunci relative minor dan pemeta chord per fungsi harmoni (chord non-diatonik hanya digeser)."""
+    tonic = key.pitch
+    target = key_for(tonic - 3, True)
+    flats = uses_flats(target)
+
+    def mapper(chord: ChordSymbol) -> ChordSymbol:
+        degree = (NOTE_INDEX[chord.root] - tonic) % 12
+        new_degree = _MAJOR_TO_MINOR_DEGREE.get(degree, degree)
+        root_pitch = target.pitch + new_degree
+        suffix = _QUALITY_CHANGE.get(degree, lambda value: value)(chord.suffix)
+        bass = spell(NOTE_INDEX[chord.bass] - NOTE_INDEX[chord.root] + root_pitch, flats) if chord.bass else None
+        return ChordSymbol(spell(root_pitch, flats), suffix, bass)
+
+    return target, mapper
+
+
+# Pemisah antarchord dalam progresi yang ditulis di narasi ("C - Am - F - G", "C | Am", "C → Am", "C, Am")
+_PROGRESSION_SEPARATOR = r"[ \t]*(?:->|[-–—|→,])[ \t]*"
+
+
+def _rename_in_text(text: str, renamed: Dict[str, str]) -> str:
+    """Mengganti nama chord di narasi (satu lintasan).
+
+    Simbol satu huruf ("A", "C") hanya diganti di dalam progresi, yaitu deret minimal dua chord yang
+    dipisah -, |, → atau koma, agar artikel "A" di kalimat biasa tidak tersentuh. Simbol lain diganti di mana pun.
+    """
+    if all(new == old for old, new in renamed.items()):
+        return text
+    chord = "(?:" + "|".join(re.escape(symbol) for symbol in sorted(renamed, key=len, reverse=True)) + ")"
+    bounded = rf"(?<![\w#/]){chord}(?![\w#])"
+    symbol_re = re.compile(bounded)
+    pattern = re.compile(rf"(?P<progression>{bounded}(?:{_PROGRESSION_SEPARATOR}{bounded})+)|{bounded}")
+
+    def rename(match: "re.Match[str]") -> str:
+        if match.group("progression"):
+            return symbol_re.sub(lambda chord_match: renamed[chord_match.group(0)], match.group(0))
+        symbol = match.group(0)
+        return renamed[symbol] if len(symbol) >= 2 else symbol
+
+    return pattern.sub(rename, text)
+
+
+def _rename_key(text: str, old: KeySignature, new: KeySignature, language: str) -> str:
+    """Mengganti penyebutan kunci lama ("D minor", "C major/mayor") dengan kunci baru."""
+    mode = "minor" if old.minor else "(?:major|mayor|maj)"
+    pattern = re.compile(rf"(?<![\w#]){re.escape(old.root)}\s+{mode}\b", re.IGNORECASE)
+    return pattern.sub(new.name(language), text)
+
+
+def to_relative_minor(composition: Composition, language: str = "indonesian") -> Optional[Composition]:
+    """Memindahkan komposisi mayor ke relative minor-nya; None jika kunci tidak diketahui atau sudah minor."""
+    if composition.key is None or composition.key.minor:
+        return None
+    target, mapper = relative_minor_mapper(composition.key)
+    mapped, renamed = map_chords(composition, mapper)
+    before = _rename_key(_rename_in_text(mapped.before, renamed), composition.key, target, language)
+    after = _rename_in_text(mapped.after, renamed)
+    return mapped._replace(before=before, after=after, key=target)
+
+
+def transpose_composition(composition: Composition, semitones: int, language: str = "indonesian") -> Optional[Composition]:
+    """Transposisi seluruh komposisi sebanyak `semitones` (ejaan mengikuti kunci tujuan)."""
+    if composition.key is None:
+        return None
+    target = key_for(composition.key.pitch + semitones, composition.key.minor)
+    flats = uses_flats(target)
+    mapped, renamed = map_chords(composition, lambda chord: transpose_chord(chord, semitones, flats))
+    before = _rename_key(_rename_in_text(mapped.before, renamed), composition.key, target, language)
+    return mapped._replace(before=before, after=_rename_in_text(mapped.after, renamed), key=target)
+
+
+# --- Tempo ---
+
+def tempo_marking(bpm: int) -> str:
+    marking = TEMPO_MARKINGS[0][0]
+    for name, lower in TEMPO_MARKINGS:
+        if bpm >= lower:
+            marking = name
+    return marking
+
+
+def change_tempo(composition: Composition, delta: int) -> Optional[Composition]:
+    """Menulis ulang baris Tempo (BPM dan penanda Italia-nya, mis. Andante -> Moderato)."""
+    if composition.bpm is None:
+        return None
+    bpm = max(MIN_BPM, min(MAX_BPM, composition.bpm + delta))
+    marking = tempo_marking(bpm)
+
+    def rewrite(match: "re.Match[str]") -> str:
+        label = TEMPO_MARKING_RE.sub(marking, match.group("label"), count=1)
+        return f"{label}{bpm}{match.group('unit')}"
+
+    before = TEMPO_LINE_RE.sub(rewrite, composition.before, count=1)
+    return composition._replace(before=before, bpm=bpm)
+
+
+# --- Permintaan edit lokal ---
+
+class LocalEdit(NamedTuple):
+    kind: str          # 'relative_minor' | 'tempo' | 'transpose'
+    amount: int = 0    # delta BPM atau semitone
+    drum_beat: bool = False
+
+
+_RELATIVE_MINOR_RE = re.compile(r"\brelati(?:ve|f)\s+minor\b")
+_TEMPO_RE = re.compile(
+    r"\b(?P<verb>percepat|naikkan|cepatkan|tambah|increase|speed\s+up|raise|perlambat|turunkan|lambatkan|kurangi|decrease|slow\s+down|lower)\b"
+    r".*?\btempo\b.*?(?:sebanyak|by|sebesar|\+|-)\s*(?P<amount>\d{1,3})\s*bpm\b"
+)
+_TRANSPOSE_RE = re.compile(
+    r"\b(?P<verb>transpose|transposisi|naikkan|turunkan|raise|lower|geser)\b.*?"
+    r"(?P<amount>\d{1,2})\s*(?:semitones?|semiton|setengah\s+nada)\b"
+)
+_DOWN_RE = re.compile(r"\b(?:turunkan|lower|down|turun|ke\s+bawah)\b")
+_DRUM_BEAT_RE = re.compile(r"^(?:ubah|ganti|change|switch)\s+(?:the\s+)?(?:drum\s+beat|beat\s+drum(?:nya)?|beat\s+drum\s*nya)$")
+_CLAUSE_SPLIT_RE = re.compile(r"\s*(?:\bdan\b|\band\b|\blalu\b|\bthen\b|,|;)\s*")
+_SLOWER_VERBS = ("perlambat", "turunkan", "lambatkan", "kurangi", "decrease", "slow", "lower")
+
+
+def _edit_for_clause(clause: str) -> Optional[LocalEdit]:
+    if _RELATIVE_MINOR_RE.search(clause) and re.search(r"\b(?:kunci|key)\b", clause):
+        return LocalEdit("relative_minor")
+    match = _TEMPO_RE.search(clause)
+    if match is not None:
+        amount = int(match.group("amount"))
+        return LocalEdit("tempo", -amount if match.group("verb").startswith(_SLOWER_VERBS) else amount)
+    match = _TRANSPOSE_RE.search(clause)
+    if match is not None:
+        amount = int(match.group("amount"))
+        return LocalEdit("transpose", -amount if _DOWN_RE.search(clause) else amount)
+    return None
+
+
+def parse_edit_request(prompt: str) -> Optional[LocalEdit]:
+    """Mengenali permintaan edit mekanis. Setiap klausa harus berupa edit yang dikenal (atau "ubah beat
+    drum"), sehingga permintaan campuran seperti "percepat tempo 10 BPM dan tambah saxophone" tetap ke LLM."""
+    text = re.sub(r"[*_`]", "", prompt).lower().strip().rstrip(".!?")
+    edit, drum_beat = None, False
+    for clause in filter(None, _CLAUSE_SPLIT_RE.split(text)):
+        if _DRUM_BEAT_RE.match(clause):
+            drum_beat = True
+            continue
+        clause_edit = _edit_for_clause(clause)
+        if clause_edit is None or edit is not None:
+            return None
+        edit = clause_edit
+    if edit is None or (drum_beat and edit.kind != "tempo"):
+        return None
+    return edit._replace(drum_beat=drum_beat)
+
+
+# Pola drum per rentang tempo (dipakai jika chip juga meminta "ubah beat drum")
+_DRUM_PATTERNS = (
+    (0, "pola *half-time* dengan *brushes* di snare dan *kick* pada ketukan 1",
+        "a *half-time* pattern with brushes on the snare and the kick on beat 1"),
+    (76, "*straight 8th* di hi-hat dengan *ghost notes* lembut di snare",
+        "*straight 8th* hi-hats with soft *ghost notes* on the snare"),
+    (108, "pola *pop-rock* 8th dengan *open hi-hat* di akhir setiap frasa",
+        "a *pop-rock* 8th pattern with an *open hi-hat* at the end of each phrase"),
+    (120, "hi-hat *16th* yang rapat dengan *backbeat* tegas di ketukan 2 dan 4",
+        "tight *16th* hi-hats with a firm *backbeat* on 2 and 4"),
+    (156, "nuansa *double-time* dengan *ride cymbal* dan aksen *crash* di awal chorus",
+        "a *double-time* feel on the *ride cymbal* with *crash* accents at the top of the chorus"),
+)
+
+
+def _drum_pattern(bpm: int, language: str) -> str:
+    pattern = _DRUM_PATTERNS[0]
+    for entry in _DRUM_PATTERNS:
+        if bpm >= entry[0]:
+            pattern = entry
+    return pattern[2] if language == "english" else pattern[1]
+
+
+def _edit_note(edit: LocalEdit, old: Composition, new: Composition, language: str) -> str:
+    english = language == "english"
+    if edit.kind == "relative_minor":
+        old_key, new_key = old.key.name(language), new.key.name(language)
+        if english:
+            return (f"Here is the same composition moved to **{new_key}**, the *relative minor* of {old_key}. "
+                    "Each chord keeps its harmonic function (I→i, ii→ii°, IV→iv, V→V, vi→VI), so the melody and "
+                    "lyric alignment stay intact while the tonal centre darkens.")
+        return (f"Berikut komposisi yang sama dalam kunci **{new_key}**, *relative minor* dari {old_key}. "
+                "Setiap chord mempertahankan fungsi harmoninya (I→i, ii→ii°, IV→iv, V→V, vi→VI), sehingga melodi dan "
+                "posisi lirik tetap utuh sementara pusat tonalnya menjadi lebih gelap.")
+    if edit.kind == "transpose":
+        steps = abs(edit.amount)
+        if english:
+            return f"Here is the composition transposed {'up' if edit.amount > 0 else 'down'} {steps} semitone(s) to **{new.key.name(language)}**."
+        return f"Berikut komposisi yang ditransposisi {'naik' if edit.amount > 0 else 'turun'} {steps} semitone ke kunci **{new.key.name(language)}**."
+    marking = tempo_marking(new.bpm)
+    if english:
+        note = f"The **tempo** moves from {old.bpm} to **{new.bpm} BPM** (*{marking}*); harmony and structure are unchanged."
+        if edit.drum_beat:
+            note += f" For the drums, switch to {_drum_pattern(new.bpm, language)} to carry the new energy."
+        return note
+    note = f"**Tempo** dinaikkan dari {old.bpm} menjadi **{new.bpm} BPM** (*{marking}*); harmoni dan struktur tetap sama." if new.bpm >= old.bpm else \
+        f"**Tempo** diturunkan dari {old.bpm} menjadi **{new.bpm} BPM** (*{marking}*); harmoni dan struktur tetap sama."
+    if edit.drum_beat:
+        note += f" Untuk drum, gunakan {_drum_pattern(new.bpm, language)} agar energi barunya terasa."
+    return note
+
+
+def apply_local_edit(previous_answer: str, prompt: str, language: str = "indonesian") -> Optional[str]:
+    """Menjawab permintaan edit mekanis secara lokal dari jawaban (chord sheet) sebelumnya.
+
+    Mengembalikan jawaban lengkap (catatan perubahan + narasi yang diperbarui + chord sheet), atau None
+    jika permintaan bukan edit mekanis atau jawaban sebelumnya tidak dapat diparsing.
+    """
+    edit = parse_edit_request(prompt)
+    if edit is None:
+        return None
+    composition = parse_composition(previous_answer)
+    if composition is None:
+        return None
+    if edit.kind == "relative_minor":
+        edited = to_relative_minor(composition, language)
+    elif edit.kind == "transpose":
+        edited = transpose_composition(composition, edit.amount, language)
+    else:
+        edited = change_tempo(composition, edit.amount)
+    if edited is None:
+        return None
+    return f"{_edit_note(edit, composition, edited, language)}\n\n{render_composition(edited).strip()}"
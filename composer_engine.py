@@ -0,0 +1,661 @@
+# composer_engine.py
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from cache_tools import ResponseCache, get_response_cache, iter_replay_chunks, make_cache_key, context_for_cache
+from chord_tools import apply_local_edit
+from context_tools import ConversationWindow, estimate_tokens
+from database_tools import save_suggestion_history
+from message_records import ConversationLog, MessageRecord
+from metrics_tools import get_metrics
+from prefetch_tools import PrefetchEntry, PrefetchPolicy, SuggestionPrefetcher
+from resilience_tools import CANCEL_POLL_INTERVAL, CallOutcome, CallPolicy, CancelToken, ResilientAgentCaller, TurnCancelled
+from suggestion_tools import get_dynamic_suggestions
+
+MODEL_NAME = "gemini-2.5-flash"
+MODEL_TEMPERATURE = 0.8
+
+# Jawaban yang lebih pendek dari ini dianggap gagal dan memicu retry
+MIN_ANSWER_LENGTH = 50
+# Jawaban harus lebih panjang dari ini agar mendapat saran lanjutan
+MIN_SUGGESTION_ANSWER_LENGTH = 100
+# Setelah balasan asisten ke-8, percakapan dianggap keluar dari fase modifikasi satu lagu
+TRANSITION_THRESHOLD = 7
+
+FAILURE_PREFIXES = ("**[AGENT FAILURE]**", "**[KEGAGALAN AGEN]**")
+ERROR_PREFIXES = FAILURE_PREFIXES + ("**[ERROR RESPONS AGEN]**",)
+NON_INFORMATIONAL_KEYWORDS = ("gagal", "mohon maaf", "terjadi kesalahan", "sorry", "error", "fail", "failure", "kegagalan")
+
+# Salam pembuka yang selalu menjadi pesan pertama percakapan
+INITIAL_GREETING = (
+    "Halo! Saya adalah **Emotional Composer Bot** 🎶. Ceritakanlah tentang **perasaan, kisah, atau suasana hati** yang ingin Anda terjemahkan menjadi musik."
+    "Saya akan merancang ide **komposisi** lengkap, disajikan dalam **format lirik/chord sheet** yang rapi. Saya hanya bisa memberikan **deskripsi musikal**."
+)
+
+# --- SYSTEM PROMPT DENGAN PENINGKATAN KUALITAS OUTPUT ---
+SYSTEM_PROMPT = (
+    "You are an expert Emotional Composer Agent. Your primary role is to interpret the user's emotions, stories, or mood descriptions "
+    "and translate them into a detailed, professional musical composition idea. Your output must include the **key, tempo, mood, primary instruments, a conceptual chord progression, and a detailed musical narrative.**"
+
+    "**CRITICAL RULE: YOU MUST RESPOND IN THE SAME LANGUAGE THE USER USED IN THEIR LAST MESSAGE.** "
+
+    "**CRITICAL RULE: STRICT ADHERENCE** You must strictly adhere to ALL formatting rules and musical requirements below. **DO NOT generate content that violates the rules.**"
+    "**CONSTRAINT:** You cannot generate technical musical notation like tablature, sheet music, or specific note sequences (e.g., C4, E4). Always provide conceptual descriptions instead of technical data."
+
+    "**RHYTHMIC REQUIREMENT:** Every composition must specify the **Time Signature** (e.g., 4/4, 3/4) and the overall **Groove/Feel** (e.g., Swing, Straight, Shuffle, Bossa Nova)."
+    "**TIMBRAL REQUIREMENT:** You must specify the **Dynamics** (e.g., *mf, p, f*) and **Specific Instrumental Techniques/Effects** (e.g., *pizzicato strings, flanger effect on guitar, muted brass*) for the primary instruments to achieve the desired emotional color."
+    "**STRUCTURAL REQUIREMENT:** Every composition must include a minimum of **[VERSE 1], [CHORUS], dan [BRIDGE]** atau **[CODA]**. Clearly label each section in your response and in the chord sheet."
+    "**HARMONIC REQUIREMENT:** To ensure a rich, professional sound, your chord progressions must actively utilize **extensions (e.g., maj7, add9, 11th), suspensions (sus2, sus4), or non-diatonic/altered chords (e.g., V7alt) in at least three different chords.** Explicitly mention the musical impact of these complex chords in your description."
+    "**NARRATIVE INTEGRATION MANDATE:** You must explicitly describe **how** the chosen Key, Tempo, Instrumentation, **Groove, and Dynamics** reflect or resolve the user's emotional narrative. Detail the story arc within the music theory."
+
+    "**FORMAT RULE 1 (CHORD SHEET - CRITICAL FOR VISUAL ALIGNMENT):** You MUST format the core composition idea using a **lyric/chord sheet style** inside a single Markdown code block (` ``` `). **This code block MUST appear at the very end of your response, after all narrative descriptions.**"
+    "To achieve perfect alignment: 1. Use a four-line structure: [Section Name], Chord line, Lyric/Description line, and then a blank line. 2. **CHORD LINE:** Use **MINIMAL 4 SPACES** untuk memposisikan nama chord tepat di atas kata/suku kata. 3. **LYRIC LINE:** Tambahkan **SPASI EKSTRA** di antara kata (minimal 2 spasi) untuk memisahkan kata secara visual."
+
+    "Example of required ALIGNED CHORD format:"
+    "```"
+    "[VERSE 1]"
+    "Gm        Cmaj7        F"
+    "My  weary  heart  keeps  beating  slow"
+    "```"
+
+    "Your final response must be creative, evocative, and highly technical in its musical descriptions."
+)
+
+
+def create_default_llm(google_api_key: str, model: str = MODEL_NAME, temperature: float = MODEL_TEMPERATURE):
+    """Membuat chat model Gemini default (diimpor lazily agar engine cepat dimuat)."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(model=model, google_api_key=google_api_key, temperature=temperature)
+
+
+# Chat model dan graf agen dibagi oleh semua sesi dalam satu proses: satu pool koneksi HTTP dan
+# satu graf terkompilasi. Keduanya stateless; state per sesi hanya lewat pesan yang dikirim.
+_shared_llms: Dict[tuple, object] = {}
+_shared_agents: Dict[tuple, tuple] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_llm(google_api_key: str, model: str = MODEL_NAME, temperature: float = MODEL_TEMPERATURE):
+    """Chat model bersama per proses untuk kombinasi (API key, model, temperatur), dibuat lazily."""
+    key = (google_api_key, model, temperature)
+    with _shared_lock:
+        llm = _shared_llms.get(key)
+        if llm is None:
+            llm = _shared_llms[key] = create_default_llm(google_api_key, model, temperature)
+        return llm
+
+
+def get_shared_agent(llm, system_prompt: str = SYSTEM_PROMPT, tools: Optional[list] = None):
+    """Graf ReAct bersama per proses untuk (llm, system prompt, tools), dikompilasi sekali."""
+    tools = tools or []
+    key = (id(llm), system_prompt, tuple(id(tool) for tool in tools))
+    with _shared_lock:
+        entry = _shared_agents.get(key)
+        if entry is None:
+            from langgraph.prebuilt import create_react_agent
+
+            # llm dan tools ikut disimpan agar id() di kunci tidak dipakai ulang objek lain
+            entry = _shared_agents[key] = (create_react_agent(model=llm, tools=tools, prompt=system_prompt), llm, tuple(tools))
+        return entry[0]
+
+
+def to_langchain_messages(history) -> list:
+    """Mengubah pasangan (role, konten bersih) menjadi HumanMessage/AIMessage/SystemMessage."""
+    messages = []
+    for role, content in history:
+        if role == "user": messages.append(HumanMessage(content=content))
+        elif role == "assistant": messages.append(AIMessage(content=content))
+        elif role == "system": messages.append(SystemMessage(content=content))
+    return messages
+
+
+class TurnTiming(NamedTuple):
+    """Waktu streaming satu giliran: time-to-first-token, durasi total dan laju token (estimasi lokal)."""
+    ttft: Optional[float]
+    duration: float
+    tokens: int
+    tokens_per_second: float
+
+
+class CompositionResult(NamedTuple):
+    answer: str
+    record: MessageRecord
+    suggestions: List[str]
+    language: str
+    from_cache: bool = False
+    used_fallback: bool = False
+    ok: bool = True
+    timing: Optional[TurnTiming] = None
+    local_edit: bool = False
+    from_prefetch: bool = False
+
+
+class StreamEvent(NamedTuple):
+    """Event dari `stream()`/`astream()`.
+
+    'delta' (potongan teks), 'reset' (buang teks yang sudah tampil; retry dimulai dari awal),
+    'cancelled' (giliran dibatalkan, tidak ada hasil) atau 'final' (hasil akhir).
+    """
+    kind: str
+    text: str = ""
+    result: Optional[CompositionResult] = None
+
+
+class ComposerTurn:
+    """State satu giliran: record pengguna, teks status, pesan untuk model, kunci cache, token pembatalan dan trace metrik.
+
+    `local_answer` berisi jawaban edit mekanis (chord_tools) yang dihitung lokal tanpa LLM, dan
+    `prefetched` jawaban chip spekulatif (prefetch_tools) yang sudah/sedang dihasilkan di latar belakang.
+    """
+
+    __slots__ = ("turn_id", "conversation", "prompt", "user_record", "language", "status_text", "messages", "cache_key", "cached_answer", "local_answer", "prefetched", "cancel_token", "trace", "owns_trace")
+
+    def __init__(self, conversation: ConversationLog, prompt: str, user_record: MessageRecord, status_text: str, messages: list, cache_key: str, cached_answer: Optional[str], trace, owns_trace: bool = True, local_answer: Optional[str] = None, prefetched: Optional[PrefetchEntry] = None):
+        # Trace ID (jika metrik aktif) juga menjadi ID giliran di log event
+        self.turn_id = trace.trace_id or uuid.uuid4().hex[:12]
+        self.conversation = conversation
+        self.prompt = prompt
+        self.user_record = user_record
+        self.language = user_record.language
+        self.status_text = status_text
+        self.messages = messages
+        self.cache_key = cache_key
+        self.cached_answer = cached_answer
+        self.local_answer = local_answer
+        self.prefetched = prefetched
+        self.cancel_token = CancelToken()
+        self.trace = trace
+        self.owns_trace = owns_trace
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Membatalkan giliran yang sedang di-stream (aman dipanggil dari thread/rerun lain)."""
+        self.cancel_token.cancel(reason)
+
+
+def status_text_for(conversation: ConversationLog, language: str) -> str:
+    """Teks spinner/status berdasarkan fase percakapan (juga dipakai di pesan error)."""
+    # Kriteria untuk menggunakan Spinner Musikal Spesifik:
+    is_musical_focus_phase = conversation.has_chord_sheet and conversation.substantive_assistant_count <= TRANSITION_THRESHOLD
+    if is_musical_focus_phase:
+        # Spinner spesifik tentang musik (modifikasi/lanjutan)
+        if language == "english":
+            return "Composer Agent is translating emotion into music..."
+        return "Agen Komposer sedang menerjemahkan emosi ke musik..."
+    # Spinner umum untuk percakapan naratif/non-musikal/topik baru
+    if language == "english":
+        return "Analyzing your request, please wait..."
+    return "Menganalisa permintaan Anda, mohon tunggu..."
+
+
+def message_text(message) -> str:
+    """Teks dari konten pesan (string, atau daftar part Gemini berisi blok 'text')."""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            part if isinstance(part, str) else part.get("text", "")
+            for part in content
+            if isinstance(part, str) or (isinstance(part, dict) and part.get("type", "text") == "text")
+        )
+    return ""
+
+
+def _token_text(item) -> str:
+    """Teks delta dari satu item `stream_mode="messages"` LangGraph: tuple (message_chunk, metadata).
+
+    Hanya chunk AI dari node agen tanpa tool call yang diteruskan; delta spasi/newline tetap dipertahankan
+    karena merupakan bagian dari jawaban.
+    """
+    message, metadata = item
+    if not isinstance(message, AIMessage):
+        return ""
+    if metadata and metadata.get("langgraph_node", "agent") != "agent":
+        return ""
+    if message.tool_calls or getattr(message, "tool_call_chunks", None):
+        return ""
+    return message_text(message)
+
+
+class _StreamClock:
+    """Mencatat time-to-first-token dan tokens/detik selama streaming."""
+
+    __slots__ = ("started", "first_token")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token: Optional[float] = None
+
+    def mark(self) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def timing(self, text: str) -> TurnTiming:
+        finished = time.perf_counter()
+        tokens = estimate_tokens(text)
+        generating = finished - self.first_token if self.first_token is not None else 0.0
+        return TurnTiming(
+            ttft=self.first_token - self.started if self.first_token is not None else None,
+            duration=finished - self.started,
+            tokens=tokens,
+            tokens_per_second=tokens / generating if generating > 0 else 0.0,
+        )
+
+
+def _log_timing(timing: TurnTiming, outcome: CallOutcome) -> None:
+    ttft = f"{timing.ttft:.3f}s" if timing.ttft is not None else "n/a"
+    logging.info(
+        f"Turn streamed: ttft={ttft} duration={timing.duration:.3f}s "
+        f"tokens~{timing.tokens} ({timing.tokens_per_second:.1f} tok/s) "
+        f"status={outcome.status} attempts={outcome.attempts} continuations={outcome.continuations} hedged={outcome.hedged}"
+    )
+
+
+def _failure_text(language: str, outcome: CallOutcome) -> str:
+    if language == "english":
+        return f"**[AGENT FAILURE]** The agent failed after {outcome.attempts} attempt(s) ({outcome.status}): {outcome.error}. Please use 'New Chat'."
+    return f"**[KEGAGALAN AGEN]** Agen gagal setelah {outcome.attempts} percobaan ({outcome.status}): {outcome.error}. Mohon gunakan 'New Chat'."
+
+
+def _truncation_note(language: str, outcome: CallOutcome) -> str:
+    """Catatan di akhir jawaban parsial yang tetap ditampilkan setelah pemanggilan gagal di tengah jalan."""
+    if language == "english":
+        return f"\n\n---\n*⚠️ This answer was cut off ({outcome.status}) after {outcome.attempts} attempt(s). Ask me to continue or try again.*"
+    return f"\n\n---\n*⚠️ Jawaban ini terpotong ({outcome.status}) setelah {outcome.attempts} percobaan. Minta saya melanjutkan atau coba lagi.*"
+
+
+class ComposerEngine:
+    """Logika komposer tanpa Streamlit: agen LangGraph, retry, cache, jendela konteks dan saran.
+
+    Chat model dan penyimpan riwayat dapat diinjeksi, sehingga engine bisa dipakai dari worker,
+    server API atau skrip batch. Streamlit hanya menjadi klien tipis yang merender event.
+
+    Engine tidak menyimpan state percakapan (semuanya ada di `ConversationLog`), sehingga satu instance
+    aman dipakai bersama oleh banyak sesi/thread. Dengan `shared=True` chat model dan graf agen
+    diambil dari registry per proses (`get_shared_llm` / `get_shared_agent`).
+    """
+
+    def __init__(
+        self,
+        llm=None,
+        google_api_key: Optional[str] = None,
+        history_store: Optional[Callable[[str, str, List[str]], bool]] = save_suggestion_history,
+        response_cache: Optional[ResponseCache] = None,
+        use_cache: bool = True,
+        system_prompt: str = SYSTEM_PROMPT,
+        max_turns: int = 6,
+        token_budget: int = 24_000,
+        tools: Optional[list] = None,
+        call_policy: Optional[CallPolicy] = None,
+        shared: bool = True,
+        local_edits: bool = True,
+        prefetch_policy: Optional[PrefetchPolicy] = None,
+    ):
+        if llm is None and google_api_key is None:
+            raise ValueError("ComposerEngine requires either an llm or a google_api_key.")
+        self._llm = llm
+        self._google_api_key = google_api_key
+        self.history_store = history_store
+        self._response_cache = response_cache
+        self.use_cache = use_cache
+        self.system_prompt = system_prompt
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.tools = tools or []
+        self.shared = shared
+        # Edit mekanis (relative minor, tempo +/- N BPM, transposisi) dijawab lokal dari chord sheet terakhir
+        self.local_edits = local_edits
+        self._agent = None
+        self._agent_lock = threading.Lock()
+        # Deadline, timeout stream, retry/continuation dan hedging untuk setiap pemanggilan agen
+        self.caller = ResilientAgentCaller(lambda: self.agent, _token_text, call_policy or CallPolicy(min_answer_length=MIN_ANSWER_LENGTH))
+        # Prefetch spekulatif jawaban chip (nonaktif tanpa `prefetch_policy`)
+        self.prefetcher = SuggestionPrefetcher(self, prefetch_policy) if prefetch_policy is not None else None
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = get_shared_llm(self._google_api_key) if self.shared else create_default_llm(self._google_api_key)
+        return self._llm
+
+    @property
+    def agent(self):
+        """Graf ReAct yang dikompilasi lazily saat pertama kali dibutuhkan (sekali per proses jika `shared`)."""
+        if self._agent is None:
+            with self._agent_lock:
+                if self._agent is None:
+                    if self.shared:
+                        self._agent = get_shared_agent(self.llm, self.system_prompt, self.tools)
+                    else:
+                        from langgraph.prebuilt import create_react_agent
+
+                        self._agent = create_react_agent(model=self.llm, tools=self.tools, prompt=self.system_prompt)
+        return self._agent
+
+    @property
+    def response_cache(self) -> Optional[ResponseCache]:
+        if not self.use_cache:
+            return None
+        if self._response_cache is None:
+            self._response_cache = get_response_cache()
+        return self._response_cache
+
+    def new_conversation(self, with_greeting: bool = True) -> ConversationLog:
+        """Percakapan baru, diawali salam pembuka seperti di halaman Streamlit."""
+        conversation = ConversationLog()
+        if with_greeting:
+            conversation.append("assistant", INITIAL_GREETING)
+        return conversation
+
+    def new_window(self) -> ConversationWindow:
+        return ConversationWindow(
+            max_turns=self.max_turns,
+            token_budget=self.token_budget,
+            reserved_tokens=estimate_tokens(self.system_prompt),
+        )
+
+    def prefetch_suggestions(self, conversation: ConversationLog, suggestions: List[str]) -> int:
+        """Mulai menghasilkan jawaban chip yang ditampilkan di latar belakang (no-op jika prefetch nonaktif)."""
+        if self.prefetcher is None or not suggestions:
+            return 0
+        return self.prefetcher.schedule(conversation, suggestions)
+
+    def cancel_prefetch(self, conversation: ConversationLog, reason: str = "cancelled", trace=None) -> None:
+        """Membatalkan prefetch percakapan (mis. "New Chat"); token yang sudah dihasilkan dicatat terbuang."""
+        if self.prefetcher is None:
+            return
+        owns_trace = trace is None
+        if owns_trace:
+            trace = get_metrics().start_trace()
+        self.prefetcher.cancel(conversation, reason, trace)
+        if owns_trace:
+            trace.finish()
+
+    # --- Persiapan dan penyelesaian giliran (dipakai jalur sync dan async) ---
+
+    def prepare_turn(self, conversation: ConversationLog, prompt: str, trace=None, speculative: bool = False) -> ComposerTurn:
+        """Menambahkan prompt ke percakapan dan menyiapkan konteks untuk model.
+
+        `trace` (opsional) adalah trace metrik milik pemanggil (mis. satu rerun Streamlit); tanpa itu
+        engine membuat trace sendiri dan menutupnya di akhir giliran. `speculative` menandai giliran
+        prefetch chip: lookup cache-nya tidak masuk hit rate cache respons.
+        """
+        owns_trace = trace is None
+        if owns_trace:
+            trace = get_metrics().start_trace()
+        # Prefetch chip: entry untuk prompt ini diambil, sisanya dibatalkan (prompt lain = pekerjaan terbuang)
+        prefetched = self.prefetcher.take(conversation, prompt, trace) if self.prefetcher is not None else None
+        user_record = conversation.append(MessageRecord.create("user", prompt))
+        status_text = status_text_for(conversation, user_record.language)
+
+        # Jendela konteks: N giliran terakhir + chord sheet terbaru + ringkasan bergulir, dalam anggaran token
+        with trace.span("context_window"):
+            if conversation.context_window is None:
+                conversation.context_window = self.new_window()
+            messages = to_langchain_messages(conversation.context_window.build(conversation.clean_history))
+
+        # Cache respons: kunci = hash konteks bersih + prompt yang dinormalisasi
+        with trace.span("cache_lookup"):
+            cache_key = make_cache_key(context_for_cache(messages[:-1]), prompt)
+            cache = self.response_cache
+            cached_answer = cache.get(cache_key, speculative=speculative) if cache is not None else None
+
+        local_answer = None
+        if cached_answer is None and self.local_edits and conversation.last_chord_record is not None:
+            with trace.span("local_edit"):
+                local_answer = apply_local_edit(conversation.last_chord_record.clean_content, prompt, user_record.language)
+        if prefetched is not None and (cached_answer is not None or local_answer is not None):
+            prefetched.discard("answered_locally", trace)
+            prefetched = None
+        return ComposerTurn(conversation, prompt, user_record, status_text, messages, cache_key, cached_answer, trace, owns_trace, local_answer, prefetched)
+
+    def finish_turn(self, turn: ComposerTurn, answer: str, used_fallback: bool = False, timing: Optional[TurnTiming] = None, truncated: bool = False) -> CompositionResult:
+        """Validasi jawaban akhir, saran lanjutan, cache, riwayat DB, lalu menambahkan jawaban ke percakapan."""
+        is_english = turn.language == "english"
+        if not answer.startswith(FAILURE_PREFIXES) and len(answer) < MIN_ANSWER_LENGTH:
+            # Pesan error yang lebih jelas jika output tetap kosong setelah semua retry
+            answer = (
+                f"**[ERROR RESPONS AGEN]** {turn.status_text} failed to produce output. Please try rephrasing your request or clicking 'New Chat'."
+                if is_english
+                else f"**[ERROR RESPONS AGEN]** {turn.status_text} gagal menghasilkan output. Mohon coba ulangi pertanyaan Anda atau klik 'New Chat'."
+            )
+
+        answer_record = MessageRecord.create("assistant", answer)
+        answer_lower = answer.lower()
+        is_informational_answer = not any(kw in answer_lower for kw in NON_INFORMATIONAL_KEYWORDS)
+
+        trace = turn.trace
+        suggestions: List[str] = []
+        # LOGIKA SUGGESTION CHIPS: Hanya jika jawaban substantif
+        if is_informational_answer and len(answer) > MIN_SUGGESTION_ANSWER_LENGTH:
+            cache = self.response_cache
+            if cache is not None and turn.cached_answer is None and turn.local_answer is None and not truncated:
+                cache.put(turn.cache_key, answer)
+            with trace.span("suggestions"):
+                suggestions = get_dynamic_suggestions(answer_record, turn.language, turn.conversation)
+            if suggestions and self.history_store is not None:
+                with trace.span("history_store"):
+                    self.history_store(turn.prompt, answer, suggestions)
+
+        turn.conversation.append(answer_record)
+        ok = not truncated and not answer.startswith(ERROR_PREFIXES)
+        trace.incr("turns")
+        trace.incr("cache_hits", turn.cached_answer is not None)
+        trace.incr("local_edits", turn.local_answer is not None)
+        trace.incr("fallbacks", used_fallback)
+        trace.incr("failures", not ok)
+        trace.set("language", turn.language)
+        if turn.owns_trace:
+            trace.finish()
+        return CompositionResult(
+            answer, answer_record, suggestions, turn.language,
+            from_cache=turn.cached_answer is not None,
+            used_fallback=used_fallback,
+            ok=ok,
+            timing=timing,
+            local_edit=turn.local_answer is not None,
+            from_prefetch=turn.prefetched is not None,
+        )
+
+    def _resolve_answer(self, turn: ComposerTurn, full_answer: str, outcome: CallOutcome, clock: _StreamClock):
+        """Jawaban akhir, timing dan status terpotong dari hasil pemanggilan.
+
+        Jika pemanggilan gagal (deadline, retry habis) setelah jawaban substantif ter-stream, teks itu
+        dipertahankan dengan catatan terpotong; pesan kegagalan hanya dipakai jika tidak ada yang layak.
+        """
+        partial = full_answer.strip()
+        truncated = False
+        if outcome.ok:
+            answer = partial
+        elif len(partial) >= MIN_ANSWER_LENGTH:
+            answer, truncated = partial + _truncation_note(turn.language, outcome), True
+        else:
+            answer = _failure_text(turn.language, outcome)
+        timing = clock.timing(full_answer)
+        _log_timing(timing, outcome)
+        self._trace_outcome(turn, outcome, timing)
+        return answer, timing, truncated
+
+    def _trace_outcome(self, turn: ComposerTurn, outcome: CallOutcome, timing: Optional[TurnTiming] = None) -> None:
+        trace = turn.trace
+        if not trace.enabled:
+            return
+        trace.incr("retries", max(0, outcome.attempts - 1))
+        trace.incr("continuations", outcome.continuations)
+        trace.incr("short_answers", outcome.short_answers)
+        trace.incr("hedges", outcome.hedged)
+        trace.set("status", outcome.status)
+        trace.set("attempts", outcome.attempts)
+        if timing is not None:
+            trace.add_span("llm_ttft", timing.ttft)
+            trace.add_span("llm_stream", timing.duration)
+            trace.set("tokens", timing.tokens)
+            trace.set("tokens_per_second", round(timing.tokens_per_second, 1))
+
+    def _cancelled(self, turn: ComposerTurn, outcome: CallOutcome) -> StreamEvent:
+        logging.info(f"Turn {turn.turn_id} cancelled ({turn.cancel_token.reason}).")
+        self._trace_outcome(turn, outcome)
+        turn.trace.incr("cancellations")
+        if turn.owns_trace:
+            turn.trace.finish()
+        return StreamEvent("cancelled")
+
+    def _replay_cached(self, turn: ComposerTurn) -> Iterator[StreamEvent]:
+        # --- CACHE HIT / EDIT LOKAL: diputar ulang lewat jalur streaming yang sama ---
+        if turn.cached_answer is not None:
+            answer = turn.cached_answer
+            logging.info(f"Response cache hit ({self.response_cache.stats()}).")
+        else:
+            answer = turn.local_answer
+            logging.info(f"Turn {turn.turn_id} answered by local chord-sheet edit.")
+        for content in iter_replay_chunks(answer):
+            yield StreamEvent("delta", content)
+        yield StreamEvent("final", result=self.finish_turn(turn, answer.strip()))
+
+    def _prefetch_fallback(self, turn: ComposerTurn, emitted: bool) -> Optional[StreamEvent]:
+        """Prefetch gagal/dibatalkan sebelum selesai: giliran dilanjutkan dengan panggilan LLM biasa."""
+        logging.info(f"Turn {turn.turn_id}: prefetched answer unusable ({turn.prefetched.outcome.status if turn.prefetched.outcome else 'cancelled'}), calling the agent.")
+        turn.trace.incr("prefetch_misses")
+        turn.prefetched.discard("unusable", turn.trace)
+        turn.prefetched = None
+        return StreamEvent("reset") if emitted else None
+
+    def _finish_prefetched(self, turn: ComposerTurn, full_answer: str, clock: _StreamClock) -> StreamEvent:
+        logging.info(f"Turn {turn.turn_id} answered from chip prefetch.")
+        turn.trace.incr("prefetch_hits")
+        answer, timing, truncated = self._resolve_answer(turn, full_answer, turn.prefetched.outcome, clock)
+        return StreamEvent("final", result=self.finish_turn(turn, answer, turn.prefetched.outcome.attempts > 1, timing, truncated))
+
+    # --- Jalur sinkron ---
+
+    def stream_turn(self, turn: ComposerTurn) -> Iterator[StreamEvent]:
+        if turn.cached_answer is not None or turn.local_answer is not None:
+            yield from self._replay_cached(turn)
+            return
+
+        if turn.prefetched is not None:
+            # --- PREFETCH CHIP: putar ulang stream yang sudah dihitung, ikuti jika masih berjalan ---
+            full_answer, emitted, clock = "", False, _StreamClock()
+            try:
+                for kind, content in turn.prefetched.follow(turn.cancel_token):
+                    if kind == "reset":
+                        full_answer = ""
+                        yield StreamEvent("reset")
+                        continue
+                    clock.mark()
+                    full_answer += content
+                    emitted = True
+                    yield StreamEvent("delta", content)
+            except TurnCancelled:
+                turn.prefetched.discard(turn.cancel_token.reason, turn.trace)
+                yield self._cancelled(turn, turn.prefetched.outcome or CallOutcome(turn.turn_id))
+                return
+            if turn.prefetched.ok:
+                yield self._finish_prefetched(turn, full_answer, clock)
+                return
+            reset = self._prefetch_fallback(turn, emitted)
+            if reset is not None:
+                yield reset
+
+        full_answer = ""
+        clock = _StreamClock()
+        outcome = CallOutcome(turn.turn_id)
+        try:
+            # Streaming token (stream_mode="messages") dengan deadline, retry dan continuation di caller
+            for kind, content in self.caller.stream(turn.messages, turn.language, turn.cancel_token, outcome):
+                if kind == "reset":
+                    full_answer = ""
+                    yield StreamEvent("reset")
+                    continue
+                clock.mark()
+                full_answer += content
+                yield StreamEvent("delta", content)
+        except TurnCancelled:
+            yield self._cancelled(turn, outcome)
+            return
+
+        answer, timing, truncated = self._resolve_answer(turn, full_answer, outcome, clock)
+        yield StreamEvent("final", result=self.finish_turn(turn, answer, outcome.attempts > 1, timing, truncated))
+
+    def stream(self, conversation: ConversationLog, prompt: str) -> Iterator[StreamEvent]:
+        return self.stream_turn(self.prepare_turn(conversation, prompt))
+
+    def compose(self, conversation: ConversationLog, prompt: str) -> Optional[CompositionResult]:
+        result = None
+        for event in self.stream(conversation, prompt):
+            if event.kind == "final":
+                result = event.result
+        return result
+
+    # --- Jalur asyncio ---
+
+    async def astream_turn(self, turn: ComposerTurn) -> AsyncIterator[StreamEvent]:
+        if turn.cached_answer is not None or turn.local_answer is not None:
+            for event in self._replay_cached(turn):
+                yield event
+            return
+
+        if turn.prefetched is not None:
+            full_answer, emitted, clock = "", False, _StreamClock()
+            index, done = 0, False
+            while not done:
+                if turn.cancel_token.cancelled:
+                    turn.prefetched.discard(turn.cancel_token.reason, turn.trace)
+                    yield self._cancelled(turn, turn.prefetched.outcome or CallOutcome(turn.turn_id))
+                    return
+                events, done = await asyncio.to_thread(turn.prefetched.wait, index, CANCEL_POLL_INTERVAL)
+                index += len(events)
+                for kind, content in events:
+                    if kind == "reset":
+                        full_answer = ""
+                        yield StreamEvent("reset")
+                        continue
+                    clock.mark()
+                    full_answer += content
+                    emitted = True
+                    yield StreamEvent("delta", content)
+                done = done and not events
+            if turn.prefetched.ok:
+                yield self._finish_prefetched(turn, full_answer, clock)
+                return
+            reset = self._prefetch_fallback(turn, emitted)
+            if reset is not None:
+                yield reset
+
+        full_answer = ""
+        clock = _StreamClock()
+        outcome = CallOutcome(turn.turn_id)
+        try:
+            async for kind, content in self.caller.astream(turn.messages, turn.language, turn.cancel_token, outcome):
+                if kind == "reset":
+                    full_answer = ""
+                    yield StreamEvent("reset")
+                    continue
+                clock.mark()
+                full_answer += content
+                yield StreamEvent("delta", content)
+        except TurnCancelled:
+            yield self._cancelled(turn, outcome)
+            return
+
+        answer, timing, truncated = self._resolve_answer(turn, full_answer, outcome, clock)
+        yield StreamEvent("final", result=self.finish_turn(turn, answer, outcome.attempts > 1, timing, truncated))
+
+    async def astream(self, conversation: ConversationLog, prompt: str) -> AsyncIterator[StreamEvent]:
+        async for event in self.astream_turn(self.prepare_turn(conversation, prompt)):
+            yield event
+
+    async def acompose(self, conversation: ConversationLog, prompt: str) -> Optional[CompositionResult]:
+        result = None
+        async for event in self.astream(conversation, prompt):
+            if event.kind == "final":
+                result = event.result
+        return result
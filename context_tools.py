@@ -0,0 +1,168 @@
+# context_tools.py
+
+import copy
+import re
+from typing import Callable, List, Optional, Sequence, Tuple
+
+# Pola ekstraksi Kunci/Tempo (sama dengan yang dipakai get_dynamic_suggestions)
+# Label boleh ditebalkan markdown ("**Kunci:** D minor") seperti yang diminta SYSTEM_PROMPT
+KEY_RE = re.compile(r'(kunci|key)[*_]*\s*[:\-\s][*_\s]*([a-gA-G][b#]?\s*(major|minor|maj|min)?)', re.IGNORECASE)
+TEMPO_RE = re.compile(r'(tempo)[*_]*\s*[:\-\s][*_\s]*([a-zA-Z]+\s*\(?\d+\s*BPM\)?)', re.IGNORECASE)
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+SUMMARY_HEADER = "[Ringkasan percakapan sebelumnya / Summary of earlier conversation]"
+
+Message = Tuple[str, str]  # (role, konten bersih)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimasi token lokal (~4 karakter per token), tanpa tokenizer eksternal."""
+    return (len(text) + 3) // 4
+
+
+def extract_key_tempo(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """Mengambil Kunci dan Tempo pertama yang disebut dalam jawaban (None jika tidak ada)."""
+    key_match = KEY_RE.search(text)
+    tempo_match = TEMPO_RE.search(text)
+    return (
+        key_match.group(2).strip() if key_match else None,
+        tempo_match.group(2).strip() if tempo_match else None,
+    )
+
+
+def _first_sentence(text: str, limit: int) -> str:
+    text = _WHITESPACE_RE.sub(" ", text.split("```", 1)[0]).strip()
+    sentence = _SENTENCE_END_RE.split(text, 1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit].rstrip() + "…"
+
+
+def summarize_message(role: str, content: str, limit: int = 160) -> str:
+    """Ringkasan ekstraktif satu pesan menjadi satu baris (tanpa panggilan LLM)."""
+    if role == "user":
+        return f"- User: {_first_sentence(content, limit)}"
+    key, tempo = extract_key_tempo(content)
+    details = ", ".join(part for part in (f"Key {key}" if key else "", f"Tempo {tempo}" if tempo else "") if part)
+    chord_sheet = " [chord sheet]" if "```" in content else ""
+    prefix = f"{details}; " if details else ""
+    return f"- Composer{chord_sheet}: {prefix}{_first_sentence(content, limit)}"
+
+
+class ConversationWindow:
+    """Jendela konteks berbasis anggaran token dengan ringkasan bergulir.
+
+    `max_turns` giliran terakhir (user + assistant) dikirim apa adanya, pesan chord sheet terbaru
+    selalu ikut, dan pesan yang lebih lama dilipat ke ringkasan berjalan. Ringkasan di-cache dan
+    hanya diperbarui ketika jendela bergeser, sehingga biaya per giliran tidak tumbuh dengan
+    panjang sesi. `reserved_tokens` diisi dengan estimasi system prompt.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = 6,
+        token_budget: int = 24_000,
+        summary_token_budget: int = 600,
+        reserved_tokens: int = 0,
+        summarizer: Callable[[str, str], str] = summarize_message,
+    ):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summary_token_budget = summary_token_budget
+        self.reserved_tokens = reserved_tokens
+        self.summarizer = summarizer
+        self.reset()
+
+    def reset(self) -> None:
+        self._folded_upto = 0
+        self._summary_lines: List[str] = []
+        # Indeks riwayat asal setiap baris ringkasan (chord sheet yang di-pin tidak diringkas dua kali)
+        self._summary_sources: List[int] = []
+        self._summary_tokens = 0
+        self._dropped_summary_lines = 0
+        self._scanned = 0
+        self._last_chord_index: Optional[int] = None
+        self.last_token_estimate = 0
+
+    def copy(self) -> "ConversationWindow":
+        """Salinan dengan ringkasan yang sudah dilipat (mis. untuk giliran spekulatif pada fork percakapan)."""
+        window = copy.copy(self)
+        window._summary_lines = list(self._summary_lines)
+        window._summary_sources = list(self._summary_sources)
+        return window
+
+    @property
+    def summary(self) -> str:
+        return self._summary_text()
+
+    def _summary_text(self, exclude: Optional[int] = None) -> str:
+        lines = [line for line, source in zip(self._summary_lines, self._summary_sources) if source != exclude]
+        if not lines:
+            return ""
+        omitted = f"\n- (+{self._dropped_summary_lines} earlier messages omitted)" if self._dropped_summary_lines else ""
+        return SUMMARY_HEADER + omitted + "\n" + "\n".join(lines)
+
+    def _fold(self, history: Sequence[Message], upto: int) -> None:
+        for index, (role, content) in enumerate(history[self._folded_upto:upto], start=self._folded_upto):
+            line = self.summarizer(role, content)
+            self._summary_lines.append(line)
+            self._summary_sources.append(index)
+            self._summary_tokens += estimate_tokens(line) + 1
+        self._folded_upto = max(self._folded_upto, upto)
+        self._trim_summary(self.summary_token_budget)
+
+    def _trim_summary(self, budget: int) -> None:
+        while self._summary_lines and self._summary_tokens > budget:
+            self._summary_tokens -= estimate_tokens(self._summary_lines.pop(0)) + 1
+            self._summary_sources.pop(0)
+            self._dropped_summary_lines += 1
+
+    def _scan_chord_sheets(self, history: Sequence[Message]) -> None:
+        # Satu slice, bukan akses per indeks: riwayat berhalaman membacanya dengan satu query rentang
+        for index, (role, content) in enumerate(history[self._scanned:], start=self._scanned):
+            if role == "assistant" and "```" in content:
+                self._last_chord_index = index
+        self._scanned = len(history)
+
+    def build(self, history: Sequence[Message]) -> List[Message]:
+        """Mengembalikan daftar (role, konten) yang dikirim ke model untuk giliran ini.
+
+        Ringkasan dikirim sebagai pesan "system" (digabung ke system prompt oleh model), bukan sebagai
+        ucapan pengguna, dan tidak memuat ulang chord sheet yang sudah di-pin utuh.
+        """
+        if len(history) < self._folded_upto or len(history) < self._scanned:
+            self.reset()
+        self._scan_chord_sheets(history)
+
+        total = len(history)
+        window_start = max(self._folded_upto, total - 2 * self.max_turns)
+        self._fold(history, window_start)
+
+        window_tokens = sum(estimate_tokens(content) for _, content in history[window_start:])
+
+        def pinned_tokens() -> int:
+            pinned = self._last_chord_index
+            if pinned is not None and pinned < window_start:
+                return estimate_tokens(history[pinned][1])
+            return 0
+
+        def used_tokens() -> int:
+            return self.reserved_tokens + self._summary_tokens + pinned_tokens() + window_tokens
+
+        # Anggaran terlampaui: geser jendela (pesan terakhir selalu dipertahankan), lalu pangkas ringkasan
+        while used_tokens() > self.token_budget and window_start < total - 1:
+            window_tokens -= estimate_tokens(history[window_start][1])
+            window_start += 1
+            self._fold(history, window_start)
+        if used_tokens() > self.token_budget:
+            self._trim_summary(max(0, self.token_budget - (used_tokens() - self._summary_tokens)))
+
+        pinned = self._last_chord_index if self._last_chord_index is not None and self._last_chord_index < window_start else None
+        result: List[Message] = []
+        summary = self._summary_text(exclude=pinned)
+        if summary:
+            result.append(("system", summary))
+        if pinned is not None:
+            result.append(history[pinned])
+        result.extend(history[window_start:])
+        self.last_token_estimate = used_tokens()
+        return result
@@ -5,66 +5,852 @@ import json
 import logging
 import re 
 import os
-from typing import List
+import queue
+import threading
+import time
+import atexit
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
 
 # Konfigurasi database path
 DB_PATH = "suggestion_history.db" 
 
-def init_suggestion_db():
-    """Menginisialisasi tabel riwayat saran dan memastikan file database ada."""
+# Pola pembersih saran yang menempel (dikompilasi sekali)
+SUGGESTION_FOOTER_RE = re.compile(r'(\n\n---\n\*\*Saran.*?:.*?)', re.DOTALL)
+SUGGESTION_FOOTER_EN_RE = re.compile(r'(\n\n---\n\*\*Suggestion.*?:.*?)', re.DOTALL)
+
+INSERT_HISTORY_QUERY = """
+INSERT INTO suggestion_history (user_prompt, assistant_response, suggestions_json, suggestion_set_id, response_codec, response_dict_id)
+VALUES (?, ?, '', ?, ?, ?)
+"""
+# Baris terkompresi diindeks dari Python (trigger FTS hanya bisa menyalin teks biasa)
+INDEX_HISTORY_QUERY = "INSERT INTO suggestion_history_fts (rowid, user_prompt, assistant_response) VALUES (?, ?, ?)"
+
+# Codec kolom assistant_response (kolom response_codec)
+CODEC_TEXT = 0        # teks biasa (semua baris sebelum v3)
+CODEC_ZLIB = 1        # zlib tanpa kamus
+CODEC_ZLIB_DICT = 2   # zlib dengan kamus terlatih (response_dict_id -> compression_dicts)
+
+# Mode penyimpanan untuk baris baru; default dari env SUGGESTION_DB_COMPRESSION
+COMPRESSION_MODES = {"none": CODEC_TEXT, "zlib": CODEC_ZLIB, "zlib-dict": CODEC_ZLIB_DICT}
+COMPRESSION_LEVEL = 9
+# Jendela deflate 32 KB: isi kamus di luar batas ini tidak pernah dirujuk
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+# contentless_delete (SQLite >= 3.43) mengizinkan DELETE per rowid pada indeks FTS contentless.
+# Di SQLite lama, baris dikeluarkan dari indeks dengan perintah 'delete' FTS5 yang membutuhkan
+# teks yang dulu diindeks. File yang dimigrasikan dengan contentless_delete tidak dapat
+# dibuka oleh SQLite < 3.43.
+FTS_CONTENTLESS_DELETE = sqlite3.sqlite_version_info >= (3, 43, 0)
+
+
+def _contentless_fts_migration(contentless_delete: bool) -> str:
+    """Skrip migrasi v5: opsi tabel FTS dan trigger bergantung pada dukungan contentless_delete."""
+    if contentless_delete:
+        options = "content='', contentless_delete=1"
+        unindex_old = "DELETE FROM suggestion_history_fts WHERE rowid = old.suggestion_id;"
+        delete_when = ""
+    else:
+        options = "content=''"
+        unindex_old = (
+            "INSERT INTO suggestion_history_fts (suggestion_history_fts, rowid, user_prompt, assistant_response)\n"
+            "        VALUES ('delete', old.suggestion_id, old.user_prompt, old.assistant_response);"
+        )
+        # Baris terkompresi dikeluarkan dari indeks oleh Python (`_unindex_compressed_rows`)
+        delete_when = "WHEN old.response_codec = 0"
+    return f"""
+    DROP TRIGGER IF EXISTS suggestion_history_ai;
+    DROP TRIGGER IF EXISTS suggestion_history_ad;
+    DROP TRIGGER IF EXISTS suggestion_history_au_prompt;
+    DROP TRIGGER IF EXISTS suggestion_history_au_response;
+    DROP TABLE IF EXISTS suggestion_history_fts;
+
+    CREATE VIRTUAL TABLE suggestion_history_fts USING fts5(
+        user_prompt,
+        assistant_response,
+        {options},
+        tokenize='unicode61 remove_diacritics 2'
+    );
+
+    CREATE TRIGGER suggestion_history_ai AFTER INSERT ON suggestion_history
+    WHEN new.response_codec = 0
+    BEGIN
+        INSERT INTO suggestion_history_fts (rowid, user_prompt, assistant_response)
+        VALUES (new.suggestion_id, new.user_prompt, new.assistant_response);
+    END;
+
+    CREATE TRIGGER suggestion_history_ad AFTER DELETE ON suggestion_history
+    {delete_when}
+    BEGIN
+        {unindex_old}
+    END;
+
+    -- Kompaksi yang hanya mengganti encoding tidak mengubah teks: indeks disentuh hanya untuk teks biasa yang berubah
+    CREATE TRIGGER suggestion_history_au
+    AFTER UPDATE OF user_prompt, assistant_response ON suggestion_history
+    WHEN old.response_codec = 0 AND new.response_codec = 0
+     AND (old.user_prompt IS NOT new.user_prompt OR old.assistant_response IS NOT new.assistant_response)
+    BEGIN
+        {unindex_old}
+        INSERT INTO suggestion_history_fts (rowid, user_prompt, assistant_response)
+        VALUES (new.suggestion_id, new.user_prompt, new.assistant_response);
+    END;
+
+    INSERT INTO suggestion_history_fts (rowid, user_prompt, assistant_response)
+    SELECT suggestion_id, user_prompt, assistant_response FROM suggestion_history WHERE response_codec = 0;
+    """
+
+
+SCHEMA_MIGRATIONS = {
+    # v2: indeks waktu + indeks full-text (FTS5, external content) yang disinkronkan trigger
+    2: """
+    CREATE INDEX IF NOT EXISTS idx_suggestion_history_created_at
+        ON suggestion_history (created_at, suggestion_id);
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS suggestion_history_fts USING fts5(
+        user_prompt,
+        assistant_response,
+        content='suggestion_history',
+        content_rowid='suggestion_id',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS suggestion_history_ai AFTER INSERT ON suggestion_history BEGIN
+        INSERT INTO suggestion_history_fts (rowid, user_prompt, assistant_response)
+        VALUES (new.suggestion_id, new.user_prompt, new.assistant_response);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS suggestion_history_ad AFTER DELETE ON suggestion_history BEGIN
+        INSERT INTO suggestion_history_fts (suggestion_history_fts, rowid, user_prompt, assistant_response)
+        VALUES ('delete', old.suggestion_id, old.user_prompt, old.assistant_response);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS suggestion_history_au AFTER UPDATE ON suggestion_history BEGIN
+        INSERT INTO suggestion_history_fts (suggestion_history_fts, rowid, user_prompt, assistant_response)
+        VALUES ('delete', old.suggestion_id, old.user_prompt, old.assistant_response);
+        INSERT INTO suggestion_history_fts (rowid, user_prompt, assistant_response)
+        VALUES (new.suggestion_id, new.user_prompt, new.assistant_response);
+    END;
+
+    -- Baris yang sudah ada sebelum migrasi dimasukkan ke indeks full-text
+    INSERT INTO suggestion_history_fts (suggestion_history_fts) VALUES ('rebuild');
+    """,
+    # v3: penyimpanan ringkas. Set saran di-intern ke suggestion_sets (baris menyimpan referensi),
+    # assistant_response boleh terkompresi (response_codec). Pembacaan lewat view suggestion_history_plain
+    # yang mendekode dengan fungsi SQL history_text(); indeks FTS memakai view itu sebagai konten.
+    3: """
+    CREATE TABLE IF NOT EXISTS suggestion_sets (
+        set_id INTEGER PRIMARY KEY,
+        suggestions_json TEXT NOT NULL UNIQUE
+    );
+
+    CREATE TABLE IF NOT EXISTS compression_dicts (
+        dict_id INTEGER PRIMARY KEY,
+        dictionary BLOB NOT NULL,
+        sample_rows INTEGER NOT NULL,
+        created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+    );
+
+    ALTER TABLE suggestion_history ADD COLUMN suggestion_set_id INTEGER REFERENCES suggestion_sets (set_id);
+    ALTER TABLE suggestion_history ADD COLUMN response_codec INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE suggestion_history ADD COLUMN response_dict_id INTEGER REFERENCES compression_dicts (dict_id);
+
+    CREATE INDEX IF NOT EXISTS idx_suggestion_history_set
+        ON suggestion_history (suggestion_set_id) WHERE suggestion_set_id IS NOT NULL;
+
+    CREATE VIEW IF NOT EXISTS suggestion_history_plain AS
+    SELECT h.suggestion_id,
+           h.user_prompt,
+           history_text(h.assistant_response, h.response_codec, h.response_dict_id) AS assistant_response,
+           COALESCE((SELECT s.suggestions_json FROM suggestion_sets AS s WHERE s.set_id = h.suggestion_set_id),
+                    h.suggestions_json) AS suggestions_json,
+           h.created_at
+    FROM suggestion_history AS h;
+
+    DROP TRIGGER IF EXISTS suggestion_history_ai;
+    DROP TRIGGER IF EXISTS suggestion_history_ad;
+    DROP TRIGGER IF EXISTS suggestion_history_au;
+    DROP TABLE IF EXISTS suggestion_history_fts;
+
+    CREATE VIRTUAL TABLE suggestion_history_fts USING fts5(
+        user_prompt,
+        assistant_response,
+        content='suggestion_history_plain',
+        content_rowid='suggestion_id',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+
+    CREATE TRIGGER suggestion_history_ai AFTER INSERT ON suggestion_history BEGIN
+        INSERT INTO suggestion_history_fts (rowid, user_prompt, assistant_response)
+        VALUES (new.suggestion_id, new.user_prompt, history_text(new.assistant_response, new.response_codec, new.response_dict_id));
+    END;
+
+    CREATE TRIGGER suggestion_history_ad AFTER DELETE ON suggestion_history BEGIN
+        INSERT INTO suggestion_history_fts (suggestion_history_fts, rowid, user_prompt, assistant_response)
+        VALUES ('delete', old.suggestion_id, old.user_prompt, history_text(old.assistant_response, old.response_codec, old.response_dict_id));
+    END;
+
+    -- Kompaksi hanya mengganti encoding: indeks diperbarui jika teks hasil dekode benar-benar berubah
+    CREATE TRIGGER suggestion_history_au
+    AFTER UPDATE OF user_prompt, assistant_response, response_codec, response_dict_id ON suggestion_history
+    WHEN old.user_prompt IS NOT new.user_prompt
+      OR history_text(old.assistant_response, old.response_codec, old.response_dict_id)
+         IS NOT history_text(new.assistant_response, new.response_codec, new.response_dict_id)
+    BEGIN
+        INSERT INTO suggestion_history_fts (suggestion_history_fts, rowid, user_prompt, assistant_response)
+        VALUES ('delete', old.suggestion_id, old.user_prompt, history_text(old.assistant_response, old.response_codec, old.response_dict_id));
+        INSERT INTO suggestion_history_fts (rowid, user_prompt, assistant_response)
+        VALUES (new.suggestion_id, new.user_prompt, history_text(new.assistant_response, new.response_codec, new.response_dict_id));
+    END;
+
+    INSERT INTO suggestion_history_fts (suggestion_history_fts) VALUES ('rebuild');
+    """,
+    # v4: skema tanpa fungsi SQL kustom, sehingga file dapat dibuka klien SQLite apa pun (CLI, backup).
+    # View hanya me-resolve set saran; dekode respons dilakukan di Python (`decode_history_response`).
+    # Indeks FTS menyimpan teksnya sendiri: trigger menyalin baris teks biasa, baris terkompresi
+    # diindeks oleh penulis (INDEX_HISTORY_QUERY) dan oleh hook migrasi `_index_compressed_rows`.
+    4: """
+    DROP TRIGGER IF EXISTS suggestion_history_ai;
+    DROP TRIGGER IF EXISTS suggestion_history_ad;
+    DROP TRIGGER IF EXISTS suggestion_history_au;
+    DROP TABLE IF EXISTS suggestion_history_fts;
+    DROP VIEW IF EXISTS suggestion_history_plain;
+
+    CREATE VIEW suggestion_history_plain AS
+    SELECT h.suggestion_id,
+           h.user_prompt,
+           h.assistant_response,
+           h.response_codec,
+           h.response_dict_id,
+           COALESCE((SELECT s.suggestions_json FROM suggestion_sets AS s WHERE s.set_id = h.suggestion_set_id),
+                    h.suggestions_json) AS suggestions_json,
+           h.created_at
+    FROM suggestion_history AS h;
+
+    CREATE VIRTUAL TABLE suggestion_history_fts USING fts5(
+        user_prompt,
+        assistant_response,
+        tokenize='unicode61 remove_diacritics 2'
+    );
+
+    CREATE TRIGGER suggestion_history_ai AFTER INSERT ON suggestion_history
+    WHEN new.response_codec = 0
+    BEGIN
+        INSERT INTO suggestion_history_fts (rowid, user_prompt, assistant_response)
+        VALUES (new.suggestion_id, new.user_prompt, new.assistant_response);
+    END;
+
+    CREATE TRIGGER suggestion_history_ad AFTER DELETE ON suggestion_history BEGIN
+        DELETE FROM suggestion_history_fts WHERE rowid = old.suggestion_id;
+    END;
+
+    CREATE TRIGGER suggestion_history_au_prompt AFTER UPDATE OF user_prompt ON suggestion_history
+    WHEN old.user_prompt IS NOT new.user_prompt
+    BEGIN
+        UPDATE suggestion_history_fts SET user_prompt = new.user_prompt WHERE rowid = new.suggestion_id;
+    END;
+
+    -- Kompaksi yang hanya mengganti encoding tidak mengubah teks: indeks disentuh hanya untuk teks biasa yang berubah
+    CREATE TRIGGER suggestion_history_au_response AFTER UPDATE OF assistant_response ON suggestion_history
+    WHEN new.response_codec = 0 AND old.assistant_response IS NOT new.assistant_response
+    BEGIN
+        UPDATE suggestion_history_fts SET assistant_response = new.assistant_response WHERE rowid = new.suggestion_id;
+    END;
+
+    INSERT INTO suggestion_history_fts (rowid, user_prompt, assistant_response)
+    SELECT suggestion_id, user_prompt, assistant_response FROM suggestion_history WHERE response_codec = 0;
+    """,
+    # v5: indeks FTS contentless. v4 menyimpan salinan teks biasa dari setiap prompt dan respons di
+    # dalam indeks, termasuk respons yang dikompresi, sehingga database justru membesar. Kini indeks
+    # hanya menyimpan token; teks (dan snippet) dibaca dari suggestion_history lalu didekode di Python.
+    5: _contentless_fts_migration(FTS_CONTENTLESS_DELETE),
+}
+
+
+# Kamus kompresi per file database: {(path absolut, dict_id): bytes}. Kamus tidak pernah diubah
+# setelah dibuat, jadi cache ini aman dipakai bersama oleh semua koneksi.
+_dictionaries: Dict[Tuple[str, int], bytes] = {}
+_dictionaries_lock = threading.Lock()
+
+
+def _dictionary_key(db_path: str, dict_id: int) -> Tuple[str, int]:
+    return os.path.abspath(db_path), dict_id
+
+
+def get_compression_dictionary(db_path: str, dict_id: int, conn: Optional[sqlite3.Connection] = None) -> bytes:
+    """Kamus kompresi `dict_id` (dibaca sekali dari compression_dicts lalu di-cache).
+
+    `conn` dipakai jika diberikan (mis. di dalam transaksi migrasi); selain itu dibuka koneksi baca
+    terpisah, karena fungsi SQL `history_text()` tidak boleh memakai ulang koneksi yang mengeksekusinya.
+    """
+    key = _dictionary_key(db_path, dict_id)
+    with _dictionaries_lock:
+        dictionary = _dictionaries.get(key)
+    if dictionary is not None:
+        return dictionary
+    if conn is not None:
+        row = conn.execute("SELECT dictionary FROM compression_dicts WHERE dict_id = ?", (dict_id,)).fetchone()
+    else:
+        conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, timeout=30)
+        try:
+            row = conn.execute("SELECT dictionary FROM compression_dicts WHERE dict_id = ?", (dict_id,)).fetchone()
+        finally:
+            conn.close()
+    if row is None:
+        raise KeyError(f"compression dictionary {dict_id} not found in {db_path}")
+    with _dictionaries_lock:
+        _dictionaries[key] = bytes(row[0])
+        return _dictionaries[key]
+
+
+def encode_response(text: str, codec: int, dictionary: Optional[bytes] = None) -> Tuple[object, int]:
+    """Mengenkode teks respons untuk kolom assistant_response. Mengembalikan (nilai, codec efektif).
+
+    Jika kompresi tidak menghemat ruang (respons pendek), teks disimpan apa adanya (CODEC_TEXT).
+    """
+    if codec == CODEC_TEXT or (codec == CODEC_ZLIB_DICT and not dictionary):
+        return text, CODEC_TEXT
+    raw = text.encode("utf-8")
+    if codec == CODEC_ZLIB_DICT:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL)
+    blob = compressor.compress(raw) + compressor.flush()
+    if len(blob) >= len(raw):
+        return text, CODEC_TEXT
+    return blob, codec
+
+
+def decode_response(value, codec: Optional[int], dictionary: Optional[bytes] = None) -> str:
+    """Kebalikan `encode_response`."""
+    if not codec:
+        return value
+    if codec == CODEC_ZLIB_DICT:
+        decompressor = zlib.decompressobj(zdict=dictionary)
+    else:
+        decompressor = zlib.decompressobj()
+    return (decompressor.decompress(value) + decompressor.flush()).decode("utf-8")
+
+
+def decode_history_response(db_path: str, value, codec: Optional[int], dict_id: Optional[int], conn: Optional[sqlite3.Connection] = None) -> str:
+    """Teks assistant_response dari kolom (assistant_response, response_codec, response_dict_id)."""
+    if not codec:
+        return value
+    dictionary = get_compression_dictionary(db_path, dict_id, conn) if codec == CODEC_ZLIB_DICT else None
+    return decode_response(value, codec, dictionary)
+
+
+def connect_suggestion_db(db_path: str = DB_PATH, read_only: bool = False, timeout: float = 30) -> sqlite3.Connection:
+    """Membuka koneksi ke database riwayat (opsional read-only).
+
+    Sejak skema v4 file dapat dibuka klien SQLite mana pun. Fungsi SQL `history_text()` tetap
+    didaftarkan hanya karena migrasi v3 (dari database lama) memakainya sebelum v4 menghapusnya.
+    """
+    if read_only:
+        conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, timeout=timeout)
+    else:
+        conn = sqlite3.connect(db_path, timeout=timeout)
+
+    def history_text(value, codec, dict_id):
+        return decode_history_response(db_path, value, codec, dict_id)
+
+    conn.create_function("history_text", 3, history_text, deterministic=True)
+    return conn
+
+
+def intern_suggestion_set(conn: sqlite3.Connection, suggestions_json: str) -> int:
+    """ID set saran di suggestion_sets (dibuat jika belum ada). Dipanggil di dalam transaksi penulis."""
+    conn.execute("INSERT OR IGNORE INTO suggestion_sets (suggestions_json) VALUES (?)", (suggestions_json,))
+    return conn.execute("SELECT set_id FROM suggestion_sets WHERE suggestions_json = ?", (suggestions_json,)).fetchone()[0]
+
+
+def latest_compression_dictionary(conn: sqlite3.Connection, db_path: str) -> Tuple[Optional[int], Optional[bytes]]:
+    """Kamus terbaru (dict_id, bytes), atau (None, None) jika belum pernah dilatih."""
+    row = conn.execute("SELECT MAX(dict_id) FROM compression_dicts").fetchone()
+    if row is None or row[0] is None:
+        return None, None
+    return row[0], get_compression_dictionary(db_path, row[0])
+
+
+def train_compression_dictionary(samples: Iterable[str], max_size: int = MAX_DICTIONARY_SIZE) -> bytes:
+    """Melatih kamus zlib (preset dictionary) dari respons lama.
+
+    Baris yang muncul di banyak respons (judul bagian, baris Key/Tempo, kalimat pembuka/penutup, pola
+    chord) dipilih berdasarkan ruang yang dihemat (frekuensi dokumen x panjang). Deflate paling murah
+    merujuk jarak dekat, jadi baris paling berharga diletakkan di akhir kamus.
+    """
+    document_frequency: Counter = Counter()
+    for text in samples:
+        document_frequency.update({line.strip() for line in text.splitlines() if len(line.strip()) >= 4})
+    candidates = [
+        ((count - 1) * (len(line) + 1), line)
+        for line, count in document_frequency.items()
+        if count > 1
+    ]
+    candidates.sort(reverse=True)
+    chosen, size = [], 0
+    for _, line in candidates:
+        encoded = line.encode("utf-8") + b"\n"
+        if size + len(encoded) > max_size:
+            continue
+        chosen.append(encoded)
+        size += len(encoded)
+    return b"".join(reversed(chosen))
+
+
+def _index_compressed_rows(conn: sqlite3.Connection) -> None:
+    """Hook migrasi v4/v5: baris terkompresi dimasukkan ke indeks FTS dengan teks hasil dekode."""
+    db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT suggestion_id, user_prompt, assistant_response, response_codec, response_dict_id "
+            "FROM suggestion_history WHERE response_codec != 0 AND suggestion_id > ? ORDER BY suggestion_id LIMIT 500",
+            (last_id,),
+        ).fetchall()
+        if not rows:
+            return
+        conn.executemany(INDEX_HISTORY_QUERY, [
+            (row_id, prompt, decode_history_response(db_path, value, codec, dict_id, conn))
+            for row_id, prompt, value, codec, dict_id in rows
+        ])
+        last_id = rows[-1][0]
+
+
+def fts_contentless_delete(conn: sqlite3.Connection) -> bool:
+    """True jika indeks FTS database ini dibuat dengan contentless_delete (lihat migrasi v5)."""
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'suggestion_history_fts'").fetchone()
+    return row is not None and "contentless_delete" in row[0]
+
+
+def _unindex_compressed_rows(conn: sqlite3.Connection, db_path: str, where: str, params: tuple) -> None:
+    """Mengeluarkan baris terkompresi yang cocok dengan `where` dari indeks FTS sebelum dihapus.
+
+    Hanya untuk indeks tanpa contentless_delete: perintah 'delete' FTS5 membutuhkan teks yang dulu
+    diindeks, sedangkan trigger tidak bisa mendekode respons terkompresi.
+    """
+    cursor = conn.execute(
+        "SELECT suggestion_id, user_prompt, assistant_response, response_codec, response_dict_id "
+        f"FROM suggestion_history WHERE response_codec != 0 AND ({where})",
+        params,
+    )
+    while True:
+        rows = cursor.fetchmany(500)
+        if not rows:
+            return
+        conn.executemany(
+            "INSERT INTO suggestion_history_fts (suggestion_history_fts, rowid, user_prompt, assistant_response) VALUES ('delete', ?, ?, ?)",
+            [(row_id, prompt, decode_history_response(db_path, value, codec, dict_id, conn)) for row_id, prompt, value, codec, dict_id in rows],
+        )
+
+
+def _stale_fts_rows(conn: sqlite3.Connection) -> int:
+    """Jumlah entri indeks FTS yang barisnya sudah tidak ada (mis. dihapus klien lain tanpa contentless_delete)."""
+    return conn.execute(
+        "SELECT COUNT(*) FROM suggestion_history_fts_docsize AS d "
+        "WHERE NOT EXISTS (SELECT 1 FROM suggestion_history AS h WHERE h.suggestion_id = d.id)"
+    ).fetchone()[0]
+
+
+def _reindex_fts(conn: sqlite3.Connection) -> None:
+    """Membangun ulang indeks FTS contentless dari suggestion_history."""
+    conn.execute("INSERT INTO suggestion_history_fts (suggestion_history_fts) VALUES ('delete-all')")
+    conn.execute(
+        "INSERT INTO suggestion_history_fts (rowid, user_prompt, assistant_response) "
+        "SELECT suggestion_id, user_prompt, assistant_response FROM suggestion_history WHERE response_codec = 0"
+    )
+    _index_compressed_rows(conn)
+
+
+# Langkah Python yang dijalankan di dalam transaksi migrasi yang sama, setelah skrip SQL-nya
+SCHEMA_MIGRATION_HOOKS = {4: _index_compressed_rows, 5: _index_compressed_rows}
+
+# Versi skema terbaru (disimpan di PRAGMA user_version)
+SCHEMA_VERSION = max(SCHEMA_MIGRATIONS)
+
+
+def _split_sql_script(script: str) -> List[str]:
+    """Memecah skrip migrasi menjadi pernyataan tunggal (badan trigger BEGIN ... END tetap utuh)."""
+    statements, current = [], ""
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    if current.strip():
+        raise ValueError(f"Incomplete SQL statement in migration script: {current.strip()[:80]!r}")
+    return statements
+
+
+def migrate_suggestion_db(conn: sqlite3.Connection) -> int:
+    """Menjalankan migrasi skema yang belum diterapkan. Mengembalikan versi skema akhir.
+
+    Setiap langkah berjalan dalam satu transaksi BEGIN IMMEDIATE: user_version dibaca setelah kunci
+    tulis diambil, lalu pernyataan SQL (lewat `conn.execute`, bukan executescript yang meng-COMMIT
+    lebih dulu), hook Python, dan user_version baru di-commit bersama. Proses lain yang bermigrasi
+    bersamaan menunggu lalu melihat versi baru; langkah yang gagal di-rollback seluruhnya.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                conn.commit()
+                return version
+            target = min(t for t in SCHEMA_MIGRATIONS if t > version)
+            logging.info(f"Migrating suggestion_history schema to v{target}...")
+            for statement in _split_sql_script(SCHEMA_MIGRATIONS[target]):
+                conn.execute(statement)
+            hook = SCHEMA_MIGRATION_HOOKS.get(target)
+            if hook is not None:
+                hook(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    """Membuat tabel suggestion_history jika belum ada lalu menerapkan migrasi."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS suggestion_history (
+        suggestion_id INTEGER PRIMARY KEY,
+        user_prompt TEXT NOT NULL,
+        assistant_response TEXT NOT NULL,
+        suggestions_json TEXT NOT NULL,
+        created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+    )
+    """)
+    conn.commit()
+    migrate_suggestion_db(conn)
+
+
+def init_suggestion_db(db_path: str = DB_PATH):
+    """Menginisialisasi tabel riwayat saran (dan migrasinya) serta memastikan file database ada.
+
+    Tidak lagi dijalankan saat modul diimpor: pemanggil yang membuka database (writer, pembaca
+    riwayat, statistik saran, kompaksi) menginisialisasi path yang benar-benar dipakainya.
+    """
     conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS suggestion_history (
-            suggestion_id INTEGER PRIMARY KEY,
-            user_prompt TEXT NOT NULL,
-            assistant_response TEXT NOT NULL,
-            suggestions_json TEXT NOT NULL,
-            created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
-        )
-        """)
+        conn = connect_suggestion_db(db_path)
+        # WAL bersifat persisten di file database: pembaca tidak memblokir penulis
+        conn.execute("PRAGMA journal_mode=WAL")
+        _create_schema(conn)
         conn.commit()
-        logging.info("Database suggestion_history.db successfully initialized.")
+        logging.info(f"Database {db_path} successfully initialized.")
     except sqlite3.Error as e:
         logging.error(f"Error initializing suggestion database: {e}")
     finally:
         if conn:
             conn.close()
 
+
+def clean_suggestion_footer(text: str) -> str:
+    """Membersihkan blok saran (ID/EN) yang mungkin menempel di akhir respons."""
+    if "\n\n---\n**" not in text:
+        return text
+    return SUGGESTION_FOOTER_EN_RE.sub('', SUGGESTION_FOOTER_RE.sub('', text))
+
+
+class _FlushRequest:
+    """Penanda di antrean: writer melakukan commit lalu men-set event."""
+    __slots__ = ("done",)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class SuggestionHistoryWriter:
+    """Penulis riwayat saran di latar belakang.
+
+    Satu thread writer memiliki koneksi SQLite jangka panjang (WAL, synchronous=NORMAL) dan
+    menguras antrean berbatas. Baris di-commit per batch: saat `batch_size` tercapai atau
+    `flush_interval` detik sejak baris pertama batch, mana yang lebih dulu. Thread permintaan
+    hanya memasukkan item ke antrean sehingga tidak menunggu I/O disk.
+
+    Set saran selalu di-intern ke suggestion_sets. `compression` ("none", "zlib", "zlib-dict"; default
+    dari env SUGGESTION_DB_COMPRESSION) menentukan encoding assistant_response untuk baris baru;
+    "zlib-dict" memakai kamus terbaru di compression_dicts (zlib biasa jika belum ada kamus).
+    """
+
+    def __init__(self, db_path: str = DB_PATH, max_queue: int = 1000, batch_size: int = 50, flush_interval: float = 1.0, compression: Optional[str] = None):
+        if compression is None:
+            compression = os.environ.get("SUGGESTION_DB_COMPRESSION") or "none"
+        if compression not in COMPRESSION_MODES:
+            raise ValueError(f"Unknown compression mode: {compression!r} (expected one of {', '.join(COMPRESSION_MODES)})")
+        self.db_path = db_path
+        self.codec = COMPRESSION_MODES[compression]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.rows_written = 0
+        self.rows_dropped = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="suggestion-history-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, user_prompt: str, assistant_response: str, suggestions: List[str]) -> bool:
+        """Memasukkan satu baris ke antrean tanpa blokir. False jika antrean penuh."""
+        self.start()
+        try:
+            self._queue.put_nowait((user_prompt, assistant_response, suggestions))
+            return True
+        except queue.Full:
+            self.rows_dropped += 1
+            logging.error("Suggestion history queue is full, row dropped.")
+            return False
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Menunggu hingga semua item yang sudah diantrekan ter-commit."""
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.empty()
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Flush bersih saat shutdown: menulis sisa antrean lalu menutup koneksi."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = connect_suggestion_db(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _create_schema(conn)
+        conn.commit()
+        return conn
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: list) -> None:
+        if not batch:
+            return
+        try:
+            with conn:
+                codec, dict_id, dictionary = self.codec, None, None
+                if codec == CODEC_ZLIB_DICT:
+                    dict_id, dictionary = latest_compression_dictionary(conn, self.db_path)
+                    if dictionary is None:
+                        codec = CODEC_ZLIB
+                set_ids: Dict[str, int] = {}
+                for user_prompt, assistant_response, suggestions in batch:
+                    suggestions_json = json.dumps(suggestions)
+                    set_id = set_ids.get(suggestions_json)
+                    if set_id is None:
+                        set_id = set_ids[suggestions_json] = intern_suggestion_set(conn, suggestions_json)
+                    text = clean_suggestion_footer(assistant_response)
+                    value, row_codec = encode_response(text, codec, dictionary)
+                    row_id = conn.execute(
+                        INSERT_HISTORY_QUERY, (user_prompt, value, set_id, row_codec, dict_id if row_codec == CODEC_ZLIB_DICT else None)
+                    ).lastrowid
+                    if row_codec != CODEC_TEXT:
+                        conn.execute(INDEX_HISTORY_QUERY, (row_id, user_prompt, text))
+            self.rows_written += len(batch)
+            logging.info(f"Suggestions saved to DB. Batch size: {len(batch)}")
+        except sqlite3.Error as e:
+            logging.error(f"DB error saving suggestions: {e}")
+        batch.clear()
+
+    def _run(self) -> None:
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            logging.error(f"Error opening suggestion database: {e}")
+            return
+        batch: list = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    self._write_batch(conn, batch)
+                    deadline = None
+                    continue
+
+                if item is _STOP:
+                    self._write_batch(conn, batch)
+                    break
+                if isinstance(item, _FlushRequest):
+                    self._write_batch(conn, batch)
+                    deadline = None
+                    item.done.set()
+                    continue
+
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) >= self.batch_size:
+                    self._write_batch(conn, batch)
+                    deadline = None
+        finally:
+            conn.close()
+
+
+_history_writer: Optional[SuggestionHistoryWriter] = None
+_history_writer_lock = threading.Lock()
+
+
+def get_history_writer() -> SuggestionHistoryWriter:
+    """Writer bersama per proses (dibuat lazily, di-flush otomatis saat proses berhenti)."""
+    global _history_writer
+    with _history_writer_lock:
+        if _history_writer is None:
+            _history_writer = SuggestionHistoryWriter()
+            _history_writer.start()
+            atexit.register(_history_writer.close)
+        return _history_writer
+
+
 def save_suggestion_history(user_prompt: str, assistant_response: str, suggestions: List[str]) -> bool:
-    """Menyimpan konteks dan saran yang dihasilkan ke dalam database."""
-    # Pastikan database telah diinisialisasi sebelum menyimpan
-    if not os.path.exists(DB_PATH):
-        init_suggestion_db()
+    """Menyimpan konteks dan saran yang dihasilkan ke dalam database (asinkron via writer latar belakang)."""
+    return get_history_writer().submit(user_prompt, assistant_response, suggestions)
 
-    conn = None
+
+class CompactionReport(NamedTuple):
+    deleted_rows: int
+    rewritten_rows: int
+    dictionary_id: Optional[int]
+    removed_sets: int
+    removed_dictionaries: int
+    bytes_before: int
+    bytes_after: int
+
+
+def _used_bytes(conn: sqlite3.Connection) -> int:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return (page_count - free_pages) * page_size
+
+
+def compact_suggestion_history(
+    db_path: str = DB_PATH,
+    retain_days: Optional[int] = None,
+    compression: Optional[str] = None,
+    train_dictionary: bool = False,
+    sample_rows: int = 500,
+    batch_rows: int = 500,
+    vacuum: bool = False,
+) -> CompactionReport:
+    """Retensi + kompaksi suggestion_history (aman dijalankan saat aplikasi hidup; WAL).
+
+    1. `retain_days`: hapus baris yang lebih tua dari N hari (indeks FTS ikut lewat trigger, atau lewat
+       Python untuk baris terkompresi jika SQLite tidak mendukung contentless_delete);
+    2. `train_dictionary`: latih kamus baru dari `sample_rows` respons terbaru;
+    3. tulis ulang baris lama per batch (`batch_rows` per transaksi): set saran di-intern, dan jika
+       `compression` diberikan, assistant_response di-encode ulang ke mode itu (None = encoding dibiarkan);
+    4. hapus set saran dan kamus yatim, bangun ulang indeks FTS jika ada entri basi, optimasi indeks,
+       lalu VACUUM jika `vacuum`.
+    """
+    if compression is not None and compression not in COMPRESSION_MODES:
+        raise ValueError(f"Unknown compression mode: {compression!r} (expected one of {', '.join(COMPRESSION_MODES)})")
+    conn = connect_suggestion_db(db_path)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        suggestions_json = json.dumps(suggestions)
-        
-        query = """
-        INSERT INTO suggestion_history (user_prompt, assistant_response, suggestions_json) 
-        VALUES (?, ?, ?)
-        """
-        # Bersihkan konten respons dari saran yang mungkin menempel
-        clean_response = re.sub(r'(\n\n---\n\*\*Saran.*?:.*?)', '', assistant_response, flags=re.DOTALL) 
-        clean_response = re.sub(r'(\n\n---\n\*\*Suggestion.*?:.*?)', '', clean_response, flags=re.DOTALL) 
-        
-        cursor.execute(query, (user_prompt, clean_response, suggestions_json))
-        conn.commit()
-        logging.info(f"Suggestions saved to DB. ID: {cursor.lastrowid}")
-        return True
-    except sqlite3.Error as e:
-        logging.error(f"DB error saving suggestions: {e}")
-        return False
+        conn.execute("PRAGMA journal_mode=WAL")
+        _create_schema(conn)
+        bytes_before = _used_bytes(conn)
+
+        deleted = 0
+        if retain_days is not None:
+            expired = "created_at < strftime('%Y-%m-%d %H:%M:%S', 'now', ?)"
+            cutoff = (f"-{int(retain_days)} days",)
+            with conn:
+                if not fts_contentless_delete(conn):
+                    _unindex_compressed_rows(conn, db_path, expired, cutoff)
+                deleted = conn.execute(f"DELETE FROM suggestion_history WHERE {expired}", cutoff).rowcount
+
+        new_dict_id = None
+        if train_dictionary:
+            samples = [decode_history_response(db_path, value, codec, dict_id, conn) for value, codec, dict_id in conn.execute(
+                "SELECT assistant_response, response_codec, response_dict_id FROM suggestion_history ORDER BY suggestion_id DESC LIMIT ?",
+                (sample_rows,),
+            ).fetchall()]
+            dictionary = train_compression_dictionary(samples)
+            if dictionary:
+                with conn:
+                    new_dict_id = conn.execute(
+                        "INSERT INTO compression_dicts (dictionary, sample_rows) VALUES (?, ?)", (dictionary, len(samples))
+                    ).lastrowid
+                logging.info(f"Trained compression dictionary {new_dict_id} ({len(dictionary)} bytes, {len(samples)} samples).")
+
+        codec = COMPRESSION_MODES[compression] if compression is not None else None
+        dict_id, dictionary = None, None
+        if codec == CODEC_ZLIB_DICT:
+            dict_id, dictionary = latest_compression_dictionary(conn, db_path)
+            if dictionary is None:
+                codec = CODEC_ZLIB
+
+        rewritten, last_id = 0, 0
+        while True:
+            rows = conn.execute(
+                """
+                SELECT suggestion_id, suggestions_json, suggestion_set_id, response_codec, response_dict_id, assistant_response
+                FROM suggestion_history WHERE suggestion_id > ? ORDER BY suggestion_id LIMIT ?
+                """,
+                (last_id, batch_rows),
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            with conn:
+                for suggestion_id, suggestions_json, set_id, row_codec, row_dict_id, value in rows:
+                    if set_id is None:
+                        set_id = intern_suggestion_set(conn, suggestions_json)
+                        conn.execute(
+                            "UPDATE suggestion_history SET suggestion_set_id = ?, suggestions_json = '' WHERE suggestion_id = ?",
+                            (set_id, suggestion_id),
+                        )
+                        rewritten += 1
+                    if codec is None or (row_codec == codec and row_dict_id == dict_id):
+                        continue
+                    text = decode_history_response(db_path, value, row_codec, row_dict_id, conn)
+                    value, new_codec = encode_response(text, codec, dictionary)
+                    new_dict_id_for_row = dict_id if new_codec == CODEC_ZLIB_DICT else None
+                    if (new_codec, new_dict_id_for_row) == (row_codec, row_dict_id):
+                        continue
+                    conn.execute(
+                        "UPDATE suggestion_history SET assistant_response = ?, response_codec = ?, response_dict_id = ? WHERE suggestion_id = ?",
+                        (value, new_codec, new_dict_id_for_row, suggestion_id),
+                    )
+                    rewritten += 1
+
+        with conn:
+            removed_sets = conn.execute(
+                "DELETE FROM suggestion_sets WHERE NOT EXISTS "
+                "(SELECT 1 FROM suggestion_history AS h WHERE h.suggestion_set_id = suggestion_sets.set_id)"
+            ).rowcount
+            # Kamus terbaru dipertahankan walau belum dipakai (writer mode zlib-dict membutuhkannya)
+            removed_dictionaries = conn.execute(
+                "DELETE FROM compression_dicts WHERE dict_id < (SELECT MAX(dict_id) FROM compression_dicts) AND NOT EXISTS "
+                "(SELECT 1 FROM suggestion_history AS h WHERE h.response_dict_id = compression_dicts.dict_id)"
+            ).rowcount
+            stale = _stale_fts_rows(conn)
+            if stale:
+                logging.warning(f"Full-text index has {stale} stale rows, rebuilding it.")
+                _reindex_fts(conn)
+            conn.execute("INSERT INTO suggestion_history_fts (suggestion_history_fts) VALUES ('optimize')")
+        if vacuum:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        report = CompactionReport(deleted, rewritten, new_dict_id, removed_sets, removed_dictionaries, bytes_before, _used_bytes(conn))
+        logging.info(f"Suggestion history compacted: {report}")
+        return report
     finally:
-        if conn:
-            conn.close()
+        conn.close()
 
-# Inisialisasi DB saat modul ini diimpor pertama kali
-if not os.path.exists(DB_PATH):
-    init_suggestion_db()
\ No newline at end of file
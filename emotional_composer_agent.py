@@ -3,18 +3,15 @@
 # Import Pustaka
 import streamlit as st
 import time
-import re 
 import logging 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.prebuilt import create_react_agent
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.tools import tool 
-import json
-import os 
-from typing import List, Dict, Any 
 
-# 🌟 IMPOR FUNGSI DATABASE DARI FILE TERPISAH 🌟
-from database_tools import save_suggestion_history 
+# 🌟 SEMUA LOGIKA KOMPOSER ADA DI ENGINE TANPA STREAMLIT 🌟
+from composer_engine import ComposerEngine, get_shared_llm, INITIAL_GREETING
+from resilience_tools import CallPolicy
+from prefetch_tools import PrefetchPolicy
+from streaming_tools import StreamingRenderer, DEFAULT_FRAME_BUDGET
+from session_tools import SESSION_DB_PATH, configure_session_store
+from metrics_tools import configure_metrics
 
 # Konfigurasi logging dasar
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', filename='agent_composer_narrative.log', filemode='a')
@@ -22,147 +19,10 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 # --- 0. Utility Functions ---
 
-def format_assistant_response(text: str) -> str:
-    """Mengaplikasikan formatting BOLD untuk poin penting dan ITALIC untuk kata Inggris umum, KECUALI di dalam blok kode."""
-    # ... (fungsi ini tidak berubah dari perbaikan sebelumnya)
-    parts = re.split(r'(```.*?```)', text, flags=re.DOTALL)
-    formatted_parts = []
-    for part in parts:
-        if part.startswith('```') and part.endswith('```'):
-            formatted_parts.append(part)
-        else:
-            keywords_to_bold = ["komposisi", "melodi", "chord", "instrumentasi", "tempo", "emosi", "kunci", "composition", "melody", "key", "tempo", "instrumentation", "emotion", "struktur", "progresi", "genre", "dynamics", "groove"]
-            for keyword in keywords_to_bold:
-                # Menggunakan boundary \b untuk menghindari bolding di dalam kata lain
-                part = re.sub(r'\b(' + re.escape(keyword) + r')\b', r'**\1**', part, flags=re.IGNORECASE)
-            english_words = ["rag", "agent", "tool", "api", "prompt", "midi", "genre", "vibe", "groove", "dynamics", "beat", "solo"]
-            for word in english_words:
-                part = re.sub(r'\b(' + re.escape(word) + r')\b', r'*\1*', part, flags=re.IGNORECASE)
-            formatted_parts.append(part)
-    return "".join(formatted_parts)
-
-
 def send_question_to_chat(question):
     """Callback function to set the question."""
     st.session_state['chat_input_text'] = question
 
-def get_dynamic_suggestions(last_answer: str, lang: str):
-    """Menghasilkan saran pertanyaan lanjutan yang dinamis dan kontekstual."""
-    
-    clean_answer = re.sub(r'(\n\n---\n\*\*Saran.*?:.*?)', '', last_answer, flags=re.DOTALL)
-    clean_answer_lower = clean_answer.lower()
-    
-    user_prompts_history = [
-        msg["content"].lower() for msg in st.session_state.messages if msg["role"] == "user"
-    ]
-    
-    dynamic_questions = []
-    # Dapatkan jumlah balasan asisten yang substantif (setelah pesan pembuka)
-    num_assistant_responses = len([msg for msg in st.session_state.messages if msg["role"] == "assistant"]) - 1
-    if num_assistant_responses < 0: num_assistant_responses = 0
-    
-    # PERBAIKAN KRITIS: Dapatkan status has_chord_sheet di sini.
-    has_chord_sheet = "```" in clean_answer or any("```" in msg["content"] for msg in st.session_state.messages if msg["role"] == "assistant")
-    is_musical_composition_phase = has_chord_sheet
-
-    # Ekstraksi Elemen Kunci dari Jawaban LLM (Hanya dilakukan jika sudah ada output musik)
-    key_found = 'C Major'
-    tempo_found = 'Lento'
-    
-    if is_musical_composition_phase:
-        # Pengecekan pada jawaban terbaru (last_answer) untuk akurasi
-        key_match = re.search(r'(kunci|key)\s*[:\-\s]\s*([a-gA-G][b#]?\s*(major|minor|maj|min)?)', clean_answer, re.IGNORECASE)
-        key_found = key_match.group(2).strip() if key_match else 'C Major' 
-        tempo_match = re.search(r'(tempo)\s*[:\-\s]\s*([a-zA-Z]+\s*\(?\d+\s*BPM\)?)', clean_answer, re.IGNORECASE)
-        tempo_found = tempo_match.group(2).strip() if tempo_match else 'Lento'
-
-
-    # === LOGIKA SARAN YANG DINAMIS BERDASARKAN FASE ===
-    
-    # Batas Transisi Diperpanjang: Memberikan lebih banyak ruang untuk modifikasi satu lagu.
-    TRANSITION_THRESHOLD = 7 # Akan pindah ke Fase 3 setelah balasan asisten ke-8 (num_assistant_responses > 7)
-    
-    if lang == "indonesian":
-        
-        if not is_musical_composition_phase:
-            # FASE 1: NARATIF / EMOSIONAL / PENDAMPING (Belum ada komposisi)
-            dynamic_questions.extend([
-                "Saya sedang merasa **kebingungan**, coba terjemahkan ke dalam musik.",
-                "Tolong buatkan **melodi** yang mengekspresikan **kerinduan yang mendalam**.",
-                "Saya ingin lagu tentang **perasaan damai** setelah badai.",
-                "Ide **komposisi** untuk film dokumenter tentang luar angkasa.",
-                "Apa saja **genre** yang bisa Anda bantu rancang?",
-                "Saran komposisi untuk adegan **misterius** dan penuh ketegangan.",
-            ])
-        
-        elif num_assistant_responses <= TRANSITION_THRESHOLD:
-            # FASE 2: MODIFIKASI LAGU (Konteks musikal jelas, dan masih fokus pada satu lagu)
-            dynamic_questions.extend([
-                f"Ubah **kunci nada {key_found}** menjadi kunci *relative minor*.",
-                "Bagaimana jika progresi *chord* menggunakan ***suspended* dan *add9***?",
-                f"Percepat **tempo {tempo_found}** sebanyak 15 BPM dan ubah *beat* drumnya.",
-                "Rancang bagian **Bridge** atau **Coda** dengan **emosi** yang kontras.",
-                "Tambahkan **perkusi** yang lebih ritmis, seperti *Latin beat* atau *funk*.",
-                "Ganti **instrumentasi** utama menjadi piano solo dan strings.",
-                "Bagaimana cara membuat *progresi chord* ini terdengar lebih **minor dan gelap**?",
-            ])
-        else:
-            # FASE 3: TOPIK BARU / MODIFIKASI LANJUT (Diskusi sudah panjang, saatnya pindah lagu, tapi tetap fleksibel)
-            dynamic_questions.extend([
-                "Saya ingin lagu tentang **optimisme** di kunci **F Major** dengan *genre Pop Rock*.",
-                "Rancang **soundtrack** untuk suasana **kota yang sibuk** di malam hari (key Bb minor).",
-                "Buatkan **progresi chord** yang sempurna untuk *slow-dancing* dengan nuansa *soulful*.",
-                "Ide **lagu tidur** dengan instrumentasi minimalis dan nuansa hangat.",
-                "Bagaimana jika kita buat versi **akustik** dari komposisi yang tadi?", # Opsi modifikasi umum
-                "Buatkan saya *jingle* yang **ceria dan mudah diingat**.",
-            ])
-            
-    else: # English (Logika serupa untuk Bahasa Inggris)
-        
-        if not is_musical_composition_phase:
-            # FASE 1: NARRATIVE / EMOTIONAL / GUIDANCE
-            dynamic_questions.extend([
-                "I'm feeling **confused**, try translating it into music.",
-                "Please create a **melody** that expresses **deep longing**.",
-                "I want a song about the **feeling of peace** after a storm.",
-                "A **composition** idea for a documentary about outer space.",
-                "What **genres** can you help me design?",
-                "Suggest a composition for a **mysterious** and tense scene.",
-            ])
-            
-        elif num_assistant_responses <= TRANSITION_THRESHOLD:
-            # FASE 2: SONG MODIFICATION
-            dynamic_questions.extend([
-                f"Change the key of **{key_found}** to a *relative minor*.",
-                "What if the chord progression uses **suspended and add9**?",
-                f"Increase the **tempo {tempo_found}** by 15 BPM and change the drum *beat*.",
-                "Design a **Bridge** or **Coda** section with a contrasting emotion.",
-                "Add more rhythmic **percussion**, like a *Latin beat* or *funk*.",
-                "Change the main **instrumentation** to a solo piano and strings.",
-                "How can I make this *chord progression* sound more **minor and dark**?",
-            ])
-        else: 
-            # FASE 3: NEW TOPIC / ADVANCED MODIFICATION
-            dynamic_questions.extend([
-                "I want a song about **optimism** in **F Major** key with a *Pop Rock genre*.",
-                "Design a **soundtrack** for a **busy city** at night (key Bb minor).",
-                "Create the perfect **chord progression** for *slow-dancing* with a *soulful vibe*.",
-                "An idea for a **lullaby** with minimalist instrumentation and a warm feel.",
-                "What if we create an **acoustic** version of the previous composition?",
-                "Make me an **upbeat and memorable** *jingle*.",
-            ])
-
-        
-    filtered_dynamic = [
-        q for q in dynamic_questions if not any(q.lower() in p for p in user_prompts_history)
-    ]
-    
-    # Ambil 4 saran terbaik yang unik
-    all_questions = list(set(filtered_dynamic))
-    
-    return all_questions[:4]
-
-
 # --- 1. Konfigurasi Awal & LLM Setup ---
 APP_TITLE_PART_2 = "Emotional Composer Bot 🎶" 
 try:
@@ -175,18 +35,80 @@ except Exception:
     st.error("🚨 Kunci Google AI API ('google_api_key') tidak ditemukan.")
     st.stop()
 
-# Inisialisasi LLM
+# Anggaran frame streaming (detik antar repaint), dapat diatur lewat secrets.toml
 try:
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        google_api_key=google_api_key,
-        temperature=0.8 
-    )
+    STREAM_FRAME_BUDGET = float(st.secrets.get("stream_frame_budget", DEFAULT_FRAME_BUDGET))
+except Exception:
+    STREAM_FRAME_BUDGET = DEFAULT_FRAME_BUDGET
+
+# Jendela konteks percakapan (jumlah giliran verbatim dan anggaran token), dapat diatur lewat secrets.toml
+try:
+    CONTEXT_MAX_TURNS = int(st.secrets.get("context_max_turns", 6))
+    CONTEXT_TOKEN_BUDGET = int(st.secrets.get("context_token_budget", 24000))
+except Exception:
+    CONTEXT_MAX_TURNS, CONTEXT_TOKEN_BUDGET = 6, 24000
+
+# Deadline per giliran dan hedging (permintaan kedua jika token pertama lambat), dapat diatur lewat secrets.toml
+try:
+    TURN_DEADLINE = float(st.secrets.get("turn_deadline_seconds", 120))
+    MAX_RETRIES = int(st.secrets.get("max_retries", 2))
+    HEDGE_AFTER = float(st.secrets["hedge_after_seconds"]) if st.secrets.get("hedge_after_seconds") else None
+except Exception:
+    TURN_DEADLINE, MAX_RETRIES, HEDGE_AFTER = 120.0, 2, None
+
+# Riwayat: K giliran terakhir ditampilkan penuh, giliran lama dilipat per halaman, dapat diatur lewat secrets.toml
+try:
+    HISTORY_FULL_TURNS = int(st.secrets.get("history_full_turns", 10))
+    HISTORY_PAGE_TURNS = int(st.secrets.get("history_page_turns", 10))
+except Exception:
+    HISTORY_FULL_TURNS, HISTORY_PAGE_TURNS = 10, 10
+
+# Metrik per rerun (file JSONL / Prometheus-text) dan sidebar debug; nonaktif jika tidak diatur di secrets.toml
+try:
+    METRICS_JSONL = st.secrets.get("metrics_jsonl_path")
+    METRICS_PROM = st.secrets.get("metrics_prometheus_path")
+    DEBUG_SIDEBAR_TURNS = int(st.secrets.get("debug_sidebar_turns", 0))
+except Exception:
+    METRICS_JSONL, METRICS_PROM, DEBUG_SIDEBAR_TURNS = None, None, 0
+
+# Penyimpanan sesi: giliran terakhir di memori, sisanya di SQLite; batas memori global (MB) dengan eviksi LRU
+try:
+    SESSION_DB = st.secrets.get("session_db_path", SESSION_DB_PATH)
+    SESSION_RESIDENT_TURNS = int(st.secrets.get("session_resident_turns", max(HISTORY_FULL_TURNS, CONTEXT_MAX_TURNS)))
+    SESSION_MEMORY_CAP_MB = int(st.secrets.get("session_memory_cap_mb", 256))
+    SESSION_IDLE_SECONDS = float(st.secrets.get("session_idle_seconds", 300))
+except Exception:
+    SESSION_DB, SESSION_RESIDENT_TURNS, SESSION_MEMORY_CAP_MB, SESSION_IDLE_SECONDS = SESSION_DB_PATH, max(HISTORY_FULL_TURNS, CONTEXT_MAX_TURNS), 256, 300.0
+
+# Prefetch spekulatif jawaban chip (opsional, menambah biaya LLM; worker latar belakang + anggaran token per percakapan)
+try:
+    SPECULATIVE_PREFETCH = bool(st.secrets.get("speculative_prefetch", False))
+    PREFETCH_WORKERS = int(st.secrets.get("prefetch_workers", 2))
+    PREFETCH_CHIPS = int(st.secrets.get("prefetch_chips", 2))
+    PREFETCH_TOKEN_BUDGET = int(st.secrets.get("prefetch_token_budget", 20000))
+except Exception:
+    SPECULATIVE_PREFETCH, PREFETCH_WORKERS, PREFETCH_CHIPS, PREFETCH_TOKEN_BUDGET = False, 2, 2, 20000
+
+# Inisialisasi LLM: satu klien per proses (dibuat sekali, rerun berikutnya hanya lookup)
+try:
+    get_shared_llm(google_api_key)
 except Exception as e:
     st.error(f"Error saat menginisialisasi LLM: {e}")
     st.stop()
 
 
+@st.cache_resource(show_spinner=False)
+def load_engine(api_key, max_turns, token_budget, turn_deadline, max_retries, hedge_after, prefetch, prefetch_workers, prefetch_chips, prefetch_budget):
+    """Engine bersama untuk semua sesi: graf agen dikompilasi sekali per proses, state sesi hanya lewat pesan."""
+    return ComposerEngine(
+        llm=get_shared_llm(api_key),
+        max_turns=max_turns,
+        token_budget=token_budget,
+        call_policy=CallPolicy(turn_deadline=turn_deadline, max_retries=max_retries, hedge_after=hedge_after),
+        prefetch_policy=PrefetchPolicy(max_workers=prefetch_workers, chips_per_turn=prefetch_chips, session_token_budget=prefetch_budget) if prefetch else None,
+    )
+
+
 # --- 2. Page Configuration & Styling ---
 st.set_page_config(layout="wide")
 
@@ -237,82 +159,124 @@ with col2:
     reset_button = st.button("⟳ New Chat", help="Reset Conversation")
 
 
+@st.cache_resource(show_spinner=False)
+def load_metrics(jsonl_path, prometheus_path, keep_recent):
+    """Recorder metrik per proses (counter dan histogram diakumulasi lintas sesi)."""
+    return configure_metrics(jsonl_path, prometheus_path, keep_recent)
+
+
+@st.cache_resource(show_spinner=False)
+def load_session_store(db_path, resident_turns, memory_cap_mb, idle_seconds):
+    """Store sesi per proses: percakapan semua sesi browser berbagi satu batas memori."""
+    return configure_session_store(
+        db_path=db_path,
+        resident_turns=resident_turns,
+        memory_cap_bytes=memory_cap_mb * 1024 * 1024,
+        idle_seconds=idle_seconds,
+    )
+
+
+def render_debug_sidebar(metrics, limit):
+    """Sidebar debug: durasi fase (ms) dan counter untuk N giliran terakhir."""
+    with st.sidebar:
+        st.subheader("⏱️ Turn Timings")
+        rows = [
+            {"trace_id": t["trace_id"], **{f"{k}_ms": round(v * 1000, 1) for k, v in t["spans"].items()}, **t["counters"]}
+            for t in reversed(metrics.recent_traces()) if t["counters"].get("turns")
+        ][:limit]
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        st.caption(" · ".join(f"{name}={value}" for name, value in metrics.counters.items()))
+
+
+def render_messages(records, skip_greeting=False):
+    """Menampilkan pesan dengan markdown terformat yang di-cache per pesan (tanpa format ulang per rerun)."""
+    for i, msg in enumerate(records):
+        # Logika untuk menghindari duplikasi pesan pembuka
+        if skip_greeting and i == 0 and msg.role == "assistant":
+            continue
+        with st.chat_message(msg.role):
+            st.markdown(msg.formatted)
+
+
+def finish_rerun_trace():
+    """Menutup trace rerun ini (dipanggil sebelum st.rerun/st.stop dan di akhir skrip)."""
+    rerun_trace.add_span("rerun", time.perf_counter() - rerun_started)
+    rerun_trace.finish()
+    if DEBUG_SIDEBAR_TURNS:
+        render_debug_sidebar(metrics, DEBUG_SIDEBAR_TURNS)
+
+
 # --- 3. Agent Initialization & State Management ---
 
-if "agent" not in st.session_state:
-    try:
-        available_tools = [] 
-        
-        # --- SYSTEM PROMPT DENGAN PENINGKATAN KUALITAS OUTPUT ---
-        system_prompt = (
-            "You are an expert Emotional Composer Agent. Your primary role is to interpret the user's emotions, stories, or mood descriptions "
-            "and translate them into a detailed, professional musical composition idea. Your output must include the **key, tempo, mood, primary instruments, a conceptual chord progression, and a detailed musical narrative.**"
-            
-            "**CRITICAL RULE: YOU MUST RESPOND IN THE SAME LANGUAGE THE USER USED IN THEIR LAST MESSAGE.** "
-            
-            "**CRITICAL RULE: STRICT ADHERENCE** You must strictly adhere to ALL formatting rules and musical requirements below. **DO NOT generate content that violates the rules.**"
-            "**CONSTRAINT:** You cannot generate technical musical notation like tablature, sheet music, or specific note sequences (e.g., C4, E4). Always provide conceptual descriptions instead of technical data."
-            
-            "**RHYTHMIC REQUIREMENT:** Every composition must specify the **Time Signature** (e.g., 4/4, 3/4) and the overall **Groove/Feel** (e.g., Swing, Straight, Shuffle, Bossa Nova)."
-            "**TIMBRAL REQUIREMENT:** You must specify the **Dynamics** (e.g., *mf, p, f*) and **Specific Instrumental Techniques/Effects** (e.g., *pizzicato strings, flanger effect on guitar, muted brass*) for the primary instruments to achieve the desired emotional color."
-            "**STRUCTURAL REQUIREMENT:** Every composition must include a minimum of **[VERSE 1], [CHORUS], dan [BRIDGE]** atau **[CODA]**. Clearly label each section in your response and in the chord sheet."
-            "**HARMONIC REQUIREMENT:** To ensure a rich, professional sound, your chord progressions must actively utilize **extensions (e.g., maj7, add9, 11th), suspensions (sus2, sus4), or non-diatonic/altered chords (e.g., V7alt) in at least three different chords.** Explicitly mention the musical impact of these complex chords in your description."
-            "**NARRATIVE INTEGRATION MANDATE:** You must explicitly describe **how** the chosen Key, Tempo, Instrumentation, **Groove, and Dynamics** reflect or resolve the user's emotional narrative. Detail the story arc within the music theory."
-            
-            "**FORMAT RULE 1 (CHORD SHEET - CRITICAL FOR VISUAL ALIGNMENT):** You MUST format the core composition idea using a **lyric/chord sheet style** inside a single Markdown code block (` ``` `). **This code block MUST appear at the very end of your response, after all narrative descriptions.**"
-            "To achieve perfect alignment: 1. Use a four-line structure: [Section Name], Chord line, Lyric/Description line, and then a blank line. 2. **CHORD LINE:** Use **MINIMAL 4 SPACES** untuk memposisikan nama chord tepat di atas kata/suku kata. 3. **LYRIC LINE:** Tambahkan **SPASI EKSTRA** di antara kata (minimal 2 spasi) untuk memisahkan kata secara visual."
-            
-            "Example of required ALIGNED CHORD format:"
-            "```"
-            "[VERSE 1]"
-            "Gm        Cmaj7        F"
-            "My  weary  heart  keeps  beating  slow"
-            "```"
-            
-            "Your final response must be creative, evocative, and highly technical in its musical descriptions."
-        )
-        
-        st.session_state.agent = create_react_agent(model=llm, tools=available_tools, prompt=system_prompt)
-    except Exception as e:
-        st.error(f"Error saat menginisialisasi Agent: {e}")
-        st.stop()
+# Satu trace per rerun: fase skrip (riwayat, format, chips) + fase giliran dari engine, dengan trace ID
+metrics = load_metrics(METRICS_JSONL, METRICS_PROM, DEBUG_SIDEBAR_TURNS)
+rerun_trace = metrics.start_trace()
+rerun_started = time.perf_counter()
+
+try:
+    engine = load_engine(
+        google_api_key, CONTEXT_MAX_TURNS, CONTEXT_TOKEN_BUDGET,
+        TURN_DEADLINE, MAX_RETRIES, HEDGE_AFTER,
+        SPECULATIVE_PREFETCH, PREFETCH_WORKERS, PREFETCH_CHIPS, PREFETCH_TOKEN_BUDGET,
+    )
+    engine.agent  # kompilasi graf sekali per proses (lookup pada rerun berikutnya)
+except Exception as e:
+    st.error(f"Error saat menginisialisasi Agent: {e}")
+    st.stop()
 
 if 'chat_input_key' not in st.session_state: st.session_state['chat_input_key'] = time.time() 
 if 'chat_input_text' not in st.session_state: st.session_state['chat_input_text'] = ""
-if "messages" not in st.session_state: st.session_state.messages = []
 if "last_user_language" not in st.session_state: st.session_state["last_user_language"] = "indonesian" 
 if "dynamic_suggestions" not in st.session_state: st.session_state["dynamic_suggestions"] = []
+
+# Percakapan tidak disimpan di session_state: store sesi yang memegangnya (dan boleh mengeluarkannya dari memori).
+# ?session=<id> di URL melanjutkan percakapan tersimpan, juga setelah proses restart.
+sessions = load_session_store(SESSION_DB, SESSION_RESIDENT_TURNS, SESSION_MEMORY_CAP_MB, SESSION_IDLE_SECONDS)
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = sessions.resolve(st.query_params.get("session"))
+if st.query_params.get("session") != st.session_state["session_id"]:
+    st.query_params["session"] = st.session_state["session_id"]
+with rerun_trace.span("open_session"):
+    conversation = sessions.open(st.session_state["session_id"])
     
+def cancel_active_turn(reason):
+    """Membatalkan giliran yang masih di-stream dari rerun sebelumnya (request ke model ikut dihentikan)."""
+    active_turn = st.session_state.pop("active_turn", None)
+    if active_turn is not None:
+        active_turn.cancel(reason)
+
 if reset_button:
-    keys_to_reset = ["agent", "messages", "chat_input_text", "last_user_language", "dynamic_suggestions"] 
+    cancel_active_turn("new_chat")
+    engine.cancel_prefetch(conversation, "new_chat", rerun_trace)
+    # Percakapan lama tetap tersimpan di disk (dapat dilanjutkan lewat ID-nya), tetapi keluar dari memori
+    sessions.evict(st.session_state["session_id"])
+    st.query_params.pop("session", None)
+    keys_to_reset = ["session_id", "chat_input_text", "last_user_language", "dynamic_suggestions"] 
     for key in keys_to_reset: st.session_state.pop(key, None)
+    for key in [k for k in st.session_state if str(k).startswith("history_page_")]: st.session_state.pop(key, None)
     st.session_state['chat_input_key'] = time.time() 
+    finish_rerun_trace()
     st.rerun() 
 
 # --- 4. Display Past Messages ---
 st.divider()
 
-if not st.session_state.messages: 
-    initial_greeting = (
-        "Halo! Saya adalah **Emotional Composer Bot** 🎶. Ceritakanlah tentang **perasaan, kisah, atau suasana hati** yang ingin Anda terjemahkan menjadi musik."
-        "Saya akan merancang ide **komposisi** lengkap, disajikan dalam **format lirik/chord sheet** yang rapi. Saya hanya bisa memberikan **deskripsi musikal**."
-    )
+if not conversation: 
     with st.chat_message("assistant"):
-        st.markdown(initial_greeting)
-    st.session_state.messages.append({"role": "assistant", "content": initial_greeting})
+        st.markdown(INITIAL_GREETING)
+    conversation.append("assistant", INITIAL_GREETING)
 
 
-# Loop tampilan riwayat
-for i, msg in enumerate(st.session_state.messages):
-    # Logika untuk menghindari duplikasi pesan pembuka
-    if i == 0 and len(st.session_state.messages) > 1 and msg["role"] == "assistant":
-        continue
-    
-    with st.chat_message(msg["role"]): 
-        clean_content = re.sub(r'(\n\n---\n\*\*Saran.*?:.*?)', '', msg["content"], flags=re.DOTALL) 
-        clean_content = re.sub(r'(\n\n---\n\*\*Suggestion.*?:.*?)', '', clean_content, flags=re.DOTALL)
-        formatted_text = format_assistant_response(clean_content)
-        st.markdown(formatted_text)
+# Loop tampilan riwayat: giliran lama terlipat (dirender hanya jika dibuka), K giliran terakhir penuh
+with rerun_trace.span("render_history"):
+    history = conversation
+    pages, visible_start = history.history_window(HISTORY_FULL_TURNS, HISTORY_PAGE_TURNS)
+    for page in pages:
+        label = f"🕘 Earlier turns {page.first_turn}–{page.last_turn} ({page.end - page.start} messages)"
+        if st.toggle(label, key=f"history_page_{page.start}"):
+            render_messages(history.records[page.start:page.end])
+    render_messages(history.records[visible_start:], skip_greeting=visible_start == 0 and len(history) > 1)
 
 
 # --- 5. Handle User Input and Agent Communication (Processing Logic) ---
@@ -329,167 +293,68 @@ st.session_state["dynamic_suggestions"] = []
 
 if prompt:
     
-    # PERBAIKAN: Deteksi bahasa yang lebih baik (heuristik yang diperluas)
-    english_keywords = ["the", "is", "are", "you", "what", "how", "why", "idea", "mood", "composition", "melody", "change", "key", "tempo"]
-    prompt_words = prompt.lower().split()
-    english_word_count = sum(1 for word in prompt_words if word in english_keywords)
-    is_prompt_in_english = english_word_count > (len(prompt_words) / 3) 
-    st.session_state["last_user_language"] = "english" if is_prompt_in_english else "indonesian"
-    
     # Tampilkan prompt pengguna di chat SEBELUM proses agent dimulai
     with st.chat_message("user"):
         st.markdown(prompt)
         
-    # Tambahkan prompt ke riwayat SEBELUM streaming dimulai
-    st.session_state.messages.append({"role": "user", "content": prompt}) 
+    # Prompt baru saat giliran sebelumnya masih streaming: batalkan giliran lama
+    cancel_active_turn("new_prompt")
+
+    # Tambahkan prompt ke riwayat SEBELUM streaming dimulai (bahasa & teks spinner dihitung engine)
+    turn = engine.prepare_turn(conversation, prompt, trace=rerun_trace)
+    st.session_state["last_user_language"] = turn.language
+    st.session_state["active_turn"] = turn
     
     with st.chat_message("assistant"): 
         
-        # 🌟 LOGIKA PERBAIKAN SPINNER (Menggunakan Logic yang Ditingkatkan) 🌟
-        
-        # 1. Cek apakah sudah ada output komposisi (kode block) di riwayat
-        has_chord_sheet = any("```" in msg["content"] for msg in st.session_state.messages if msg["role"] == "assistant")
-        
-        # 2. Hitung jumlah balasan asisten sejak awal (untuk menentukan panjang diskusi)
-        num_assistant_responses = len([msg for msg in st.session_state.messages if msg["role"] == "assistant"])
-        if num_assistant_responses > 0 and st.session_state.messages[0]["role"] == "assistant":
-             num_assistant_responses -= 1 # Abaikan salam awal
-
-        
-        # Kriteria untuk menggunakan Spinner Musikal Spesifik:
-        is_musical_focus_phase = has_chord_sheet and num_assistant_responses <= 7 
-
-
-        if is_musical_focus_phase:
-            # Spinner spesifik tentang musik (modifikasi/lanjutan)
-            if st.session_state["last_user_language"] == "english":
-                spinner_text = "Composer Agent is translating emotion into music..."
-            else:
-                spinner_text = "Agen Komposer sedang menerjemahkan emosi ke musik..."
-        else:
-            # Spinner umum untuk percakapan naratif/non-musikal/topik baru
-            if st.session_state["last_user_language"] == "english":
-                spinner_text = "Analyzing your request, please wait..."
-            else:
-                spinner_text = "Menganalisa permintaan Anda, mohon tunggu..."
-        # 🌟 AKHIR LOGIKA PERBAIKAN SPINNER 🌟
-
-        with st.spinner(spinner_text):
-            
-            messages = []
-            for msg in st.session_state.messages: 
-                # Pastikan menghapus saran dari riwayat sebelum dikirim ke LLM
-                clean_content = re.sub(r'(\n\n---\n\*\*Saran.*?:.*?)', '', msg["content"], flags=re.DOTALL) 
-                clean_content = re.sub(r'(\n\n---\n\*\*Suggestion.*?:.*?)', '', clean_content, flags=re.DOTALL)
-                
-                if msg["role"] == "user": messages.append(HumanMessage(content=clean_content))
-                elif msg["role"] == "assistant": messages.append(AIMessage(content=clean_content))
+        with st.spinner(turn.status_text):
             
-            # 🌟 IMPLEMENTASI STREAMING & FALLBACK 🌟
+            # 🌟 IMPLEMENTASI STREAMING, RETRY & CONTINUATION (di engine) 🌟
             answer_container = st.empty()
-            full_answer = ""
-            answer = "" 
-            
-            try:
-                # --- FASE 1: STREAMING (Dioptimalkan untuk LangGraph) ---
-                stream = st.session_state.agent.stream({"messages": messages})
-                
-                for chunk in stream:
-                    if "messages" in chunk:
-                        latest_chunk = chunk["messages"][-1]
-                        
-                        # Filter ketat: Hanya terima AIMessage yang bukan Tool Calls
-                        if isinstance(latest_chunk, AIMessage) and not latest_chunk.tool_calls and not latest_chunk.tool_responses:
-                            content = latest_chunk.content
-                            
-                            # Pastikan konten adalah string non-kosong
-                            if isinstance(content, str) and content.strip(): 
-                                full_answer += content
-                                answer_container.markdown(format_assistant_response(full_answer + "▌")) 
-                            
-                # Hapus kursor setelah stream selesai
-                answer = full_answer.replace("▌", "").strip()
-
-            except Exception as e:
-                logging.error(f"LLM streaming failed: {e}. Trying fallback...")
-                answer = "" 
+            renderer = StreamingRenderer(answer_container, frame_budget=STREAM_FRAME_BUDGET)
+            result = None
             
-            # --- FASE 2: FALLBACK (Jika streaming gagal atau kosong) ---
-            # PERBAIKAN: Jika streaming menghasilkan jawaban terlalu pendek, anggap gagal dan coba fallback.
-            if not answer or len(answer) < 50: 
-                logging.info(f"Answer too short ({len(answer)} chars) or empty. Trying fallback.")
-                try:
-                    response = st.session_state.agent.invoke({"messages": messages})
-                    if "messages" in response and response["messages"]:
-                        fallback_message = response["messages"][-1]
-                        if isinstance(fallback_message, AIMessage) and fallback_message.content:
-                            answer = fallback_message.content.strip()
-                        else:
-                            answer = "Agent produced non-text or empty output (Fallback mode)."
-                    else:
-                        answer = "Agent produced no messages (Fallback mode)."
-                except Exception as e:
-                    logging.error(f"LLM Fallback failed: {e}")
-                    is_english = st.session_state["last_user_language"] == "english"
-                    answer = (
-                        f"**[AGENT FAILURE]** Both streaming and fallback failed: {e}. Please use 'New Chat'." 
-                        if is_english 
-                        else f"**[KEGAGALAN AGEN]** Streaming dan fallback gagal: {e}. Mohon gunakan 'New Chat'."
-                    )
+            for event in engine.stream_turn(turn):
+                if event.kind == "delta":
+                    renderer.feed(event.text)
+                elif event.kind == "reset":
+                    renderer.reset()
+                elif event.kind == "final":
+                    result = event.result
             
-            # Tampilkan Jawaban Final (setelah streaming atau fallback)
-            is_english = st.session_state["last_user_language"] == "english"
+            if st.session_state.get("active_turn") is turn:
+                st.session_state.pop("active_turn", None)
+            if result is None:
+                # Giliran dibatalkan (New Chat / prompt baru); rerun berikutnya yang menampilkan state terbaru
+                finish_rerun_trace()
+                st.stop()
             
-            if answer.startswith("**[AGENT FAILURE]**") or answer.startswith("**[KEGAGALAN AGEN]**"):
-                 # Tampilkan pesan error jika terjadi kegagalan total
-                 answer_container.markdown(format_assistant_response(answer))
-            elif not answer or len(answer) < 50: # Pengecekan final setelah fallback
-                # Tampilkan pesan error yang lebih jelas jika output tetap kosong
-                final_error = (
-                    f"**[ERROR RESPONS AGEN]** {spinner_text} failed to produce output. Please try rephrasing your request or clicking 'New Chat'." 
-                    if is_english 
-                    else f"**[ERROR RESPONS AGEN]** {spinner_text} gagal menghasilkan output. Mohon coba ulangi pertanyaan Anda atau klik 'New Chat'."
-                )
-                answer = final_error
-                answer_container.markdown(format_assistant_response(answer))
-            else:
-                # Jika ada jawaban yang valid, tampilkan
-                answer_container.markdown(format_assistant_response(answer)) 
+            # Tampilkan Jawaban Final (setelah streaming, cache atau retry)
+            with rerun_trace.span("format_final"):
+                # Markdown terformat disimpan di record, sehingga rerun berikutnya tidak memformat ulang
+                answer_container.markdown(result.record.formatted) 
 
-        
-        
-        is_informational_answer = not any(kw in answer.lower() for kw in ["gagal", "mohon maaf", "terjadi kesalahan", "sorry", "error", "fail", "failure", "kegagalan"])
-        
-        # LOGIKA SUGGESTION CHIPS: Hanya tampilkan jika jawaban substantif 
-        if is_informational_answer and len(answer) > 100:
-            st.session_state["dynamic_suggestions"] = get_dynamic_suggestions(answer, st.session_state["last_user_language"])
-            
-            if st.session_state["dynamic_suggestions"]:
-                # 🌟 MENGGUNAKAN FUNGSI DARI FILE TERPISAH 🌟
-                save_suggestion_history(
-                    user_prompt=prompt, 
-                    assistant_response=answer, 
-                    suggestions=st.session_state["dynamic_suggestions"]
-                )
-        else:
-            st.session_state["dynamic_suggestions"] = [] # Pastikan kosong jika tidak ada saran
-        
-        message_to_save = {"role": "assistant", "content": answer}
-        st.session_state.messages.append(message_to_save)
+        st.session_state["dynamic_suggestions"] = result.suggestions
         
         # 🌟 Trigger Rerun HANYA jika prompt datang dari Chip
         if prompt_from_state: 
             st.session_state['chat_input_key'] = time.time()
+            finish_rerun_trace()
             st.rerun()
 
 # --- 6. CHIP PERTANYAAN INTERAKTIF ---
 
 if st.session_state.get("dynamic_suggestions"):
-    st.markdown('<div class="suggestion-chip-container">', unsafe_allow_html=True)
-    questions = st.session_state["dynamic_suggestions"]
-    cols = st.columns(len(questions))
-    for i, question in enumerate(questions):
-        if i < len(cols):
-            with cols[i]:
-                st.button(label=question, key=f"final_chip_q_{hash(question)}_{i}", on_click=send_question_to_chat, args=[question])
-    st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
+    with rerun_trace.span("render_chips"):
+        st.markdown('<div class="suggestion-chip-container">', unsafe_allow_html=True)
+        questions = st.session_state["dynamic_suggestions"]
+        cols = st.columns(len(questions))
+        for i, question in enumerate(questions):
+            if i < len(cols):
+                with cols[i]:
+                    st.button(label=question, key=f"final_chip_q_{hash(question)}_{i}", on_click=send_question_to_chat, args=[question])
+        st.markdown('</div>', unsafe_allow_html=True)
+    # Jawaban chip teratas mulai dihasilkan di latar belakang (sekali per giliran; no-op jika nonaktif)
+    engine.prefetch_suggestions(conversation, questions)
+
+finish_rerun_trace()
\ No newline at end of file
@@ -0,0 +1,246 @@
+# fake_chat_model.py
+"""Chat model lokal yang deterministik untuk CI dan load test (tanpa API key atau jaringan).
+
+`FakeComposerChatModel` dapat dipakai langsung sebagai `llm` di `ComposerEngine` / `create_react_agent`.
+Model ini men-stream jawaban chord sheet bawaan (atau rekaman sesi nyata) dengan model latensi yang
+dapat diatur: time-to-first-token, jeda antar chunk, serta peluang gagal dan jawaban pendek (untuk
+menguji jalur fallback `len(answer) < 50`).
+
+`RecordingChatModel` membungkus model sungguhan dan menyimpan setiap respons stream chunk demi chunk
+(beserta jedanya) ke JSONL, yang kemudian dapat diputar ulang oleh `FakeComposerChatModel(recordings=...)`.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from message_records import detect_language
+
+CANNED_ANSWERS = {
+    "indonesian": [
+        (
+            "Komposisi ini menerjemahkan rasa **rindu yang tenang** menjadi balada Neo-Soul.\n\n"
+            "**Kunci:** D minor\n**Tempo:** Andante (72 BPM)\n**Time Signature:** 4/4, *groove* straight yang santai.\n\n"
+            "Piano Rhodes (*mp*, dengan efek tremolo halus) membuka bagian verse, disusul *pizzicato strings* "
+            "yang memberi denyut lembut. Dm9 dan Gsus4 menahan resolusi, sementara Bbmaj7 membuka ruang harapan "
+            "di chorus sebelum A7alt mengembalikan ketegangan di bridge.\n\n"
+            "```\n[VERSE 1]\nDm9        Gsus4        Bbmaj7\nHati  yang  lelah  tetap  berdetak  pelan\n\n"
+            "[CHORUS]\nFmaj7      Cadd9        A7alt\nRindu  ini  pulang  tanpa  suara\n\n"
+            "[BRIDGE]\nEm7b5      A7alt        Dm9\nDi  ujung  malam  aku  menunggu\n```"
+        ),
+    ],
+    "english": [
+        (
+            "This piece turns **quiet longing** into a Neo-Soul ballad.\n\n"
+            "**Key:** D minor\n**Tempo:** Andante (72 BPM)\n**Time Signature:** 4/4 with a relaxed straight *groove*.\n\n"
+            "A Rhodes piano (*mp*, gentle tremolo) opens the verse while *pizzicato strings* add a soft pulse. "
+            "Dm9 and Gsus4 delay resolution, Bbmaj7 opens a window of hope in the chorus, and A7alt brings the "
+            "tension back in the bridge.\n\n"
+            "```\n[VERSE 1]\nDm9        Gsus4        Bbmaj7\nMy  weary  heart  keeps  beating  slow\n\n"
+            "[CHORUS]\nFmaj7      Cadd9        A7alt\nThis  longing  comes  home  without  a  sound\n\n"
+            "[BRIDGE]\nEm7b5      A7alt        Dm9\nAt  the  edge  of  night  I  wait\n```"
+        ),
+    ],
+}
+SHORT_ANSWER = "Maaf, coba lagi."
+
+
+class FakeModelError(RuntimeError):
+    """Kegagalan simulasi (mis. timeout/5xx) dari model palsu."""
+
+
+def messages_fingerprint(messages: List[BaseMessage]) -> str:
+    """Hash input percakapan untuk mencocokkan rekaman dengan permintaan."""
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(message.type.encode("utf-8"))
+        digest.update(b"\x1f")
+        digest.update(str(message.content).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+def load_recordings(path: str) -> Dict[str, List[dict]]:
+    """Membaca file rekaman JSONL: {fingerprint, chunks: [{text, delay}]} per baris."""
+    recordings: Dict[str, List[dict]] = {}
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                entry = json.loads(line)
+                recordings[entry["fingerprint"]] = entry["chunks"]
+    return recordings
+
+
+def _split_chunks(text: str, chunk_chars: int) -> List[str]:
+    return [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or [""]
+
+
+class FakeComposerChatModel(BaseChatModel):
+    """Chat model palsu dengan model latensi dan laju kegagalan yang dapat dikonfigurasi."""
+
+    time_to_first_token: float = 0.4
+    inter_chunk_delay: float = 0.03
+    jitter: float = 0.0
+    chunk_chars: int = 24
+    failure_rate: float = 0.0
+    short_answer_rate: float = 0.0
+    seed: int = 0
+    answers: Optional[Dict[str, List[str]]] = None
+    recordings: Optional[str] = None
+    time_scale: float = 1.0
+
+    _calls: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _recorded: Optional[Dict[str, List[dict]]] = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-composer"
+
+    def bind_tools(self, tools, **kwargs):
+        # Tidak ada tool call; agen ReAct langsung menerima jawaban akhir
+        return self
+
+    def _plan(self, messages: List[BaseMessage]) -> List[dict]:
+        """Menentukan (secara deterministik per nomor panggilan) chunk dan jeda untuk satu respons."""
+        with self._lock:
+            call_index = self._calls
+            self._calls += 1
+            if self.recordings and self._recorded is None:
+                self._recorded = load_recordings(self.recordings)
+
+        rng = random.Random(f"{self.seed}:{call_index}")
+        if rng.random() < self.failure_rate:
+            return [{"error": f"Simulated model failure (call {call_index})", "delay": self.time_to_first_token}]
+
+        if self._recorded:
+            recorded = self._recorded.get(messages_fingerprint(messages))
+            if recorded is not None:
+                return [{"text": c["text"], "delay": c["delay"] * self.time_scale} for c in recorded]
+
+        if rng.random() < self.short_answer_rate:
+            text = SHORT_ANSWER
+        else:
+            last_human = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+            language = detect_language(str(last_human.content)) if last_human is not None else "indonesian"
+            options = (self.answers or CANNED_ANSWERS).get(language) or CANNED_ANSWERS["indonesian"]
+            text = options[rng.randrange(len(options))]
+
+        plan = []
+        for index, piece in enumerate(_split_chunks(text, self.chunk_chars)):
+            base = self.time_to_first_token if index == 0 else self.inter_chunk_delay
+            delay = max(0.0, base + (rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0))
+            plan.append({"text": piece, "delay": delay * self.time_scale})
+        return plan
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for step in self._plan(messages):
+            if step["delay"]:
+                time.sleep(step["delay"])
+            if "error" in step:
+                raise FakeModelError(step["error"])
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=step["text"]))
+            if run_manager:
+                run_manager.on_llm_new_token(step["text"], chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for step in self._plan(messages):
+            if step["delay"]:
+                await asyncio.sleep(step["delay"])
+            if "error" in step:
+                raise FakeModelError(step["error"])
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=step["text"]))
+            if run_manager:
+                await run_manager.on_llm_new_token(step["text"], chunk=chunk)
+            yield chunk
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        parts = [chunk.message.content async for chunk in self._astream(messages, stop, run_manager, **kwargs)]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(parts)))])
+
+
+class RecordingChatModel(BaseChatModel):
+    """Membungkus chat model sungguhan dan merekam setiap respons stream ke JSONL untuk diputar ulang."""
+
+    inner: BaseChatModel
+    path: str
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return f"recording-{self.inner._llm_type}"
+
+    def bind_tools(self, tools, **kwargs):
+        # Agen komposer tidak memakai tool; rekaman hanya mencakup jawaban teks
+        return self
+
+    def _save(self, messages: List[BaseMessage], chunks: List[dict]) -> None:
+        entry = {"fingerprint": messages_fingerprint(messages), "chunks": chunks}
+        with self._lock, open(self.path, "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        chunks, last = [], time.monotonic()
+        for chunk in self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            now = time.monotonic()
+            chunks.append({"text": chunk.message.content, "delay": round(now - last, 4)})
+            last = now
+            yield chunk
+        self._save(messages, chunks)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        chunks, last = [], time.monotonic()
+        async for chunk in self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            now = time.monotonic()
+            chunks.append({"text": chunk.message.content, "delay": round(now - last, 4)})
+            last = now
+            yield chunk
+        self._save(messages, chunks)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        parts = [chunk.message.content async for chunk in self._astream(messages, stop, run_manager, **kwargs)]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(parts)))])
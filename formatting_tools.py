@@ -0,0 +1,116 @@
+# formatting_tools.py
+
+import hashlib
+import re
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Pattern
+
+# Tabel kata kunci (urutan dan duplikasi dipertahankan agar output identik dengan versi lama)
+KEYWORDS_TO_BOLD = (
+    "komposisi", "melodi", "chord", "instrumentasi", "tempo", "emosi", "kunci", "composition",
+    "melody", "key", "tempo", "instrumentation", "emotion", "struktur", "progresi", "genre",
+    "dynamics", "groove",
+)
+ENGLISH_WORDS = ("rag", "agent", "tool", "api", "prompt", "midi", "genre", "vibe", "groove", "dynamics", "beat", "solo")
+
+CODE_BLOCK_SPLIT_RE = re.compile(r'(```.*?```)', re.DOTALL)
+
+
+class ResponseFormatter:
+    """Formatter satu-lintasan: tabel kata kunci dikompilasi sekali menjadi satu regex alternasi.
+
+    Versi lama menjalankan satu `re.sub` per kata kunci secara berurutan. Karena setiap substitusi
+    hanya menambahkan tanda `*` di sekitar kata yang sama, hasil akhirnya untuk sebuah kata setara
+    dengan membungkusnya dengan (2 x jumlah kemunculan di daftar bold + jumlah kemunculan di daftar
+    italic) tanda `*`. Contoh: "genre" -> "***genre***", "tempo" (dua kali di daftar bold) -> "****tempo****".
+    """
+
+    def __init__(self, bold_keywords: Iterable[str] = KEYWORDS_TO_BOLD, italic_words: Iterable[str] = ENGLISH_WORDS):
+        markers: Dict[str, int] = {}
+        for keyword in bold_keywords:
+            markers[keyword.casefold()] = markers.get(keyword.casefold(), 0) + 2
+        for word in italic_words:
+            markers[word.casefold()] = markers.get(word.casefold(), 0) + 1
+        self._wrappers: Dict[str, str] = {word: "*" * count for word, count in markers.items()}
+
+        # Kata terpanjang didahulukan agar alternasi tidak berhenti di prefiks yang lebih pendek
+        alternation = "|".join(re.escape(word) for word in sorted(self._wrappers, key=len, reverse=True))
+        self._pattern: Pattern[str] = re.compile(r'\b(?:' + alternation + r')\b', re.IGNORECASE)
+
+    def _wrap(self, match: "re.Match[str]") -> str:
+        word = match.group(0)
+        wrapper = self._wrappers.get(word.casefold(), "")
+        return f"{wrapper}{word}{wrapper}"
+
+    def format_plain(self, text: str) -> str:
+        """Memformat teks yang dipastikan tidak mengandung blok kode."""
+        return self._pattern.sub(self._wrap, text)
+
+    def format(self, text: str) -> str:
+        """Mengaplikasikan BOLD/ITALIC dalam satu lintasan, KECUALI di dalam blok kode."""
+        if "```" not in text:
+            return self._pattern.sub(self._wrap, text)
+        formatted_parts = []
+        for part in CODE_BLOCK_SPLIT_RE.split(text):
+            if part.startswith('```') and part.endswith('```'):
+                formatted_parts.append(part)
+            else:
+                formatted_parts.append(self._pattern.sub(self._wrap, part))
+        return "".join(formatted_parts)
+
+
+# Instance bersama (dikompilasi sekali saat modul diimpor)
+DEFAULT_FORMATTER = ResponseFormatter()
+
+
+def format_assistant_response(text: str) -> str:
+    """Mengaplikasikan formatting BOLD untuk poin penting dan ITALIC untuk kata Inggris umum, KECUALI di dalam blok kode."""
+    return DEFAULT_FORMATTER.format(text)
+
+
+class FormattedCache:
+    """LRU markdown terformat, dikunci oleh hash konten (blake2b), dipakai bersama oleh semua sesi.
+
+    Teks yang sama (mis. jawaban dari cache respons atau percakapan yang dipulihkan) hanya diformat sekali.
+    Dibatasi jumlah entri dan `max_bytes` (perkiraan `sys.getsizeof`), terpisah dari batas memori sesi.
+    """
+
+    def __init__(self, max_entries: int = 2048, formatter: ResponseFormatter = DEFAULT_FORMATTER, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.formatter = formatter
+        self._entries: "OrderedDict[bytes, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def format(self, text: str) -> str:
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            formatted = self._entries.get(key)
+            if formatted is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return formatted
+        formatted = self.formatter.format(text)
+        size = sys.getsizeof(formatted)
+        with self._lock:
+            self.misses += 1
+            if size > self.max_bytes or key in self._entries:
+                return formatted
+            self._entries[key] = formatted
+            self.memory_bytes += size
+            while len(self._entries) > self.max_entries or self.memory_bytes > self.max_bytes:
+                self.memory_bytes -= sys.getsizeof(self._entries.popitem(last=False)[1])
+        return formatted
+
+
+FORMATTED_CACHE = FormattedCache()
+
+
+def format_cached(text: str) -> str:
+    """Seperti `format_assistant_response`, tetapi hasilnya di-cache per hash konten."""
+    return FORMATTED_CACHE.format(text)
@@ -0,0 +1,84 @@
+# history_admin.py
+"""Perawatan database suggestion_history: retensi, kompaksi, dan ekspor streaming.
+
+Contoh:
+    python history_admin.py compact --retain-days 180                       # hapus baris lama + intern set saran
+    python history_admin.py compact --train-dictionary --compress zlib-dict --vacuum
+    python history_admin.py export --output history.jsonl --start 2024-01-01 --chunk-rows 1000
+
+`compact` aman dijalankan saat aplikasi hidup (WAL, satu transaksi per batch); `--vacuum` mengunci
+database selama VACUUM berjalan. Untuk menyimpan baris BARU terkompresi, set env
+SUGGESTION_DB_COMPRESSION=zlib atau zlib-dict pada proses aplikasi/batch.
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+from database_tools import COMPRESSION_MODES, DB_PATH, compact_suggestion_history
+from history_queries import iter_history_export
+
+
+def run_compact(args) -> int:
+    report = compact_suggestion_history(
+        db_path=args.db,
+        retain_days=args.retain_days,
+        compression=args.compress,
+        train_dictionary=args.train_dictionary,
+        sample_rows=args.sample_rows,
+        batch_rows=args.batch_rows,
+        vacuum=args.vacuum,
+    )
+    print(
+        f"[compact] deleted={report.deleted_rows} rewritten={report.rewritten_rows} "
+        f"dictionary={report.dictionary_id} removed_sets={report.removed_sets} "
+        f"removed_dictionaries={report.removed_dictionaries} "
+        f"size={report.bytes_before / 1024:.0f} KB -> {report.bytes_after / 1024:.0f} KB",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def run_export(args) -> int:
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    rows = 0
+    try:
+        for record in iter_history_export(args.start, args.end, chunk_rows=args.chunk_rows, db_path=args.db):
+            output.write(json.dumps(record._asdict(), ensure_ascii=False) + "\n")
+            rows += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"[export] {rows} rows", file=sys.stderr)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH, help="Path database riwayat saran")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compact = commands.add_parser("compact", help="Retensi + kompaksi")
+    compact.add_argument("--retain-days", type=int, default=None, help="Hapus baris yang lebih tua dari N hari")
+    compact.add_argument("--compress", choices=sorted(COMPRESSION_MODES), default=None, help="Encode ulang respons lama ke mode ini")
+    compact.add_argument("--train-dictionary", action="store_true", help="Latih kamus kompresi baru dari respons terbaru")
+    compact.add_argument("--sample-rows", type=int, default=500, help="Jumlah respons untuk melatih kamus")
+    compact.add_argument("--batch-rows", type=int, default=500, help="Baris per transaksi saat menulis ulang")
+    compact.add_argument("--vacuum", action="store_true", help="VACUUM setelah kompaksi (mengembalikan ruang disk)")
+    compact.set_defaults(handler=run_compact)
+
+    export = commands.add_parser("export", help="Ekspor JSONL (streaming, memori terbatas)")
+    export.add_argument("--output", default=None, help="File JSONL tujuan (default stdout)")
+    export.add_argument("--start", default=None, help="created_at >= START ('YYYY-MM-DD[ HH:MM:SS]')")
+    export.add_argument("--end", default=None, help="created_at < END")
+    export.add_argument("--chunk-rows", type=int, default=500, help="Baris per query")
+    export.set_defaults(handler=run_export)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+# history_queries.py
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from database_tools import DB_PATH, connect_suggestion_db, decode_history_response, init_suggestion_db
+
+# Token kata untuk membangun query FTS5 yang aman dari input bebas pengguna
+_FTS_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class HistoryRecord(NamedTuple):
+    suggestion_id: int
+    created_at: str
+    user_prompt: str
+    assistant_response: str
+    suggestions: List[str]
+
+
+class SearchHit(NamedTuple):
+    suggestion_id: int
+    created_at: str
+    user_prompt: str
+    snippet: str
+    score: float
+
+
+# Cursor keyset untuk paging: (created_at, suggestion_id) baris terakhir halaman sebelumnya
+PageCursor = Tuple[str, int]
+
+_local = threading.local()
+
+
+def get_read_connection(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """Koneksi baca per thread (WAL: pembaca tidak menunggu writer latar belakang)."""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        init_suggestion_db(db_path)
+        conn = connect_suggestion_db(db_path)
+        conn.execute("PRAGMA query_only=ON")
+        connections[db_path] = conn
+    return conn
+
+
+def build_fts_query(text: str, prefix: bool = True) -> str:
+    """Mengubah teks bebas menjadi query FTS5 (term di-quote, digabung AND, prefiks di term terakhir)."""
+    terms = _FTS_TERM_RE.findall(text)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    if prefix:
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _fold(term: str) -> str:
+    """Bentuk term seperti tokenizer FTS (unicode61 remove_diacritics): huruf kecil tanpa diakritik."""
+    return "".join(c for c in unicodedata.normalize("NFKD", term.casefold()) if not unicodedata.combining(c))
+
+
+def make_snippet(text: str, query: str, tokens: int = 16) -> str:
+    """Cuplikan `tokens` kata dari `text` dengan kecocokan term `query` terbanyak (term ditandai **...**).
+
+    Indeks FTS contentless tidak menyimpan teks, sehingga snippet() SQLite tidak tersedia; aturan
+    pencocokan mengikuti `build_fts_query` (term terakhir sebagai prefiks).
+    """
+    terms = [_fold(term) for term in _FTS_TERM_RE.findall(query)]
+    words = list(_FTS_TERM_RE.finditer(text))
+    if not terms or not words:
+        return ""
+
+    def matched_term(word: str) -> Optional[str]:
+        folded = _fold(word)
+        if folded in terms[:-1]:
+            return folded
+        return terms[-1] if folded.startswith(terms[-1]) else None
+
+    hits = [matched_term(word.group()) for word in words]
+    best_start, best_score = 0, 0
+    for index, term in enumerate(hits):
+        if term is None:
+            continue
+        start = max(0, min(index - 2, len(words) - tokens))
+        score = len({hit for hit in hits[start:start + tokens] if hit is not None})
+        if score > best_score:
+            best_start, best_score = start, score
+    end = min(len(words), best_start + tokens)
+    parts = [" … "] if best_start > 0 else []
+    position = words[best_start].start()
+    for word, term in zip(words[best_start:end], hits[best_start:end]):
+        parts.append(text[position:word.start()])
+        parts.append(f"**{word.group()}**" if term is not None else word.group())
+        position = word.end()
+    if end < len(words):
+        parts.append(" … ")
+    return "".join(parts)
+
+
+def _history_record(conn: sqlite3.Connection, db_path: str, row) -> HistoryRecord:
+    """Baris view suggestion_history_plain -> HistoryRecord (respons terkompresi didekode di sini)."""
+    row_id, created_at, prompt, value, codec, dict_id, suggestions_json = row
+    return HistoryRecord(row_id, created_at, prompt, decode_history_response(db_path, value, codec, dict_id, conn), json.loads(suggestions_json))
+
+
+def list_history(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = 50,
+    after: Optional[PageCursor] = None,
+    db_path: str = DB_PATH,
+) -> Tuple[List[HistoryRecord], Optional[PageCursor]]:
+    """Daftar riwayat dalam rentang waktu [start, end), urut terbaru dulu, dengan paging keyset.
+
+    `start`/`end` berformat 'YYYY-MM-DD HH:MM:SS' (atau prefiks tanggal). Mengembalikan
+    (baris, cursor halaman berikutnya); cursor None berarti halaman terakhir.
+    """
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("created_at >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("created_at < ?")
+        params.append(end)
+    if after is not None:
+        clauses.append("(created_at, suggestion_id) < (?, ?)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = f"""
+    SELECT suggestion_id, created_at, user_prompt, assistant_response, response_codec, response_dict_id, suggestions_json
+    FROM suggestion_history_plain {where}
+    ORDER BY created_at DESC, suggestion_id DESC
+    LIMIT ?
+    """
+    conn = get_read_connection(db_path)
+    records = [_history_record(conn, db_path, row) for row in conn.execute(query, (*params, limit)).fetchall()]
+    next_cursor = (records[-1].created_at, records[-1].suggestion_id) if len(records) == limit else None
+    return records, next_cursor
+
+
+def iter_history_export(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    chunk_rows: int = 500,
+    db_path: str = DB_PATH,
+) -> Iterator[HistoryRecord]:
+    """Mengalirkan seluruh riwayat (urut suggestion_id naik) untuk analitik/ekspor.
+
+    Dibaca per potongan `chunk_rows` baris dengan keyset pada suggestion_id: memori tetap terbatas dan
+    tidak ada transaksi baca panjang yang menahan checkpoint WAL. Respons terkompresi dan set saran yang
+    di-intern didekode secara transparan.
+    """
+    clauses, params = ["suggestion_id > ?"], []
+    if start is not None:
+        clauses.append("created_at >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("created_at < ?")
+        params.append(end)
+    query = f"""
+    SELECT suggestion_id, created_at, user_prompt, assistant_response, response_codec, response_dict_id, suggestions_json
+    FROM suggestion_history_plain WHERE {' AND '.join(clauses)}
+    ORDER BY suggestion_id
+    LIMIT ?
+    """
+    last_id = 0
+    while True:
+        conn = get_read_connection(db_path)
+        rows = conn.execute(query, (last_id, *params, chunk_rows)).fetchall()
+        for row in rows:
+            yield _history_record(conn, db_path, row)
+        if len(rows) < chunk_rows:
+            return
+        last_id = rows[-1][0]
+
+
+def search_history(
+    text: str,
+    limit: int = 20,
+    offset: int = 0,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    db_path: str = DB_PATH,
+) -> List[SearchHit]:
+    """Pencarian full-text berperingkat (bm25) atas prompt dan komposisi sebelumnya.
+
+    Kecocokan di `user_prompt` diberi bobot lebih tinggi daripada di `assistant_response`.
+    """
+    match = build_fts_query(text)
+    if not match:
+        return []
+    clauses, params = ["suggestion_history_fts MATCH ?"], [match]
+    if start is not None:
+        clauses.append("h.created_at >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("h.created_at < ?")
+        params.append(end)
+    query = f"""
+    SELECT h.suggestion_id, h.created_at, h.user_prompt,
+           h.assistant_response, h.response_codec, h.response_dict_id,
+           bm25(suggestion_history_fts, 4.0, 1.0) AS score
+    FROM suggestion_history_fts
+    JOIN suggestion_history AS h ON h.suggestion_id = suggestion_history_fts.rowid
+    WHERE {' AND '.join(clauses)}
+    ORDER BY score
+    LIMIT ? OFFSET ?
+    """
+    conn = get_read_connection(db_path)
+    try:
+        rows = conn.execute(query, (*params, limit, offset)).fetchall()
+    except sqlite3.OperationalError as e:
+        logging.error(f"Full-text search failed: {e}")
+        return []
+    return [
+        SearchHit(row_id, created_at, prompt, make_snippet(decode_history_response(db_path, value, codec, dict_id, conn), text), score)
+        for row_id, created_at, prompt, value, codec, dict_id, score in rows
+    ]
@@ -0,0 +1,129 @@
+# language_tools.py
+
+import math
+import re
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, NamedTuple
+
+INDONESIAN = "indonesian"
+ENGLISH = "english"
+# Bahasa default jika teks tidak memberi bukti apa pun (sama dengan heuristik lama)
+DEFAULT_LANGUAGE = INDONESIAN
+# Di bawah ambang ini hasil dianggap ragu (mis. "tempo 90"); pemanggil boleh memakai konteks sebelumnya
+LOW_CONFIDENCE = 0.65
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+# Bobot kata fungsi/kata umum per bahasa. Istilah musik yang dipakai di kedua bahasa
+# (tempo, chord, bpm, minor, mayor, genre, groove) sengaja tidak dimasukkan.
+_INDONESIAN_WORDS = (
+    "yang", "dan", "di", "ke", "dari", "ini", "itu", "saya", "aku", "kamu", "anda", "kita", "kami", "dia", "mereka",
+    "ingin", "mau", "lagu", "tentang", "dengan", "untuk", "tidak", "tak", "bisa", "buat", "buatkan", "tolong", "coba",
+    "ubah", "ganti", "jadi", "menjadi", "lebih", "sedikit", "agak", "nada", "kunci", "percepat", "perlambat", "cepat",
+    "lambat", "sebuah", "satu", "apa", "bagaimana", "mengapa", "kenapa", "juga", "sudah", "belum", "akan", "ada",
+    "pada", "oleh", "seperti", "karena", "tapi", "tetapi", "namun", "rasa", "perasaan", "sedih", "senang", "bahagia",
+    "rindu", "hati", "cinta", "malam", "hujan", "pagi", "sore", "suasana", "dong", "ya", "nya", "lagi", "saja", "aja",
+    "sih", "kok", "deh", "yg", "gak", "nggak", "enggak", "banget", "sangat", "sekali", "bagian", "musik", "versi",
+    "bait", "reff", "lirik", "kord", "nadanya", "temponya", "kuncinya", "tambah", "kurangi", "naikkan",
+    "turunkan", "tenang", "galau", "kecewa", "marah", "takut", "harapan", "kenangan", "pulang", "pergi", "sendiri",
+    "bersama", "semua", "setiap", "masih", "selalu", "pernah", "kalau", "jika", "bila", "agar", "supaya", "sebagai",
+    "relatif", "ritme", "iringan", "instrumen", "penuh", "hangat", "gelap", "terang", "lembut", "keras", "jelaskan",
+    "berikan", "tunjukkan", "kasih", "minta", "boleh", "perlu", "harus", "dalam", "luar", "atas", "bawah", "antara",
+    "tahun", "nuansa", "pakai", "gimana", "pengen", "dikit", "kayak", "biar", "terus", "habis", "sama", "punya",
+)
+_ENGLISH_WORDS = (
+    "the", "a", "an", "is", "are", "was", "were", "be", "been", "to", "of", "and", "in", "on", "for", "with", "about",
+    "i", "you", "me", "my", "your", "it", "its", "this", "that", "these", "those", "what", "how", "why", "when", "where",
+    "can", "could", "would", "should", "will", "please", "make", "want", "song", "change", "more", "less", "feel",
+    "feeling", "feelings", "sad", "happy", "love", "night", "slow", "slower", "faster", "fast", "speed", "up", "down",
+    "like", "but", "so", "not", "don't", "do", "does", "just", "some", "something", "give", "write", "compose", "idea",
+    "composition", "melody", "harmony", "relative", "brighter", "darker", "softer", "louder", "heart", "rain", "hope",
+    "lonely", "alone", "memory", "memories", "home", "again", "still", "always", "never", "every", "all", "into",
+    "from", "by", "at", "as", "or", "if", "than", "then", "there", "here", "have", "has", "had", "we", "they", "our",
+    "their", "she", "he", "her", "his", "mood", "vibe", "explain", "show", "add", "remove", "lower", "raise", "key",
+    "section", "bridge", "verse", "chorus", "instrument", "instruments", "warm", "dark", "bright", "gentle", "calm",
+    "angry", "afraid", "hopeful", "melancholy", "nostalgic", "which", "who", "very", "too", "much", "many", "tell",
+)
+# Kata yang muncul di daftar keduanya (mis. "relative", "mood", "key") tetap dihitung untuk Inggris
+# hanya dengan bobot rendah agar prompt Indonesia pendek seperti "ubah key" tidak terbalik.
+_WEAK_ENGLISH = frozenset(("mood", "key", "vibe", "relative", "idea", "bridge", "verse", "chorus"))
+
+# Trigram karakter khas (kata diberi padding spasi). Bobot positif = Indonesia, negatif = Inggris.
+_TRIGRAM_WEIGHTS = {
+    # Indonesia: afiks (me-/ber-/pe-/ke-/-kan/-nya/-lah/-kah), gugus "ng"/"ngg"/"ngk", akhiran vokal
+    " me": 1.0, " be": 0.8, " pe": 0.8, " ke": 0.8, " di": 0.6, " se": 0.6, " ny": 1.5, "kan": 1.2,
+    "an ": 0.8, "nya": 1.5, "ya ": 1.0, "lah": 1.2, "kah": 1.5, "pun": 1.0, "ang": 0.8, "ng ": 0.4,
+    "ung": 0.8, "eng": 0.6, "nga": 1.2, "ngg": 1.2, "ngk": 1.5, "aan": 1.5, "ua ": 1.0, "ia ": 0.8,
+    "ah ": 1.0, "ak ": 1.0, "uk ": 1.2, "ik ": 0.8, "ap ": 0.8, "ku ": 1.2, "mu ": 1.2, "au ": 1.0,
+    "ai ": 1.0, "sa ": 0.8, "ra ": 0.8, "ji ": 1.0, "ju ": 1.0, "ja ": 1.0, "ba ": 1.0, "bu ": 1.0,
+    "ca ": 1.0, "amb": 0.6, "emb": 0.8, "dar": 0.6, "ela": 0.6, "ala": 0.6, "aga": 0.8, "ega": 0.8,
+    "uat": 0.8, "ebu": 1.0, "ntu": 0.8, "tuk": 1.2, "apa": 1.0, "ika": 0.8, "aka": 0.8, "ada": 0.8,
+    "asi": 0.6, "nda": 0.8, "aya": 1.0, "ggi": 1.0, "uru": 0.8, "ari": 0.5, "ri ": 0.6, "ti ": 0.6,
+    # Inggris: "th", "wh", "sh", "ck", "ght", -ing/-ed/-ly/-tion/-ous/-ful, akhiran -e/-y/-w setelah konsonan
+    "the": -1.8, " th": -1.5, "th ": -1.0, "he ": -1.0, " wh": -1.5, "wha": -1.2, "hat": -0.8, "sh ": -1.0,
+    "ck ": -1.2, "ght": -1.8, "igh": -1.5, "ing": -0.8, "ed ": -1.2, "ly ": -1.2, "ion": -1.0, "tio": -1.0,
+    "ou ": -1.2, "you": -1.5, "ow ": -1.0, "aw ": -1.0, "ew ": -1.0, "ee ": -1.0, "ook": -1.0, "ear": -0.8,
+    "ce ": -1.2, "se ": -0.6, "ve ": -1.2, "ke ": -0.6, "re ": -0.8, "er ": -0.6, "es ": -0.6, "ts ": -1.0,
+    "st ": -0.6, "nd ": -0.8, "of ": -1.5, " of": -1.2, "or ": -0.6, "wit": -1.0, "ith": -1.0, "ful": -1.2,
+    "ous": -1.5, "ess": -0.8, "ll ": -1.2, "ay ": -0.6, "ey ": -1.0, "ry ": -1.0, "ty ": -1.0, "ere": -0.8,
+    "ove": -1.0, "oul": -1.2, "ld ": -1.0, "wer": -0.8, " qu": -1.2, "ive": -1.0, "ake": -1.0, "ome": -1.0,
+    "own": -1.0, "out": -0.8, "are": -0.8, "ire": -0.8, "ge ": -0.8, "te ": -0.6, "ne ": -0.6, "le ": -0.8,
+}
+
+# Tabel beku: dibangun sekali saat impor, tidak dapat diubah saat runtime
+WORD_WEIGHTS: Mapping[str, float] = MappingProxyType({
+    **{word: 2.5 for word in _INDONESIAN_WORDS},
+    **{word: (-0.8 if word in _WEAK_ENGLISH else -2.5) for word in _ENGLISH_WORDS if word not in _INDONESIAN_WORDS},
+})
+TRIGRAM_WEIGHTS: Mapping[str, float] = MappingProxyType(dict(_TRIGRAM_WEIGHTS))
+# Skala logistik: selisih skor -> peluang Indonesia
+_LOGISTIC_SCALE = 0.6
+
+
+class LanguageGuess(NamedTuple):
+    language: str
+    confidence: float
+    score: float
+
+
+def identify_language(text: str) -> LanguageGuess:
+    """Menebak bahasa (Indonesia vs. Inggris) dalam satu lintasan token.
+
+    Setiap kata dinilai dari tabel kata fungsi dan trigram karakternya (dengan padding spasi); skor
+    total diubah menjadi peluang dengan fungsi logistik. Confidence adalah peluang bahasa pemenang
+    (0.5 = tidak ada bukti, default Indonesia).
+    """
+    score = 0.0
+    words = WORD_RE.findall(text.lower())
+    word_weights = WORD_WEIGHTS
+    trigram_weights = TRIGRAM_WEIGHTS
+    for word in words:
+        weight = word_weights.get(word)
+        if weight is not None:
+            score += weight
+            continue
+        padded = f" {word} "
+        for index in range(len(padded) - 2):
+            gram_weight = trigram_weights.get(padded[index:index + 3])
+            if gram_weight:
+                score += gram_weight
+    if not words:
+        return LanguageGuess(DEFAULT_LANGUAGE, 0.5, 0.0)
+    # Normalisasi sebagian terhadap panjang: teks panjang tetap yakin, tetapi satu kata tidak mendominasi
+    normalized = max(-40.0, min(40.0, score / math.sqrt(len(words))))
+    probability_id = 1.0 / (1.0 + math.exp(-_LOGISTIC_SCALE * normalized))
+    if probability_id >= 0.5:
+        return LanguageGuess(INDONESIAN, probability_id, score)
+    return LanguageGuess(ENGLISH, 1.0 - probability_id, score)
+
+
+def identify_languages(texts: Iterable[str]) -> List[LanguageGuess]:
+    """Penilaian batch (jalur batch/backfill): teks identik hanya dinilai sekali."""
+    seen: Dict[str, LanguageGuess] = {}
+    results = []
+    for text in texts:
+        guess = seen.get(text)
+        if guess is None:
+            guess = seen[text] = identify_language(text)
+        results.append(guess)
+    return results
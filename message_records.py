@@ -0,0 +1,216 @@
+# message_records.py
+
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from cache_tools import normalize_text
+from context_tools import extract_key_tempo
+from database_tools import clean_suggestion_footer
+from formatting_tools import format_cached
+from language_tools import LOW_CONFIDENCE, LanguageGuess, identify_language, identify_languages
+
+
+def detect_language(text: str) -> str:
+    """Mengembalikan 'english' atau 'indonesian' (lihat `language_tools.identify_language`)."""
+    return identify_language(text).language
+
+
+class MessageRecord:
+    """Satu pesan percakapan dengan fitur yang dihitung sekali saat pesan ditambahkan."""
+
+    __slots__ = ("role", "content", "clean_content", "language", "language_confidence", "has_chord_sheet", "key", "tempo", "_formatted")
+
+    def __init__(
+        self,
+        role: str,
+        content: str,
+        clean_content: str,
+        language: Optional[str] = None,
+        has_chord_sheet: bool = False,
+        key: Optional[str] = None,
+        tempo: Optional[str] = None,
+        language_confidence: Optional[float] = None,
+    ):
+        self.role = role
+        self.content = content
+        self.clean_content = clean_content
+        self.language = language
+        self.language_confidence = language_confidence
+        self.has_chord_sheet = has_chord_sheet
+        self.key = key
+        self.tempo = tempo
+        self._formatted: Optional[str] = None
+
+    @property
+    def formatted(self) -> str:
+        """Markdown terformat dari `clean_content`, dihitung sekali per pesan (lalu dari cache hash konten)."""
+        if self._formatted is None:
+            self._formatted = format_cached(self.clean_content)
+        return self._formatted
+
+    @classmethod
+    def create(cls, role: str, content: str, language_guess: Optional[LanguageGuess] = None) -> "MessageRecord":
+        """Membuat record dan menghitung fiturnya; `language_guess` dapat diberikan dari penilaian batch."""
+        clean_content = clean_suggestion_footer(content)
+        if role == "user":
+            guess = language_guess or identify_language(clean_content)
+            return cls(role, content, clean_content, language=guess.language, language_confidence=guess.confidence)
+        has_chord_sheet = "```" in clean_content
+        key, tempo = extract_key_tempo(clean_content)
+        return cls(role, content, clean_content, has_chord_sheet=has_chord_sheet, key=key, tempo=tempo)
+
+    def __repr__(self) -> str:
+        return f"MessageRecord(role={self.role!r}, chars={len(self.content)}, chord_sheet={self.has_chord_sheet})"
+
+
+class HistoryPage(NamedTuple):
+    """Rentang riwayat lama yang ditampilkan terlipat: records[start:end] berisi giliran first_turn..last_turn."""
+    start: int
+    end: int
+    first_turn: int
+    last_turn: int
+
+
+class CleanHistory(Sequence):
+    """Pandangan (role, clean_content) atas record tanpa menyalin string (masukan `ConversationWindow.build`)."""
+
+    __slots__ = ("_records",)
+
+    def __init__(self, records):
+        self._records = records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [(record.role, record.clean_content) for record in self._records[index]]
+        record = self._records[index]
+        return record.role, record.clean_content
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        for record in self._records:
+            yield record.role, record.clean_content
+
+
+class ConversationLog:
+    """Daftar pesan sesi beserta penghitung berjalan.
+
+    Penghitung (jumlah balasan asisten, ada/tidaknya chord sheet, himpunan prompt pengguna yang dinormalisasi)
+    diperbarui di `append`, sehingga logika per giliran tidak perlu memindai ulang seluruh riwayat.
+    `records` dapat berupa list biasa atau kontainer berhalaman (`session_tools.PagedRecords`) yang
+    menyimpan giliran lama di disk; kontainer cukup mendukung append, len, indeks/slice, iterasi dan `copy()`.
+    """
+
+    def __init__(self, records=None):
+        self.records = records if records is not None else []
+        # Prompt pengguna yang dinormalisasi (filter saran O(1) per kandidat)
+        self.asked_prompts: Set[str] = set()
+        self.assistant_count = 0
+        self.has_chord_sheet = False
+        self.last_chord_record: Optional[MessageRecord] = None
+        self.last_user_record: Optional[MessageRecord] = None
+        self.first_role: Optional[str] = None
+        # Indeks record setiap prompt pengguna (awal setiap giliran)
+        self.turn_starts: List[int] = []
+        # Jendela konteks milik percakapan ini (diisi oleh ComposerEngine saat pertama dipakai)
+        self.context_window = None
+        # State prefetch spekulatif chip (prefetch_tools.PrefetchSession), jika diaktifkan
+        self.prefetch = None
+
+    def append(self, role_or_record, content: Optional[str] = None) -> MessageRecord:
+        record = role_or_record if isinstance(role_or_record, MessageRecord) else MessageRecord.create(role_or_record, content)
+        # Prompt yang ragu (mis. "tempo 90") mengikuti bahasa prompt sebelumnya (sebelum record disimpan)
+        if record.role == "user" and self.last_user_record is not None and (record.language_confidence or 0.0) < LOW_CONFIDENCE:
+            record.language = self.last_user_record.language
+        self.records.append(record)
+        if self.first_role is None:
+            self.first_role = record.role
+        if record.role == "user":
+            self.turn_starts.append(len(self.records) - 1)
+            self.asked_prompts.add(normalize_text(record.content))
+            self.last_user_record = record
+        elif record.role == "assistant":
+            self.assistant_count += 1
+            if record.has_chord_sheet:
+                self.has_chord_sheet = True
+                self.last_chord_record = record
+        return record
+
+    @classmethod
+    def restore(
+        cls,
+        records,
+        turn_starts: List[int],
+        asked_prompts: Set[str],
+        assistant_count: int,
+        first_role: Optional[str] = None,
+        last_chord_record: Optional[MessageRecord] = None,
+        last_user_record: Optional[MessageRecord] = None,
+    ) -> "ConversationLog":
+        """Membangun ulang log dari penghitung yang tersimpan (mis. sesi yang dilanjutkan dari disk)."""
+        log = cls(records)
+        log.turn_starts = turn_starts
+        log.asked_prompts = asked_prompts
+        log.assistant_count = assistant_count
+        log.first_role = first_role
+        log.has_chord_sheet = last_chord_record is not None
+        log.last_chord_record = last_chord_record
+        log.last_user_record = last_user_record
+        return log
+
+    @property
+    def clean_history(self) -> CleanHistory:
+        return CleanHistory(self.records)
+
+    def fork(self) -> "ConversationLog":
+        """Salinan dangkal (record dipakai bersama) untuk giliran spekulatif; state jendela konteks ikut disalin."""
+        fork = ConversationLog.restore(
+            self.records.copy(), list(self.turn_starts), set(self.asked_prompts), self.assistant_count,
+            self.first_role, self.last_chord_record, self.last_user_record,
+        )
+        if self.context_window is not None:
+            fork.context_window = self.context_window.copy()
+        return fork
+
+    def extend(self, messages: Iterable[Tuple[str, str]]) -> None:
+        """Menambahkan banyak pesan (role, konten) sekaligus; bahasa prompt pengguna dinilai dalam satu batch."""
+        messages = list(messages)
+        guesses = iter(identify_languages(clean_suggestion_footer(content) for role, content in messages if role == "user"))
+        for role, content in messages:
+            self.append(MessageRecord.create(role, content, next(guesses) if role == "user" else None))
+
+    @property
+    def substantive_assistant_count(self) -> int:
+        """Jumlah balasan asisten tanpa salam pembuka."""
+        if self.first_role == "assistant":
+            return max(0, self.assistant_count - 1)
+        return self.assistant_count
+
+    def history_window(self, full_turns: int, page_turns: int = 10) -> Tuple[List[HistoryPage], int]:
+        """Membagi riwayat untuk ditampilkan: halaman giliran lama (terlipat) dan indeks awal K giliran terakhir.
+
+        Halaman dihitung dari awal percakapan sehingga batasnya stabil saat percakapan bertambah;
+        hanya halaman terakhir yang bisa bertambah panjang.
+        """
+        older_turns = len(self.turn_starts) - full_turns
+        if full_turns <= 0 or older_turns <= 0:
+            return [], 0
+        visible_start = self.turn_starts[older_turns]
+        pages = []
+        for first in range(0, older_turns, page_turns):
+            last = min(first + page_turns, older_turns)
+            end = self.turn_starts[last] if last < older_turns else visible_start
+            pages.append(HistoryPage(self.turn_starts[first], end, first + 1, last))
+        return pages, visible_start
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[MessageRecord]:
+        return iter(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def __bool__(self) -> bool:
+        return bool(self.records)
@@ -0,0 +1,225 @@
+# metrics_tools.py
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Batas bucket histogram (detik), dipakai untuk semua durasi fase
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Jumlah trace terakhir yang disimpan untuk sidebar debug
+DEFAULT_RECENT_TRACES = 20
+# Counter yang selalu diekspor (0 jika belum pernah terjadi)
+TURN_COUNTERS = ("turns", "cache_hits", "local_edits", "fallbacks", "short_answers", "retries", "continuations", "hedges", "failures", "cancellations",
+                 "prefetch_hits", "prefetch_misses", "prefetch_jobs", "prefetch_tokens", "prefetch_wasted_tokens")
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _NullTrace:
+    """Trace kosong saat metrik nonaktif: semua operasi no-op tanpa alokasi."""
+
+    __slots__ = ()
+    trace_id = None
+    enabled = False
+
+    def span(self, name: str) -> _NullSpan:
+        return _NULL_SPAN
+
+    def add_span(self, name: str, seconds: Optional[float]) -> None:
+        pass
+
+    def incr(self, counter: str, amount: int = 1) -> None:
+        pass
+
+    def set(self, key: str, value) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+NULL_TRACE = _NullTrace()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: "Trace", name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add_span(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Trace:
+    """Pengukuran satu rerun/giliran: durasi per fase (span), counter dan atribut, dengan trace ID."""
+
+    __slots__ = ("recorder", "trace_id", "started", "spans", "counters", "attributes", "_finished")
+    enabled = True
+
+    def __init__(self, recorder: "MetricsRecorder", trace_id: Optional[str] = None):
+        self.recorder = recorder
+        self.trace_id = trace_id or uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.spans: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.attributes: Dict[str, object] = {}
+        self._finished = False
+
+    def span(self, name: str) -> _Span:
+        """Context manager yang mencatat durasi blok sebagai fase `name` (diakumulasi jika berulang)."""
+        return _Span(self, name)
+
+    def add_span(self, name: str, seconds: Optional[float]) -> None:
+        if seconds is not None:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def incr(self, counter: str, amount: int = 1) -> None:
+        if amount:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def finish(self) -> None:
+        """Mengirim trace ke recorder (sekali; panggilan berikutnya diabaikan)."""
+        if not self._finished:
+            self._finished = True
+            self.recorder.record(self)
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "ts": round(self.started, 3),
+            "spans": {name: round(seconds, 6) for name, seconds in self.spans.items()},
+            "counters": dict(self.counters),
+            **self.attributes,
+        }
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.total += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class MetricsRecorder:
+    """Agregasi metrik per proses: counter, histogram durasi fase dan trace terakhir.
+
+    - `jsonl_path`: satu baris JSON per trace (trace ID, span, counter, atribut);
+    - `prometheus_path`: file teks format Prometheus yang ditulis ulang (atomik) setelah setiap trace;
+    - `keep_recent`: jumlah trace terakhir yang disimpan di memori (sidebar debug).
+
+    Jika tidak ada yang diaktifkan, `start_trace()` mengembalikan `NULL_TRACE` sehingga instrumentasi
+    di jalur panas hanya berupa panggilan no-op.
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None, prometheus_path: Optional[str] = None, keep_recent: int = 0, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.buckets = buckets
+        self.enabled = bool(jsonl_path or prometheus_path or keep_recent)
+        self.recent: Deque[dict] = deque(maxlen=keep_recent or DEFAULT_RECENT_TRACES)
+        self.counters: Dict[str, int] = dict.fromkeys(TURN_COUNTERS, 0)
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def start_trace(self, trace_id: Optional[str] = None):
+        return Trace(self, trace_id) if self.enabled else NULL_TRACE
+
+    def record(self, trace: Trace) -> None:
+        entry = trace.as_dict()
+        with self._lock:
+            for name, amount in trace.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+            for name, seconds in trace.spans.items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram(self.buckets)
+                histogram.observe(seconds)
+            self.recent.append(entry)
+            try:
+                if self.jsonl_path:
+                    with open(self.jsonl_path, "a", encoding="utf-8") as handle:
+                        handle.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+                if self.prometheus_path:
+                    self._write_prometheus()
+            except OSError as e:
+                logging.error(f"Error writing metrics: {e}")
+
+    def recent_traces(self, limit: Optional[int] = None) -> List[dict]:
+        with self._lock:
+            traces = list(self.recent)
+        return traces[-limit:] if limit else traces
+
+    def prometheus_text(self) -> str:
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE composer_{name}_total counter")
+            lines.append(f"composer_{name}_total {value}")
+        lines.append("# TYPE composer_phase_seconds histogram")
+        for phase, histogram in sorted(self.histograms.items()):
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f'composer_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {count}')
+            lines.append(f'composer_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {histogram.count}')
+            lines.append(f'composer_phase_seconds_sum{{phase="{phase}"}} {histogram.total:.6f}')
+            lines.append(f'composer_phase_seconds_count{{phase="{phase}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def _write_prometheus(self) -> None:
+        temp_path = f"{self.prometheus_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            handle.write(self.prometheus_text())
+        os.replace(temp_path, self.prometheus_path)
+
+
+_metrics: Optional[MetricsRecorder] = None
+_metrics_lock = threading.Lock()
+
+
+def configure_metrics(jsonl_path: Optional[str] = None, prometheus_path: Optional[str] = None, keep_recent: int = 0) -> MetricsRecorder:
+    """Mengganti recorder per proses (mis. dari secrets.toml atau argumen CLI)."""
+    global _metrics
+    with _metrics_lock:
+        _metrics = MetricsRecorder(jsonl_path, prometheus_path, keep_recent)
+        return _metrics
+
+
+def get_metrics() -> MetricsRecorder:
+    """Recorder bersama per proses; default dari env COMPOSER_METRICS_JSONL / COMPOSER_METRICS_PROM (nonaktif jika kosong)."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRecorder(os.environ.get("COMPOSER_METRICS_JSONL"), os.environ.get("COMPOSER_METRICS_PROM"))
+        return _metrics
@@ -0,0 +1,276 @@
+# prefetch_tools.py
+"""Prefetch spekulatif jawaban chip saran.
+
+Setelah chip ditampilkan, jawaban untuk chip teratas dihasilkan di latar belakang (pool worker
+berbatas) pada salinan percakapan. Jika pengguna mengklik chip tersebut, engine memutar ulang stream
+yang sudah dihitung (atau melanjutkan stream yang masih berjalan) alih-alih memulai panggilan LLM
+dingin. Pekerjaan dibatalkan saat pengguna mengetik prompt lain atau menekan "New Chat"; token yang
+dihasilkan tetapi tidak terpakai dicatat sebagai `prefetch_wasted_tokens`.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from cache_tools import normalize_text
+from context_tools import estimate_tokens
+from message_records import ConversationLog
+from metrics_tools import NULL_TRACE, get_metrics
+from resilience_tools import CANCEL_POLL_INTERVAL, CallOutcome, CancelToken, TurnCancelled
+
+
+class PrefetchPolicy:
+    """Batas prefetch spekulatif.
+
+    - `max_workers`: ukuran pool worker per proses (panggilan LLM spekulatif paralel);
+    - `chips_per_turn`: jumlah chip teratas yang di-prefetch setelah setiap jawaban;
+    - `session_token_budget`: total token (estimasi) yang boleh dihabiskan prefetch per percakapan;
+    - `max_pending`: batas pekerjaan antre + berjalan di seluruh proses.
+    """
+
+    __slots__ = ("max_workers", "chips_per_turn", "session_token_budget", "max_pending")
+
+    def __init__(self, max_workers: int = 2, chips_per_turn: int = 2, session_token_budget: int = 20_000, max_pending: int = 8):
+        self.max_workers = max_workers
+        self.chips_per_turn = chips_per_turn
+        self.session_token_budget = session_token_budget
+        self.max_pending = max_pending
+
+
+class PrefetchEntry:
+    """Satu jawaban spekulatif: event stream ("delta"/"reset") yang terkumpul, hasil pemanggilan dan status."""
+
+    def __init__(self, prompt: str, session: "PrefetchSession"):
+        self.prompt = prompt
+        self.session = session
+        self.events: List[Tuple[str, str]] = []
+        self.outcome: Optional[CallOutcome] = None
+        self.cancel_token = CancelToken()
+        self.future: Optional[Future] = None
+        self.tokens = 0
+        self.done = False
+        self.skipped = False
+        self.discarded = False
+        self._waste_recorded = False
+        self._condition = threading.Condition()
+
+    # --- Sisi worker ---
+
+    def push(self, kind: str, text: str) -> None:
+        with self._condition:
+            self.events.append((kind, text))
+            self._condition.notify_all()
+
+    def finish(self, outcome: Optional[CallOutcome], skipped: bool = False) -> bool:
+        """Menandai selesai. True jika entry sudah dibuang sebelumnya (token dihitung terbuang oleh worker)."""
+        with self._condition:
+            self.outcome = outcome
+            self.skipped = skipped
+            self.done = True
+            self._condition.notify_all()
+            if self.discarded and not self._waste_recorded:
+                self._waste_recorded = True
+                return True
+            return False
+
+    # --- Sisi konsumen ---
+
+    @property
+    def ok(self) -> bool:
+        return self.done and not self.skipped and self.outcome is not None and self.outcome.ok
+
+    def discard(self, reason: str, trace=NULL_TRACE) -> None:
+        """Membatalkan dan membuang entry. Token yang sudah dihasilkan dicatat terbuang tepat sekali."""
+        with self._condition:
+            if self.discarded:
+                return
+            self.discarded = True
+            record_now = self.done and not self._waste_recorded
+            if record_now:
+                self._waste_recorded = True
+        self.cancel_token.cancel(reason)
+        if self.future is not None:
+            self.future.cancel()
+        if record_now:
+            trace.incr("prefetch_wasted_tokens", self.tokens)
+
+    def wait(self, index: int, timeout: float) -> Tuple[List[Tuple[str, str]], bool]:
+        """Event mulai dari `index` (menunggu paling lama `timeout` jika belum ada) dan status selesai."""
+        with self._condition:
+            if index >= len(self.events) and not self.done:
+                self._condition.wait(timeout)
+            return self.events[index:], self.done
+
+    def follow(self, cancel_token: CancelToken) -> Iterator[Tuple[str, str]]:
+        """Memutar ulang event yang sudah ada lalu mengikuti stream yang masih berjalan hingga selesai."""
+        index = 0
+        while True:
+            if cancel_token.cancelled:
+                raise TurnCancelled(cancel_token.reason)
+            events, done = self.wait(index, CANCEL_POLL_INTERVAL)
+            index += len(events)
+            yield from events
+            if done and not events:
+                return
+
+
+class PrefetchSession:
+    """State prefetch satu percakapan (disimpan di `ConversationLog.prefetch`).
+
+    Anggaran token berlaku sepanjang percakapan; entry hanya berlaku untuk giliran tempat chip ditampilkan
+    (`base_len` = jumlah record saat dijadwalkan).
+    """
+
+    def __init__(self):
+        self.tokens_used = 0
+        self.base_len = -1
+        self.chips: Set[str] = set()
+        self.entries: Dict[str, PrefetchEntry] = {}
+        self.lock = threading.Lock()
+
+
+class SuggestionPrefetcher:
+    """Pool worker berbatas yang menghasilkan jawaban chip secara spekulatif lewat `ComposerEngine`."""
+
+    def __init__(self, engine, policy: Optional[PrefetchPolicy] = None):
+        self.engine = engine
+        self.policy = policy or PrefetchPolicy()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _submit(self, entry: PrefetchEntry, fork: ConversationLog) -> bool:
+        with self._lock:
+            if self._pending >= self.policy.max_pending:
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.policy.max_workers, thread_name_prefix="chip-prefetch")
+            self._pending += 1
+        entry.future = self._executor.submit(self._run, entry, fork)
+        entry.future.add_done_callback(self._release)
+        return True
+
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def schedule(self, conversation: ConversationLog, suggestions: List[str]) -> int:
+        """Menjadwalkan prefetch untuk chip teratas dari jawaban terakhir. Idempoten per giliran."""
+        session = conversation.prefetch
+        if session is None:
+            session = conversation.prefetch = PrefetchSession()
+        base_len = len(conversation.records)
+        with session.lock:
+            if session.base_len == base_len:
+                return 0
+            stale = list(session.entries.values())
+            session.base_len = base_len
+            session.chips = {normalize_text(text) for text in suggestions}
+            session.entries = {}
+        for entry in stale:
+            entry.discard("stale")
+
+        started = 0
+        for prompt in suggestions[:self.policy.chips_per_turn]:
+            if session.tokens_used >= self.policy.session_token_budget:
+                logging.info("Chip prefetch skipped: session token budget exhausted.")
+                break
+            entry = PrefetchEntry(prompt, session)
+            # Salinan percakapan: worker tidak pernah menyentuh log milik sesi
+            if not self._submit(entry, conversation.fork()):
+                break
+            with session.lock:
+                session.entries[normalize_text(prompt)] = entry
+            started += 1
+        return started
+
+    def take(self, conversation: ConversationLog, prompt: str, trace=NULL_TRACE) -> Optional[PrefetchEntry]:
+        """Mengambil entry untuk prompt yang baru diterima dan membuang semua entry lain giliran ini.
+
+        Dipanggil sebelum prompt ditambahkan ke percakapan. Entry hanya dipakai jika sudah selesai atau
+        sedang berjalan; entry yang masih antre dibatalkan dan giliran memakai panggilan agen biasa.
+        Klik chip tanpa entry yang dapat dipakai dihitung sebagai `prefetch_misses`.
+        """
+        session = conversation.prefetch
+        if session is None:
+            return None
+        normalized = normalize_text(prompt)
+        with session.lock:
+            entries, session.entries = session.entries, {}
+            is_chip = normalized in session.chips and session.base_len == len(conversation.records)
+            session.chips = set()
+        entry = entries.pop(normalized, None) if is_chip else None
+        for other in entries.values():
+            other.discard("not_selected", trace)
+        if entry is not None and entry.skipped:
+            # Chip dijawab dari cache/edit lokal: bukan miss
+            return None
+        if entry is not None and entry.discarded:
+            entry = None
+        if entry is not None and not entry.done and not entry.future.running():
+            # Masih antre di pool bersama di belakang pekerjaan spekulatif lain: panggilan langsung lebih cepat
+            entry.discard("not_started", trace)
+            entry = None
+        if is_chip and entry is None:
+            trace.incr("prefetch_misses")
+        return entry
+
+    def cancel(self, conversation: ConversationLog, reason: str, trace=NULL_TRACE) -> None:
+        """Membatalkan semua prefetch percakapan (mis. "New Chat")."""
+        session = conversation.prefetch
+        if session is None:
+            return
+        with session.lock:
+            entries, session.entries = session.entries, {}
+            session.chips = set()
+        for entry in entries.values():
+            entry.discard(reason, trace)
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, entry: PrefetchEntry, fork: ConversationLog) -> None:
+        session = entry.session
+        outcome, skipped = None, False
+        try:
+            if entry.cancel_token.cancelled:
+                return
+            turn = self.engine.prepare_turn(fork, entry.prompt, trace=NULL_TRACE, speculative=True)
+            # Jawaban dari cache atau edit lokal sudah instan: tidak perlu panggilan spekulatif
+            if turn.cached_answer is not None or turn.local_answer is not None:
+                skipped = True
+                return
+            outcome = CallOutcome(turn.turn_id)
+            for kind, text in self.engine.caller.stream(turn.messages, turn.language, entry.cancel_token, outcome):
+                entry.push(kind, text)
+                if kind == "delta":
+                    tokens = estimate_tokens(text)
+                    entry.tokens += tokens
+                    with session.lock:
+                        session.tokens_used += tokens
+                        over_budget = session.tokens_used >= self.policy.session_token_budget
+                    if over_budget:
+                        entry.cancel_token.cancel("budget")
+        except TurnCancelled:
+            pass
+        except Exception as e:
+            logging.error(f"Chip prefetch failed: {e}")
+        finally:
+            wasted = entry.finish(outcome, skipped)
+            trace = get_metrics().start_trace()
+            trace.incr("prefetch_jobs")
+            trace.incr("prefetch_tokens", entry.tokens)
+            if wasted:
+                trace.incr("prefetch_wasted_tokens", entry.tokens)
+            if skipped:
+                status = "skipped"
+            elif outcome is not None:
+                status = outcome.status
+            else:
+                status = "cancelled" if entry.cancel_token.cancelled else "error"
+            trace.set("status", status)
+            trace.finish()
@@ -0,0 +1,313 @@
+# resilience_tools.py
+
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Callable, Iterator, Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+# Instruksi lanjutan: model meneruskan jawaban parsial alih-alih mengulang dari awal
+CONTINUATION_PROMPTS = {
+    "indonesian": "Jawaban Anda sebelumnya terputus. Lanjutkan TEPAT dari kata terakhir di atas, tanpa mengulang teks yang sudah ada dan tanpa pembuka.",
+    "english": "Your previous answer was cut off. Continue EXACTLY from the last word above, without repeating any existing text and without any preamble.",
+}
+
+# Interval polling token pembatalan saat menunggu chunk berikutnya
+CANCEL_POLL_INTERVAL = 0.25
+
+
+class TurnCancelled(Exception):
+    """Giliran dibatalkan (New Chat atau prompt baru saat streaming)."""
+
+
+class TurnDeadlineExceeded(Exception):
+    """Batas waktu total giliran terlampaui."""
+
+
+class StreamStalled(Exception):
+    """Token pertama atau token berikutnya tidak datang dalam batas waktu."""
+
+
+class ShortAnswer(Exception):
+    """Stream selesai tetapi jawabannya terlalu pendek untuk dianggap valid."""
+
+
+class CallPolicy:
+    """Kebijakan pemanggilan agen: deadline, timeout stream, retry dengan backoff dan hedging opsional."""
+
+    __slots__ = ("turn_deadline", "first_token_timeout", "idle_timeout", "max_retries", "backoff_base", "backoff_max", "hedge_after", "min_answer_length")
+
+    def __init__(
+        self,
+        turn_deadline: float = 120.0,
+        first_token_timeout: float = 45.0,
+        idle_timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        hedge_after: Optional[float] = None,
+        min_answer_length: int = 50,
+    ):
+        self.turn_deadline = turn_deadline
+        self.first_token_timeout = first_token_timeout
+        self.idle_timeout = idle_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.min_answer_length = min_answer_length
+
+    def backoff(self, retry: int) -> float:
+        """Exponential backoff dengan full jitter."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** retry)))
+
+
+class CancelToken:
+    """Token pembatalan lintas thread (mis. disimpan di session_state dan dibatalkan oleh rerun berikutnya)."""
+
+    __slots__ = ("_event", "reason")
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+class CallOutcome:
+    """Ringkasan hasil pemanggilan (diisi selama streaming, dibaca setelah selesai)."""
+
+    __slots__ = ("turn_id", "status", "attempts", "continuations", "short_answers", "hedged", "error", "answer")
+
+    def __init__(self, turn_id: str):
+        self.turn_id = turn_id
+        self.status = "pending"
+        self.attempts = 0
+        self.continuations = 0
+        self.short_answers = 0
+        self.hedged = False
+        self.error: Optional[str] = None
+        self.answer = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+
+def log_event(event: str, **fields) -> None:
+    """Event terstruktur (satu baris JSON) ke log aplikasi."""
+    logging.info(json.dumps({"event": event, "ts": round(time.time(), 3), **fields}, ensure_ascii=False, default=str))
+
+
+def continuation_messages(messages: list, partial: str, language: str) -> list:
+    """Riwayat + jawaban parsial + instruksi untuk melanjutkan."""
+    prompt = CONTINUATION_PROMPTS.get(language, CONTINUATION_PROMPTS["english"])
+    return [*messages, AIMessage(content=partial), HumanMessage(content=prompt)]
+
+
+class _BackgroundLoop:
+    """Event loop asyncio di thread daemon, dipakai jalur sinkron untuk menjalankan pemanggilan async."""
+
+    _instance: Optional["_BackgroundLoop"] = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="resilient-agent-loop", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def get(cls) -> "_BackgroundLoop":
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+
+class ResilientAgentCaller:
+    """Lapisan pemanggilan agen yang tahan gangguan.
+
+    - deadline per giliran, serta timeout token pertama dan jeda antar token;
+    - pembatalan lewat `CancelToken`;
+    - retry terbatas dengan backoff. Jika sudah ada jawaban parsial, retry berupa *continuation*
+      (model melanjutkan dari teks parsial) sehingga teks yang sudah tampil tidak dibuang;
+    - hedging opsional: permintaan kedua dimulai jika token pertama belum datang setelah
+      `hedge_after` detik, dan permintaan yang lebih dulu menghasilkan token yang dipakai.
+
+    Item yang dihasilkan adalah (kind, text): 'delta' untuk potongan teks, 'reset' jika teks yang
+    sudah ditampilkan harus dibuang (retry penuh setelah jawaban pendek).
+    """
+
+    def __init__(self, agent_getter: Callable[[], object], text_of: Callable[[object], str], policy: Optional[CallPolicy] = None):
+        self.agent_getter = agent_getter
+        self.text_of = text_of
+        self.policy = policy or CallPolicy()
+
+    async def _pump(self, index: int, messages: list, queue: "asyncio.Queue") -> None:
+        try:
+            async for item in self.agent_getter().astream({"messages": messages}, stream_mode="messages"):
+                text = self.text_of(item)
+                if text:
+                    await queue.put((index, "delta", text))
+            await queue.put((index, "end", None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put((index, "error", e))
+
+    async def _attempt(self, messages: list, deadline: float, cancel_token: CancelToken, outcome: CallOutcome, allow_hedge: bool) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        policy = self.policy
+        queue: "asyncio.Queue" = asyncio.Queue()
+        started = loop.time()
+        tasks = {0: asyncio.ensure_future(self._pump(0, messages, queue))}
+        alive = {0}
+        winner: Optional[int] = None
+        hedged = False
+        first_token_deadline = started + policy.first_token_timeout
+        idle_deadline = None
+        hedge_at = started + policy.hedge_after if (allow_hedge and policy.hedge_after) else None
+        try:
+            while True:
+                if cancel_token.cancelled:
+                    raise TurnCancelled(cancel_token.reason)
+                now = loop.time()
+                waits = [deadline - now, CANCEL_POLL_INTERVAL]
+                waits.append((first_token_deadline if winner is None else idle_deadline) - now)
+                if hedge_at is not None and not hedged and winner is None:
+                    waits.append(hedge_at - now)
+                try:
+                    index, kind, payload = await asyncio.wait_for(queue.get(), max(0.0, min(waits)))
+                except asyncio.TimeoutError:
+                    now = loop.time()
+                    if now >= deadline:
+                        raise TurnDeadlineExceeded(f"turn deadline of {policy.turn_deadline}s exceeded")
+                    if winner is None and now >= first_token_deadline:
+                        raise StreamStalled(f"no first token after {policy.first_token_timeout}s")
+                    if winner is not None and now >= idle_deadline:
+                        raise StreamStalled(f"no token for {policy.idle_timeout}s")
+                    if hedge_at is not None and not hedged and winner is None and now >= hedge_at:
+                        hedged = outcome.hedged = True
+                        tasks[1] = asyncio.ensure_future(self._pump(1, messages, queue))
+                        alive.add(1)
+                        log_event("hedge_started", turn_id=outcome.turn_id, after_s=round(now - started, 3))
+                    continue
+
+                if winner is not None and index != winner:
+                    continue
+                if kind == "delta":
+                    if winner is None:
+                        winner = index
+                        for other, task in tasks.items():
+                            if other != index:
+                                task.cancel()
+                        if hedged:
+                            log_event("hedge_won", turn_id=outcome.turn_id, winner="hedge" if index else "primary")
+                    idle_deadline = loop.time() + policy.idle_timeout
+                    yield payload
+                    continue
+
+                alive.discard(index)
+                if winner is None and alive:
+                    # Permintaan lain (hedge) masih berjalan: tunggu hasilnya
+                    continue
+                if kind == "error":
+                    raise payload
+                return
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    async def astream(self, messages: list, language: str, cancel_token: Optional[CancelToken] = None, outcome: Optional[CallOutcome] = None) -> AsyncIterator[Tuple[str, str]]:
+        policy = self.policy
+        cancel_token = cancel_token or CancelToken()
+        outcome = outcome or CallOutcome(uuid.uuid4().hex[:12])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + policy.turn_deadline
+        answer = ""
+        retry = 0
+        try:
+            while True:
+                partial = answer.strip()
+                is_continuation = len(partial) > 0
+                attempt_messages = continuation_messages(messages, partial, language) if is_continuation else messages
+                outcome.attempts += 1
+                outcome.continuations += is_continuation
+                log_event("attempt_started", turn_id=outcome.turn_id, attempt=outcome.attempts, continuation=is_continuation, partial_chars=len(partial))
+                try:
+                    async for delta in self._attempt(attempt_messages, deadline, cancel_token, outcome, allow_hedge=outcome.attempts == 1):
+                        answer += delta
+                        yield ("delta", delta)
+                    if len(answer.strip()) >= policy.min_answer_length:
+                        outcome.status = "ok"
+                        return
+                    raise ShortAnswer(f"answer too short ({len(answer.strip())} chars)")
+                except TurnCancelled:
+                    raise
+                except Exception as e:
+                    outcome.error = f"{type(e).__name__}: {e}"
+                    log_event("attempt_failed", turn_id=outcome.turn_id, attempt=outcome.attempts, error=outcome.error, answer_chars=len(answer))
+                    if isinstance(e, TurnDeadlineExceeded):
+                        outcome.status = "deadline"
+                        return
+                    outcome.short_answers += isinstance(e, ShortAnswer)
+                    if isinstance(e, ShortAnswer) and answer:
+                        # Jawaban pendek yang selesai tidak bisa dilanjutkan: mulai ulang dari awal
+                        answer = ""
+                        yield ("reset", "")
+
+                if retry >= policy.max_retries:
+                    outcome.status = "exhausted"
+                    return
+                delay = min(policy.backoff(retry), max(0.0, deadline - loop.time()))
+                retry += 1
+                log_event("retry_scheduled", turn_id=outcome.turn_id, retry=retry, backoff_s=round(delay, 3))
+                # Backoff yang tetap responsif terhadap pembatalan
+                wake = loop.time() + delay
+                while loop.time() < wake:
+                    if cancel_token.cancelled:
+                        raise TurnCancelled(cancel_token.reason)
+                    await asyncio.sleep(min(CANCEL_POLL_INTERVAL, max(0.0, wake - loop.time())))
+        except TurnCancelled:
+            outcome.status = "cancelled"
+            raise
+        except GeneratorExit:
+            # Konsumen menutup stream (mis. rerun Streamlit) sebelum selesai
+            outcome.status = "closed"
+            raise
+        finally:
+            outcome.answer = answer.strip() if outcome.status == "ok" else answer
+            log_event(
+                "turn_call_finished", turn_id=outcome.turn_id, status=outcome.status, attempts=outcome.attempts,
+                continuations=outcome.continuations, hedged=outcome.hedged, error=outcome.error, answer_chars=len(answer),
+            )
+
+    def stream(self, messages: list, language: str, cancel_token: Optional[CancelToken] = None, outcome: Optional[CallOutcome] = None) -> Iterator[Tuple[str, str]]:
+        """Versi sinkron: menjalankan `astream` di event loop latar belakang dan meneruskan itemnya."""
+        background = _BackgroundLoop.get()
+        agen = self.astream(messages, language, cancel_token, outcome)
+        try:
+            while True:
+                future = asyncio.run_coroutine_threadsafe(agen.__anext__(), background.loop)
+                try:
+                    yield future.result()
+                except StopAsyncIteration:
+                    return
+        finally:
+            # Konsumen berhenti (mis. rerun Streamlit): tutup stream agar request HTTP ikut dibatalkan
+            try:
+                asyncio.run_coroutine_threadsafe(agen.aclose(), background.loop).result(timeout=5)
+            except Exception:
+                pass
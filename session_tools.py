@@ -0,0 +1,423 @@
+# session_tools.py
+"""Penyimpanan sesi percakapan di SQLite dengan batas memori global.
+
+Setiap pesan ditulis langsung (write-through; sesi baru sejak prompt pengguna pertama) ke `sessions.db` di folder yang sama dengan
+suggestion_history.db, sehingga percakapan dapat dilanjutkan lewat ID setelah proses restart.
+Di memori hanya `resident_turns` giliran terakhir per sesi yang disimpan; giliran lama dibaca ulang
+dari disk saat dibutuhkan (halaman riwayat yang dibuka, ringkasan jendela konteks setelah resume).
+Jika total memori sesi melewati `memory_cap_bytes`, sesi yang menganggur paling lama (LRU)
+dikeluarkan dari memori seluruhnya.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
+
+from cache_tools import normalize_text, response_cache_memory_bytes
+from database_tools import CODEC_TEXT, CODEC_ZLIB, DB_PATH, clean_suggestion_footer, decode_response, encode_response
+from formatting_tools import FORMATTED_CACHE
+from message_records import ConversationLog, MessageRecord
+
+SESSION_DB_PATH = os.path.join(os.path.dirname(DB_PATH), "sessions.db")
+
+# ID sesi dari URL (?session=...) hanya diterima jika berbentuk uuid4 hex
+SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Jumlah record per query saat iterasi bagian riwayat yang ada di disk
+PAGE_ROWS = 50
+# Record yang baru dibaca dari disk lewat indeks tunggal (mis. chord sheet yang dipin jendela konteks)
+RECENT_PAGED_RECORDS = 4
+
+SESSION_SCHEMA_VERSION = 1
+SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now')),
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS session_messages (
+    message_id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content BLOB NOT NULL,
+    codec INTEGER NOT NULL DEFAULT 0,
+    language TEXT,
+    language_confidence REAL,
+    has_chord_sheet INTEGER NOT NULL DEFAULT 0,
+    chord_key TEXT,
+    tempo TEXT,
+    prompt_key TEXT,
+    UNIQUE (session_id, seq)
+);
+"""
+
+INSERT_MESSAGE_QUERY = """
+INSERT INTO session_messages
+    (session_id, seq, role, content, codec, language, language_confidence, has_chord_sheet, chord_key, tempo, prompt_key)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+TOUCH_SESSION_QUERY = """
+INSERT INTO sessions (session_id, message_count) VALUES (?, ?)
+ON CONFLICT(session_id) DO UPDATE SET message_count = excluded.message_count,
+    updated_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+"""
+SELECT_RANGE_QUERY = """
+SELECT role, content, codec, language, language_confidence, has_chord_sheet, chord_key, tempo
+FROM session_messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq
+"""
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def record_bytes(record: MessageRecord) -> int:
+    """Perkiraan memori satu record: konten mentah, konten bersih dan markdown terformat (≈ konten bersih)."""
+    size = sys.getsizeof(record.content)
+    if record.clean_content is not record.content:
+        size += sys.getsizeof(record.clean_content)
+    return size + sys.getsizeof(record.clean_content)
+
+
+def _row_to_record(row) -> MessageRecord:
+    role, value, codec, language, confidence, has_chord_sheet, key, tempo = row
+    content = decode_response(value, codec)
+    return MessageRecord(
+        role, content, clean_suggestion_footer(content),
+        language=language, has_chord_sheet=bool(has_chord_sheet), key=key, tempo=tempo, language_confidence=confidence,
+    )
+
+
+class PagedRecords:
+    """Record satu sesi: indeks [0, spilled) ada di disk, sisanya (`resident`) di memori.
+
+    Dipakai sebagai `ConversationLog.records`. `append` menulis record ke SQLite lalu, pada awal
+    setiap giliran baru, memindahkan giliran di luar `resident_turns` terakhir ke disk. Salinan dari
+    `copy()` (fork percakapan untuk prefetch) terlepas: append-nya tidak disimpan.
+    """
+
+    def __init__(self, store: "SessionStore", session_id: str, spilled: int = 0, resident: Optional[List[MessageRecord]] = None, persist: bool = True):
+        self.store = store
+        self.session_id = session_id
+        self.spilled = spilled
+        self.resident: List[MessageRecord] = resident if resident is not None else []
+        self.persist = persist
+        # Jumlah record yang sudah ada di disk (record yang dimuat dari disk sudah tersimpan)
+        self.saved = len(self) if persist else 0
+        self.resident_bytes = sum(record_bytes(record) for record in self.resident)
+        self._recent: "OrderedDict[int, MessageRecord]" = OrderedDict()
+
+    # --- Sequence ---
+
+    def __len__(self) -> int:
+        return self.spilled + len(self.resident)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if stop <= start:
+                return []
+            spilled = self.spilled
+            records = self.store.load_range(self.session_id, start, min(stop, spilled)) if start < spilled else []
+            if stop > spilled:
+                records += self.resident[max(start, spilled) - spilled:stop - spilled]
+            return records
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("record index out of range")
+        if index >= self.spilled:
+            return self.resident[index - self.spilled]
+        record = self._recent.get(index)
+        if record is None:
+            record = self.store.load_range(self.session_id, index, index + 1)[0]
+            self._recent[index] = record
+            if len(self._recent) > RECENT_PAGED_RECORDS:
+                self._recent.popitem(last=False)
+        else:
+            self._recent.move_to_end(index)
+        return record
+
+    def __iter__(self) -> Iterator[MessageRecord]:
+        spilled, resident = self.spilled, list(self.resident)
+        for start in range(0, spilled, PAGE_ROWS):
+            yield from self.store.load_range(self.session_id, start, min(start + PAGE_ROWS, spilled))
+        yield from resident
+
+    # --- Mutasi ---
+
+    def append(self, record: MessageRecord) -> None:
+        if not self.persist:
+            self.resident.append(record)
+            self.resident_bytes += record_bytes(record)
+            return
+        # Lock store: dua tab dengan ?session= yang sama berbagi objek ini, seq harus dialokasikan berurutan
+        with self.store._lock:
+            self.resident.append(record)
+            self.resident_bytes += record_bytes(record)
+            # Sesi baru baru disimpan sejak prompt pengguna pertama: kunjungan yang hanya melihat salam
+            # pembuka tidak membuat baris di disk
+            if self.saved or record.role == "user":
+                self.store.save_records(self.session_id, self.saved, self.resident[self.saved - self.spilled:])
+                self.saved = len(self)
+        self.store.after_append(self, record)
+
+    def copy(self) -> "PagedRecords":
+        return PagedRecords(self.store, self.session_id, self.spilled, list(self.resident), persist=False)
+
+    def spill_turns(self, keep_turns: int) -> int:
+        """Memindahkan giliran di luar `keep_turns` terakhir ke disk. Mengembalikan byte yang dibebaskan."""
+        user_indices = [i for i, record in enumerate(self.resident) if record.role == "user"]
+        if len(user_indices) <= keep_turns:
+            return 0
+        cut = user_indices[-keep_turns] if keep_turns > 0 else len(self.resident)
+        return self._spill(cut)
+
+    def release(self) -> int:
+        """Memindahkan seluruh record ke disk (sesi dikeluarkan dari memori)."""
+        self._recent.clear()
+        return self._spill(len(self.resident))
+
+    def _spill(self, count: int) -> int:
+        # Record yang belum tersimpan (salam pembuka sesi baru) tetap di memori
+        count = min(count, self.saved - self.spilled)
+        freed = sum(record_bytes(record) for record in self.resident[:count])
+        self.resident = self.resident[count:]
+        self.spilled += count
+        self.resident_bytes -= freed
+        return freed
+
+
+class _SessionEntry:
+    __slots__ = ("conversation", "records", "last_used")
+
+    def __init__(self, conversation: ConversationLog, records: PagedRecords):
+        self.conversation = conversation
+        self.records = records
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    """Sesi percakapan aktif per proses dengan batas memori global dan penyimpanan SQLite.
+
+    - `resident_turns`: giliran terakhir per sesi yang tetap di memori;
+    - `memory_cap_bytes`: batas perkiraan memori record seluruh sesi; sesi yang menganggur paling lama dikeluarkan.
+      Cache bersama per proses (markdown terformat, lapisan memori cache respons) tidak termasuk: masing-masing
+      punya batas byte sendiri dan ukurannya dilaporkan di `stats()`;
+    - `idle_seconds`: sesi yang dipakai dalam rentang ini (mis. giliran yang masih streaming) tidak dikeluarkan.
+    """
+
+    def __init__(
+        self,
+        db_path: str = SESSION_DB_PATH,
+        resident_turns: int = 10,
+        memory_cap_bytes: int = 256 * 1024 * 1024,
+        idle_seconds: float = 300.0,
+        compress: bool = True,
+    ):
+        self.db_path = db_path
+        self.resident_turns = resident_turns
+        self.memory_cap_bytes = memory_cap_bytes
+        self.idle_seconds = idle_seconds
+        self.codec = CODEC_ZLIB if compress else CODEC_TEXT
+        self._sessions: "OrderedDict[str, _SessionEntry]" = OrderedDict()
+        self._resident_bytes = 0
+        self._lock = threading.RLock()
+        self._db_lock = threading.Lock()
+        self._conn = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SESSION_SCHEMA_VERSION:
+            conn.executescript("BEGIN;" + SESSION_SCHEMA + f"PRAGMA user_version = {SESSION_SCHEMA_VERSION}; COMMIT;")
+        return conn
+
+    # --- API sesi ---
+
+    def resolve(self, session_id: Optional[str]) -> str:
+        """ID sesi dari URL jika valid, atau ID baru (sesi baru ditulis ke disk sejak prompt pengguna pertama)."""
+        if session_id and SESSION_ID_RE.match(session_id):
+            return session_id
+        return new_session_id()
+
+    def open(self, session_id: str) -> ConversationLog:
+        """Percakapan untuk ID ini: dari memori, dilanjutkan dari disk, atau baru jika belum ada."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = self._load(session_id)
+                self._sessions[session_id] = entry
+                self._resident_bytes += entry.records.resident_bytes
+            self._sessions.move_to_end(session_id)
+            entry.last_used = time.monotonic()
+        self._enforce_cap(session_id)
+        return entry.conversation
+
+    def evict(self, session_id: str) -> bool:
+        """Mengeluarkan sesi dari memori (data tetap di disk dan dapat dilanjutkan lewat `open`)."""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is None:
+                return False
+            self._resident_bytes -= entry.records.resident_bytes
+        entry.records.release()
+        entry.conversation.context_window = None
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = {"sessions": len(self._sessions), "resident_bytes": self._resident_bytes, "memory_cap_bytes": self.memory_cap_bytes}
+        stats["formatted_cache_bytes"] = FORMATTED_CACHE.memory_bytes
+        stats["response_cache_bytes"] = response_cache_memory_bytes()
+        return stats
+
+    def close(self) -> None:
+        with self._db_lock:
+            self._conn.close()
+
+    # --- Dipanggil oleh PagedRecords ---
+
+    def save_records(self, session_id: str, seq: int, records: List[MessageRecord]) -> None:
+        """Menulis `records` mulai dari `seq` dalam satu transaksi.
+
+        Jika seq sudah terpakai (objek sesi lama yang sudah dikeluarkan masih menulis bersamaan dengan
+        sesi yang dimuat ulang), record ditulis di akhir sesi agar tidak hilang dari disk.
+        """
+        rows = []
+        for record in records:
+            value, codec = encode_response(record.content, self.codec)
+            prompt_key = normalize_text(record.content) if record.role == "user" else None
+            rows.append((record.role, value, codec, record.language, record.language_confidence, int(record.has_chord_sheet), record.key, record.tempo, prompt_key))
+        try:
+            with self._db_lock:
+                try:
+                    with self._conn:
+                        self._insert_rows(session_id, seq, rows)
+                except sqlite3.IntegrityError:
+                    with self._conn:
+                        next_seq = self._conn.execute(
+                            "SELECT COALESCE(MAX(seq) + 1, 0) FROM session_messages WHERE session_id = ?", (session_id,)
+                        ).fetchone()[0]
+                        logging.error(f"Session {session_id}: seq {seq} already taken, messages stored from seq {next_seq}.")
+                        self._insert_rows(session_id, next_seq, rows)
+        except sqlite3.Error as e:
+            logging.error(f"Error saving messages {seq}..{seq + len(rows) - 1} of session {session_id}: {e}")
+
+    def _insert_rows(self, session_id: str, seq: int, rows: list) -> None:
+        self._conn.executemany(INSERT_MESSAGE_QUERY, [(session_id, seq + i, *row) for i, row in enumerate(rows)])
+        self._conn.execute(TOUCH_SESSION_QUERY, (session_id, seq + len(rows)))
+
+    def load_range(self, session_id: str, start: int, stop: int) -> List[MessageRecord]:
+        if stop <= start:
+            return []
+        with self._db_lock:
+            rows = self._conn.execute(SELECT_RANGE_QUERY, (session_id, start, stop)).fetchall()
+        return [_row_to_record(row) for row in rows]
+
+    def after_append(self, records: PagedRecords, record: MessageRecord) -> None:
+        """Akuntansi memori setelah append; awal giliran baru memindahkan giliran lama ke disk."""
+        freed = records.spill_turns(self.resident_turns) if record.role == "user" else 0
+        with self._lock:
+            entry = self._sessions.get(records.session_id)
+            if entry is None or entry.records is not records:
+                # Sesi sudah dikeluarkan: record lama yang masih dipegang pemanggil tidak ditahan di memori
+                records.release()
+                return
+            self._resident_bytes += record_bytes(record) - freed
+            entry.last_used = time.monotonic()
+            self._sessions.move_to_end(records.session_id)
+        self._enforce_cap(records.session_id)
+
+    # --- Internal ---
+
+    def _load(self, session_id: str) -> _SessionEntry:
+        """Melanjutkan sesi dari disk: penghitung dari kolom metadata, hanya giliran terakhir yang dibaca penuh."""
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT role, prompt_key, has_chord_sheet FROM session_messages WHERE session_id = ? ORDER BY seq",
+                (session_id,),
+            ).fetchall()
+        turn_starts, asked_prompts = [], set()
+        assistant_count, last_chord, last_user = 0, None, None
+        for index, (role, prompt_key, has_chord_sheet) in enumerate(rows):
+            if role == "user":
+                turn_starts.append(index)
+                asked_prompts.add(prompt_key)
+                last_user = index
+            elif role == "assistant":
+                assistant_count += 1
+                if has_chord_sheet:
+                    last_chord = index
+
+        total = len(rows)
+        resident_start = turn_starts[-self.resident_turns] if self.resident_turns > 0 and len(turn_starts) > self.resident_turns else 0
+        records = PagedRecords(self, session_id, resident_start, self.load_range(session_id, resident_start, total))
+
+        def record_at(index: Optional[int]) -> Optional[MessageRecord]:
+            return None if index is None else records[index]
+
+        conversation = ConversationLog.restore(
+            records, turn_starts, asked_prompts, assistant_count,
+            first_role=rows[0][0] if rows else None,
+            last_chord_record=record_at(last_chord),
+            last_user_record=record_at(last_user),
+        )
+        if total:
+            logging.info(f"Session {session_id} resumed: {total} messages ({total - resident_start} in memory).")
+        return _SessionEntry(conversation, records)
+
+    def _enforce_cap(self, current_id: str) -> None:
+        """Mengeluarkan sesi menganggur (LRU) selama total memori melewati batas."""
+        while True:
+            with self._lock:
+                if self._resident_bytes <= self.memory_cap_bytes:
+                    return
+                now = time.monotonic()
+                victim = next(
+                    (sid for sid, entry in self._sessions.items() if sid != current_id and now - entry.last_used >= self.idle_seconds),
+                    None,
+                )
+            if victim is None:
+                logging.info(f"Session memory over cap ({self._resident_bytes / 1e6:.1f} MB) but no idle session to evict.")
+                return
+            logging.info(f"Evicting idle session {victim} (session memory {self._resident_bytes / 1e6:.1f} MB).")
+            self.evict(victim)
+
+
+_session_store: Optional[SessionStore] = None
+_session_store_lock = threading.Lock()
+
+
+def configure_session_store(**kwargs) -> SessionStore:
+    """Mengganti store per proses (mis. dari secrets.toml)."""
+    global _session_store
+    with _session_store_lock:
+        if _session_store is not None:
+            _session_store.close()
+        _session_store = SessionStore(**kwargs)
+        return _session_store
+
+
+def get_session_store() -> SessionStore:
+    """Store bersama per proses; path dari env SESSION_DB_PATH (default sessions.db di samping suggestion_history.db)."""
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = SessionStore(os.environ.get("SESSION_DB_PATH") or SESSION_DB_PATH)
+        return _session_store
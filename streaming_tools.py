@@ -0,0 +1,117 @@
+# streaming_tools.py
+
+import time
+from typing import Callable, List, Optional
+
+from formatting_tools import format_assistant_response
+
+STREAM_CURSOR = "▌"
+DEFAULT_FRAME_BUDGET = 0.05  # detik; maksimal satu repaint setiap 50 ms
+
+
+def find_freeze_point(text: str) -> int:
+    """Mencari posisi potong terakhir yang aman untuk dibekukan di dalam `text`.
+
+    Posisi aman adalah akhir paragraf ("\\n\\n") di luar blok kode atau tepat setelah ``` penutup.
+    Pemindaian fence mengikuti regex `(```.*?```)` di formatter, sehingga
+    format(text[:p]) + format(text[p:]) == format(text) untuk setiap p yang dikembalikan.
+    Mengembalikan 0 jika belum ada bagian yang bisa dibekukan.
+    """
+    cut = 0
+    pos = 0
+    while True:
+        opener = text.find("```", pos)
+        plain_end = opener if opener != -1 else len(text)
+        paragraph_end = text.rfind("\n\n", pos, plain_end)
+        if paragraph_end != -1:
+            cut = paragraph_end + 2
+        if opener == -1:
+            return cut
+        closer = text.find("```", opener + 3)
+        if closer == -1:
+            # Blok kode masih terbuka: apa pun setelah pembuka belum final
+            return cut
+        pos = closer + 3
+        cut = pos
+
+
+class StreamingRenderer:
+    """Renderer streaming inkremental untuk jawaban agen.
+
+    Paragraf yang sudah selesai dan blok ``` yang sudah tertutup dibekukan: diformat sekali dan
+    ditulis ke elemen markdown sendiri yang tidak dikirim ulang. Hanya ekor yang belum final yang
+    diformat ulang, dan repaint dibatasi oleh `frame_budget` (bukan sekali per chunk).
+
+    `container` adalah placeholder bergaya Streamlit (`st.empty()`), yang menyediakan `.container()`.
+    """
+
+    def __init__(
+        self,
+        container,
+        frame_budget: float = DEFAULT_FRAME_BUDGET,
+        formatter: Callable[[str], str] = format_assistant_response,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.container = container
+        self.frame_budget = frame_budget
+        self.formatter = formatter
+        self.clock = clock
+        self._frozen: List[str] = []
+        self._pending_parts: List[str] = []
+        self._body = None
+        self._tail_slot = None
+        self._last_paint: Optional[float] = None
+        self._dirty = False
+        self.repaints = 0
+
+    @property
+    def text(self) -> str:
+        """Seluruh teks mentah yang sudah diterima sejauh ini."""
+        return "".join(self._frozen) + "".join(self._pending_parts)
+
+    def feed(self, delta: str) -> None:
+        """Menambahkan potongan teks baru; repaint hanya jika anggaran frame sudah lewat."""
+        if not delta:
+            return
+        self._pending_parts.append(delta)
+        self._dirty = True
+        now = self.clock()
+        if self._last_paint is None or now - self._last_paint >= self.frame_budget:
+            self._paint(now)
+
+    def flush(self) -> None:
+        """Memaksa repaint ekor yang tertunda (dengan kursor)."""
+        if self._dirty:
+            self._paint(self.clock())
+
+    def reset(self) -> None:
+        """Membuang semua teks yang sudah tampil (mis. retry penuh setelah jawaban terlalu pendek)."""
+        self.container.empty()
+        self._frozen = []
+        self._pending_parts = []
+        self._body = None
+        self._tail_slot = None
+        self._last_paint = None
+        self._dirty = False
+
+    def _ensure_slots(self) -> None:
+        if self._body is None:
+            self._body = self.container.container()
+            self._tail_slot = self._body.empty()
+
+    def _paint(self, now: float) -> None:
+        self._ensure_slots()
+        pending = "".join(self._pending_parts)
+        cut = find_freeze_point(pending)
+        if cut and pending[:cut].strip():
+            segment = pending[:cut]
+            self._frozen.append(segment)
+            # Slot ekor saat ini menjadi elemen beku; ekor baru mendapat slot sendiri
+            self._tail_slot.markdown(self.formatter(segment))
+            self._tail_slot = self._body.empty()
+            pending = pending[cut:]
+        self._pending_parts = [pending] if pending else []
+        self._tail_slot.markdown(self.formatter(pending + STREAM_CURSOR))
+        self._last_paint = now
+        self._dirty = False
+        self.repaints += 1
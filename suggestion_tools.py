@@ -0,0 +1,251 @@
+# suggestion_tools.py
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from cache_tools import normalize_text
+from database_tools import DB_PATH, connect_suggestion_db, init_suggestion_db
+from message_records import MessageRecord, ConversationLog
+
+# Batas Transisi Diperpanjang: Memberikan lebih banyak ruang untuk modifikasi satu lagu.
+TRANSITION_THRESHOLD = 7  # Akan pindah ke Fase 3 setelah balasan asisten ke-8 (num_assistant_responses > 7)
+MAX_SUGGESTIONS = 4
+
+PHASE_NARRATIVE = "narrative"   # FASE 1: naratif / emosional (belum ada komposisi)
+PHASE_MODIFY = "modify"         # FASE 2: modifikasi satu lagu
+PHASE_NEW_TOPIC = "new_topic"   # FASE 3: topik baru / modifikasi lanjut
+
+
+class SuggestionTemplate(NamedTuple):
+    """Satu pertanyaan di katalog. `normalized` sudah dihitung untuk templat tanpa placeholder {key}/{tempo}."""
+    template_id: str
+    text: str
+    normalized: Optional[str]
+
+
+def _templates(prefix: str, entries: Tuple[Tuple[str, str], ...]) -> Tuple[SuggestionTemplate, ...]:
+    return tuple(
+        SuggestionTemplate(f"{prefix}.{name}", text, None if "{" in text else normalize_text(text))
+        for name, text in entries
+    )
+
+
+# Katalog pertanyaan (dibangun sekali saat impor). Urutan katalog menjadi tie-break ranking.
+SUGGESTION_CATALOGUE: Mapping[Tuple[str, str], Tuple[SuggestionTemplate, ...]] = MappingProxyType({
+    ("indonesian", PHASE_NARRATIVE): _templates("id.narrative", (
+        ("confused", "Saya sedang merasa **kebingungan**, coba terjemahkan ke dalam musik."),
+        ("longing", "Tolong buatkan **melodi** yang mengekspresikan **kerinduan yang mendalam**."),
+        ("peace", "Saya ingin lagu tentang **perasaan damai** setelah badai."),
+        ("space_doc", "Ide **komposisi** untuk film dokumenter tentang luar angkasa."),
+        ("genres", "Apa saja **genre** yang bisa Anda bantu rancang?"),
+        ("mystery", "Saran komposisi untuk adegan **misterius** dan penuh ketegangan."),
+    )),
+    ("indonesian", PHASE_MODIFY): _templates("id.modify", (
+        ("relative_minor", "Ubah **kunci nada {key}** menjadi kunci *relative minor*."),
+        ("sus_add9", "Bagaimana jika progresi *chord* menggunakan ***suspended* dan *add9***?"),
+        ("tempo_up", "Percepat **tempo {tempo}** sebanyak 15 BPM dan ubah *beat* drumnya."),
+        ("bridge_coda", "Rancang bagian **Bridge** atau **Coda** dengan **emosi** yang kontras."),
+        ("percussion", "Tambahkan **perkusi** yang lebih ritmis, seperti *Latin beat* atau *funk*."),
+        ("piano_strings", "Ganti **instrumentasi** utama menjadi piano solo dan strings."),
+        ("darker", "Bagaimana cara membuat *progresi chord* ini terdengar lebih **minor dan gelap**?"),
+    )),
+    ("indonesian", PHASE_NEW_TOPIC): _templates("id.new_topic", (
+        ("optimism", "Saya ingin lagu tentang **optimisme** di kunci **F Major** dengan *genre Pop Rock*."),
+        ("city_night", "Rancang **soundtrack** untuk suasana **kota yang sibuk** di malam hari (key Bb minor)."),
+        ("slow_dance", "Buatkan **progresi chord** yang sempurna untuk *slow-dancing* dengan nuansa *soulful*."),
+        ("lullaby", "Ide **lagu tidur** dengan instrumentasi minimalis dan nuansa hangat."),
+        ("acoustic", "Bagaimana jika kita buat versi **akustik** dari komposisi yang tadi?"),
+        ("jingle", "Buatkan saya *jingle* yang **ceria dan mudah diingat**."),
+    )),
+    ("english", PHASE_NARRATIVE): _templates("en.narrative", (
+        ("confused", "I'm feeling **confused**, try translating it into music."),
+        ("longing", "Please create a **melody** that expresses **deep longing**."),
+        ("peace", "I want a song about the **feeling of peace** after a storm."),
+        ("space_doc", "A **composition** idea for a documentary about outer space."),
+        ("genres", "What **genres** can you help me design?"),
+        ("mystery", "Suggest a composition for a **mysterious** and tense scene."),
+    )),
+    ("english", PHASE_MODIFY): _templates("en.modify", (
+        ("relative_minor", "Change the key of **{key}** to a *relative minor*."),
+        ("sus_add9", "What if the chord progression uses **suspended and add9**?"),
+        ("tempo_up", "Increase the **tempo {tempo}** by 15 BPM and change the drum *beat*."),
+        ("bridge_coda", "Design a **Bridge** or **Coda** section with a contrasting emotion."),
+        ("percussion", "Add more rhythmic **percussion**, like a *Latin beat* or *funk*."),
+        ("piano_strings", "Change the main **instrumentation** to a solo piano and strings."),
+        ("darker", "How can I make this *chord progression* sound more **minor and dark**?"),
+    )),
+    ("english", PHASE_NEW_TOPIC): _templates("en.new_topic", (
+        ("optimism", "I want a song about **optimism** in **F Major** key with a *Pop Rock genre*."),
+        ("city_night", "Design a **soundtrack** for a **busy city** at night (key Bb minor)."),
+        ("slow_dance", "Create the perfect **chord progression** for *slow-dancing* with a *soulful vibe*."),
+        ("lullaby", "An idea for a **lullaby** with minimalist instrumentation and a warm feel."),
+        ("acoustic", "What if we create an **acoustic** version of the previous composition?"),
+        ("jingle", "Make me an **upbeat and memorable** *jingle*."),
+    )),
+})
+
+# Pencocokan teks (saran yang ditampilkan / prompt yang diklik) ke templat: tanpa placeholder lewat dict,
+# dengan placeholder lewat regex (hanya beberapa templat)
+_EXACT_TEMPLATES: Mapping[str, str] = MappingProxyType({
+    template.normalized: template.template_id
+    for templates in SUGGESTION_CATALOGUE.values() for template in templates if template.normalized is not None
+})
+_PATTERN_TEMPLATES: Tuple[Tuple["re.Pattern[str]", str], ...] = tuple(
+    (re.compile(re.escape(normalize_text(template.text)).replace(r"\{key\}", ".+?").replace(r"\{tempo\}", ".+?")), template.template_id)
+    for templates in SUGGESTION_CATALOGUE.values() for template in templates if template.normalized is None
+)
+
+
+def match_template(text: str) -> Optional[str]:
+    """ID templat katalog untuk sebuah saran/prompt, atau None jika bukan dari katalog."""
+    normalized = normalize_text(text)
+    template_id = _EXACT_TEMPLATES.get(normalized)
+    if template_id is not None:
+        return template_id
+    for pattern, pattern_id in _PATTERN_TEMPLATES:
+        if pattern.fullmatch(normalized):
+            return pattern_id
+    return None
+
+
+class SuggestionStats:
+    """Statistik tampil/klik per templat dari suggestion_history, diperbarui di thread latar belakang.
+
+    Setiap refresh hanya membaca baris baru (watermark suggestion_id). Sebuah saran dihitung "diklik"
+    jika muncul sebagai `user_prompt` pada baris berikutnya. Skor = CTR yang dihaluskan
+    (clicks + prior_ctr * prior_weight) / (shown + prior_weight), disimpan sebagai snapshot beku
+    sehingga jalur per giliran hanya melakukan lookup dict tanpa query.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, refresh_interval: float = 300.0, prior_ctr: float = 0.05, prior_weight: float = 20.0, batch_rows: int = 5000):
+        self.db_path = db_path
+        self.refresh_interval = refresh_interval
+        self.prior_ctr = prior_ctr
+        self.prior_weight = prior_weight
+        self.batch_rows = batch_rows
+        self.shown: Dict[str, int] = {}
+        self.clicks: Dict[str, int] = {}
+        self.scores: Mapping[str, float] = MappingProxyType({})
+        self._last_id = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="suggestion-stats", daemon=True)
+                self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def score(self, template_id: str) -> float:
+        return self.scores.get(template_id, self.prior_ctr)
+
+    def refresh(self) -> int:
+        """Membaca baris baru dari suggestion_history dan memperbarui snapshot skor; mengembalikan jumlah baris."""
+        rows_read = 0
+        try:
+            conn = connect_suggestion_db(self.db_path, read_only=True)
+        except sqlite3.Error as e:
+            logging.error(f"Suggestion stats: cannot open {self.db_path}: {e}")
+            return 0
+        try:
+            while True:
+                rows = conn.execute(
+                    "SELECT suggestion_id, user_prompt, suggestions_json FROM suggestion_history_plain WHERE suggestion_id > ? ORDER BY suggestion_id LIMIT ?",
+                    (self._last_id, self.batch_rows),
+                ).fetchall()
+                if not rows:
+                    break
+                for suggestion_id, user_prompt, suggestions_json in rows:
+                    clicked = match_template(user_prompt)
+                    if clicked is not None:
+                        self.clicks[clicked] = self.clicks.get(clicked, 0) + 1
+                    try:
+                        suggestions = json.loads(suggestions_json)
+                    except (TypeError, ValueError):
+                        suggestions = []
+                    for suggestion in suggestions:
+                        shown = match_template(suggestion)
+                        if shown is not None:
+                            self.shown[shown] = self.shown.get(shown, 0) + 1
+                    self._last_id = suggestion_id
+                rows_read += len(rows)
+        except sqlite3.Error as e:
+            # Tabel belum ada (DB baru) atau DB terkunci: coba lagi pada refresh berikutnya
+            logging.error(f"Suggestion stats refresh failed: {e}")
+        finally:
+            conn.close()
+        if rows_read:
+            self.scores = MappingProxyType({
+                template_id: (self.clicks.get(template_id, 0) + self.prior_ctr * self.prior_weight) / (shown + self.prior_weight)
+                for template_id, shown in self.shown.items()
+            })
+        return rows_read
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_interval)
+
+
+_suggestion_stats: Optional[SuggestionStats] = None
+_suggestion_stats_lock = threading.Lock()
+
+
+def get_suggestion_stats() -> SuggestionStats:
+    """Statistik bersama per proses; refresh latar belakang dimulai saat pertama kali dibutuhkan."""
+    global _suggestion_stats
+    with _suggestion_stats_lock:
+        if _suggestion_stats is None:
+            init_suggestion_db()
+            _suggestion_stats = SuggestionStats()
+            _suggestion_stats.start()
+        return _suggestion_stats
+
+
+def suggestion_phase(last_answer: MessageRecord, conversation: ConversationLog) -> str:
+    # Status chord sheet dari penghitung sesi (tanpa memindai riwayat)
+    if not (last_answer.has_chord_sheet or conversation.has_chord_sheet):
+        return PHASE_NARRATIVE
+    if conversation.substantive_assistant_count <= TRANSITION_THRESHOLD:
+        return PHASE_MODIFY
+    return PHASE_NEW_TOPIC
+
+
+def get_dynamic_suggestions(last_answer: MessageRecord, lang: str, conversation: ConversationLog, stats: Optional[SuggestionStats] = None, limit: int = MAX_SUGGESTIONS) -> List[str]:
+    """Menghasilkan saran pertanyaan lanjutan yang dinamis dan kontekstual.
+
+    Kandidat dari katalog fase saat ini; pertanyaan yang sudah pernah diajukan di sesi ini dilewati
+    (lookup set), lalu diurutkan secara deterministik berdasarkan skor statistik dan urutan katalog.
+    """
+    phase = suggestion_phase(last_answer, conversation)
+    templates = SUGGESTION_CATALOGUE[("english" if lang == "english" else "indonesian", phase)]
+    # Kunci/Tempo jawaban terbaru sudah diparsing saat record dibuat
+    key_found = last_answer.key or 'C Major'
+    tempo_found = last_answer.tempo or 'Lento'
+
+    stats = stats or get_suggestion_stats()
+    scores, prior = stats.scores, stats.prior_ctr
+    asked = conversation.asked_prompts
+    candidates = []
+    for order, template in enumerate(templates):
+        if template.normalized is None:
+            text = template.text.format(key=key_found, tempo=tempo_found)
+            normalized = normalize_text(text)
+        else:
+            text, normalized = template.text, template.normalized
+        if normalized in asked:
+            continue
+        candidates.append((-scores.get(template.template_id, prior), order, text))
+    candidates.sort()
+    return [text for _, _, text in candidates[:limit]]
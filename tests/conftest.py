@@ -0,0 +1,9 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modul repo membuat file database relatif terhadap direktori kerja: tes berjalan di direktori sementara
+os.chdir(tempfile.mkdtemp(prefix="composer-tests-"))
@@ -0,0 +1,30 @@
+# tests/test_chord_tools.py
+from chord_tools import apply_local_edit, parse_composition
+
+ANSWER = (
+    "Lagu sendu untuk malam hujan.\n\n**Kunci:** C mayor\n**Tempo:** Andante (76 BPM)\n\n"
+    "Progresi C - Am - F - G membuat suasana tenang. A song for you, dengan Am yang lembut.\n\n"
+    "```\n[VERSE 1]\nC        Am       F        G\nHujan turun di jalan pulang\n```"
+)
+
+
+def narration(answer: str) -> str:
+    return parse_composition(answer).before
+
+
+def test_relative_minor_renames_single_letter_chords_in_narrated_progression():
+    edited = apply_local_edit(ANSWER, "Ubah kunci nada C mayor menjadi kunci relative minor")
+    assert "Progresi Am - F - Dm - E membuat" in narration(edited)
+    assert "A song for you, dengan F yang lembut" in narration(edited)
+
+
+def test_transpose_renames_single_letter_chords_in_narrated_progression():
+    edited = apply_local_edit(ANSWER, "Naikkan kunci 2 semitone")
+    assert "Progresi D - Bm - G - A membuat" in narration(edited)
+    assert "A song for you, dengan Bm yang lembut" in narration(edited)
+
+
+def test_other_progression_separators():
+    answer = ANSWER.replace("C - Am - F - G", "C | Am → F, G")
+    edited = apply_local_edit(answer, "Naikkan kunci 2 semitone")
+    assert "Progresi D | Bm → G, A membuat" in narration(edited)
@@ -0,0 +1,30 @@
+# tests/test_context_tools.py
+from context_tools import ConversationWindow
+
+SHEET = "**Kunci:** C mayor\n**Tempo:** Andante (76 BPM)\nIni lagunya.\n```\nC        Am\nHujan turun\n```"
+
+
+def long_history(turns: int = 10):
+    history = [("user", "Lagu rindu"), ("assistant", SHEET)]
+    for index in range(turns):
+        history += [("user", f"pertanyaan {index}"), ("assistant", f"jawaban {index}.")]
+    return history + [("user", "terakhir")]
+
+
+def test_summary_is_a_system_message_and_skips_the_pinned_sheet():
+    messages = ConversationWindow(max_turns=2).build(long_history())
+    role, summary = messages[0]
+    assert role == "system"
+    assert "- User: Lagu rindu" in summary
+    assert "[chord sheet]" not in summary
+    assert messages[1] == ("assistant", SHEET)
+    assert [role for role, _ in messages].count("system") == 1
+    assert messages[-1] == ("user", "terakhir")
+
+
+def test_superseded_sheet_returns_to_the_summary():
+    history = long_history()
+    history[-1:] = [("assistant", SHEET.replace("C mayor", "D mayor"))] + [("user", "lagi")] * 5
+    window = ConversationWindow(max_turns=1)
+    summary = window.build(history)[0][1]
+    assert "- Composer [chord sheet]: Key C," in summary
@@ -0,0 +1,172 @@
+# tests/test_database_tools.py
+import json
+import os
+import random
+import shutil
+import sqlite3
+
+import database_tools
+from database_tools import compact_suggestion_history, connect_suggestion_db, migrate_suggestion_db
+from history_queries import search_history
+
+WORDS = (
+    "hati rindu malam hujan jalan pulang cahaya bintang langit sunyi angin laut pagi senja "
+    "lelah harap mimpi waktu kenangan pelukan suara lagu terang gelap jauh dekat kembali"
+).split()
+CHORDS = ["C", "Am", "F", "G", "Dm7", "Em", "Cmaj7", "G7", "Fmaj7", "Bb", "Gsus4", "Am7"]
+
+
+def make_response(rng: random.Random, size: int = 10_000) -> str:
+    """Respons mirip komposisi asli: pembuka tetap, lalu bait chord + lirik acak hingga ~`size` byte."""
+    parts = [
+        "Komposisi ini dibuat untuk suasana yang kamu ceritakan.\n\n**Key:** C Major\n**Tempo:** Andante (76 BPM)\n\n```\n"
+    ]
+    verse = 1
+    while sum(map(len, parts)) < size:
+        parts.append(f"[VERSE {verse}]\n")
+        for _ in range(4):
+            parts.append("      ".join(rng.choice(CHORDS) for _ in range(4)) + "\n")
+            parts.append(" ".join(rng.choice(WORDS) for _ in range(7)) + "\n")
+        verse += 1
+    parts.append("```\n\nMainkan dengan dinamika lembut di bait pertama lalu naikkan intensitas di chorus.")
+    return "".join(parts)
+
+
+def make_pre_019_db(path: str, rows: int) -> None:
+    """Database berskema v2 (sebelum penyimpanan ringkas): teks biasa, FTS external content."""
+    conn = sqlite3.connect(path)
+    conn.execute("""
+    CREATE TABLE suggestion_history (
+        suggestion_id INTEGER PRIMARY KEY,
+        user_prompt TEXT NOT NULL,
+        assistant_response TEXT NOT NULL,
+        suggestions_json TEXT NOT NULL,
+        created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+    )
+    """)
+    conn.executescript(database_tools.SCHEMA_MIGRATIONS[2])
+    conn.execute("PRAGMA user_version = 2")
+    rng = random.Random(19)
+    conn.executemany(
+        "INSERT INTO suggestion_history (user_prompt, assistant_response, suggestions_json) VALUES (?, ?, ?)",
+        [(f"lagu rindu nomor {i}", make_response(rng), json.dumps(["Ubah kunci nada", "Tambah tempo"])) for i in range(rows)],
+    )
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def test_compacted_db_is_smaller_than_pre_019(tmp_path):
+    pre_019 = str(tmp_path / "pre019.db")
+    make_pre_019_db(pre_019, rows=300)
+    compacted = str(tmp_path / "compacted.db")
+    shutil.copy(pre_019, compacted)
+
+    compact_suggestion_history(compacted, compression="zlib-dict", train_dictionary=True, vacuum=True)
+
+    pre_size, compacted_size = os.path.getsize(pre_019), os.path.getsize(compacted)
+    assert compacted_size < pre_size * 0.6, (pre_size, compacted_size)
+    assert len(search_history("rindu nomor 7", db_path=compacted)) >= 1
+
+
+def test_deleted_compressed_rows_leave_the_index(tmp_path):
+    path = str(tmp_path / "history.db")
+    make_pre_019_db(path, rows=20)
+    compact_suggestion_history(path, compression="zlib")
+    assert search_history("nomor 3", db_path=path)
+
+    # Klien SQLite biasa menghapus baris terkompresi: trigger tidak bisa selalu mengeluarkannya dari indeks
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM suggestion_history WHERE user_prompt = 'lagu rindu nomor 3'")
+    conn.commit()
+    conn.close()
+    compact_suggestion_history(path)
+
+    conn = connect_suggestion_db(path)
+    assert database_tools._stale_fts_rows(conn) == 0
+    assert conn.execute("INSERT INTO suggestion_history_fts (suggestion_history_fts, rank) VALUES ('integrity-check', 0)").fetchall() == []
+    conn.close()
+    assert not [hit for hit in search_history("nomor 3", db_path=path) if hit.user_prompt.endswith(" 3")]
+
+
+def test_snippet_marks_terms_from_compressed_rows(tmp_path):
+    path = str(tmp_path / "history.db")
+    conn = connect_suggestion_db(path)
+    database_tools._create_schema(conn)
+    conn.close()
+    writer = database_tools.SuggestionHistoryWriter(path, compression="zlib")
+    writer.submit("lagu hujan", "Intro piano. " * 40 + "Lalu cello masuk di bait kedua. " + "Outro. " * 40, [])
+    writer.flush()
+    writer.close()
+
+    conn = connect_suggestion_db(path)
+    assert migrate_suggestion_db(conn) == database_tools.SCHEMA_VERSION
+    assert conn.execute("SELECT response_codec FROM suggestion_history").fetchone()[0] != 0
+    conn.close()
+    [hit] = search_history("cello", db_path=path)
+    assert "**cello**" in hit.snippet
+
+
+def fts_sql(path: str) -> str:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT sql FROM sqlite_master WHERE name = 'suggestion_history_fts'").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_failed_migration_hook_rolls_back_the_whole_step(tmp_path, monkeypatch):
+    path = str(tmp_path / "history.db")
+    make_pre_019_db(path, rows=5)
+    before = fts_sql(path)
+
+    def failing_hook(conn):
+        raise RuntimeError("hook failed")
+
+    monkeypatch.setitem(database_tools.SCHEMA_MIGRATION_HOOKS, 3, failing_hook)
+    conn = connect_suggestion_db(path)
+    try:
+        migrate_suggestion_db(conn)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("migration should have failed")
+    conn.close()
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 2
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(suggestion_history)")]
+    assert "response_codec" not in columns
+    conn.close()
+    assert fts_sql(path) == before
+
+    # Percobaan berikutnya (tanpa hook yang gagal) menerapkan semua langkah dari v2
+    monkeypatch.undo()
+    conn = connect_suggestion_db(path)
+    assert migrate_suggestion_db(conn) == database_tools.SCHEMA_VERSION
+    conn.close()
+    assert "lagu rindu nomor 4" in [hit.user_prompt for hit in search_history("nomor 4", db_path=path)]
+
+
+def test_migration_step_holds_the_write_lock(tmp_path, monkeypatch):
+    path = str(tmp_path / "history.db")
+    make_pre_019_db(path, rows=1)
+    seen = {}
+
+    def probing_hook(conn):
+        other = sqlite3.connect(path, timeout=0)
+        try:
+            seen["version"] = other.execute("PRAGMA user_version").fetchone()[0]
+            try:
+                other.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as e:
+                seen["locked"] = "locked" in str(e)
+        finally:
+            other.close()
+
+    monkeypatch.setitem(database_tools.SCHEMA_MIGRATION_HOOKS, 3, probing_hook)
+    conn = connect_suggestion_db(path)
+    assert migrate_suggestion_db(conn) == database_tools.SCHEMA_VERSION
+    conn.close()
+    # Saat hook v3 berjalan, skrip v3 belum di-commit dan proses lain tidak bisa mulai bermigrasi
+    assert seen == {"version": 2, "locked": True}
@@ -0,0 +1,46 @@
+# tests/test_language_tools.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from bench_language import AMBIGUOUS_PROMPTS, HELDOUT_SAMPLES, SAMPLES  # noqa: E402
+from language_tools import LOW_CONFIDENCE, identify_language, identify_languages  # noqa: E402
+
+MIN_HELDOUT_ACCURACY = 0.95
+# Batas bawah longgar (terukur ~240 ribu prompt/detik): menangkap regresi besar, bukan noise mesin CI
+MIN_PROMPTS_PER_SECOND = 20_000
+
+
+def misclassified(samples):
+    return [(text, label, identify_language(text)) for text, label in samples if identify_language(text).language != label]
+
+
+def test_heldout_accuracy():
+    errors = misclassified(HELDOUT_SAMPLES)
+    assert 1 - len(errors) / len(HELDOUT_SAMPLES) >= MIN_HELDOUT_ACCURACY, errors
+
+
+def test_heldout_errors_are_low_confidence():
+    # Salah tebak yang tersisa harus ragu, sehingga pemanggil kembali ke bahasa percakapan sebelumnya
+    confident = [error for error in misclassified(HELDOUT_SAMPLES) if error[2].confidence >= LOW_CONFIDENCE]
+    assert not confident, confident
+
+
+def test_tuning_samples_still_pass():
+    assert not misclassified(SAMPLES)
+
+
+def test_prompts_without_language_evidence_are_low_confidence():
+    confident = [(text, identify_language(text)) for text in AMBIGUOUS_PROMPTS if identify_language(text).confidence >= LOW_CONFIDENCE]
+    assert not confident, confident
+
+
+def test_throughput():
+    texts = [f"{text} {index}" for index, (text, _) in enumerate((SAMPLES + HELDOUT_SAMPLES) * 20)]
+    started = time.perf_counter()
+    for text in texts:
+        identify_language(text)
+    assert len(texts) / (time.perf_counter() - started) >= MIN_PROMPTS_PER_SECOND
+    assert identify_languages(texts[:3] * 2) == [identify_language(text) for text in texts[:3] * 2]